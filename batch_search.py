@@ -0,0 +1,91 @@
+import time
+
+import numpy as np
+
+from query import parse_query
+from scoring import DEFAULT_SCORER, rank_hits, top_hits
+import logger_config
+
+logger = logger_config.setup_logger(__name__)
+
+# 一次 bincount 累加的 查询数 × 段内文档数 上限（float64 约32MB），超过时按查询分组
+MAX_BATCH_CELLS = 1 << 22
+
+
+def search_batch(index, keywords, limit=10, scorer=None):
+    """批量检索，返回与 keywords 一一对应的前 limit 名结果列表。
+
+    所有查询用到的词（含相似词）在每个段内只打分一次，各查询的得分用
+    np.bincount 按 (查询, 文档ID) 一次累加；结果与逐个调用 search_documents 一致，
+    但不读取文档内容和匹配位置。
+    """
+    start_time = time.time()
+    scorer = scorer or DEFAULT_SCORER
+    reader = index.reader()
+    results = [[] for _ in keywords]
+    if not reader.num_docs or not keywords:
+        return results
+
+    queries = [parse_query(keyword) for keyword in keywords]
+    # 相似词按原词展开一次，批内所有查询共用
+    expansions = {}
+    term_weights = []
+    for query in queries:
+        weights = []
+        for word in query.terms:
+            if word not in expansions:
+                expansions[word] = reader.get_close_matches(word, n=2, cutoff=0.8)
+            weights.extend((term, 1.0 if term == word else 0.8) for term in expansions[word])
+        term_weights.append(weights)
+    candidates = [None if query.root is None else np.array(reader.match(query.root), dtype=np.int64)
+                  for query in queries]
+    terms = sorted({term for weights in term_weights for term, _ in weights})
+    logger.info(f"批量检索 {len(queries)} 个查询，共 {len(terms)} 个不同的词")
+
+    hit_ids = [[] for _ in queries]
+    hit_scores = [[] for _ in queries]
+    for base, segment in zip(reader.bases, reader.segments):
+        num_docs = len(segment)
+        term_scores = {term: scorer.score_term(reader, segment.postings, term) for term in terms}
+        deleted = list(segment.deleted)
+        group = max(1, MAX_BATCH_CELLS // max(num_docs, 1))
+        for first in range(0, len(queries), group):
+            rows = range(first, min(first + group, len(queries)))
+            # 第 row 个查询的文档 doc_id 对应矩阵下标 row * num_docs + doc_id
+            keys = [np.empty(0, dtype=np.int64)]
+            weights = [np.empty(0)]
+            for row, q in enumerate(rows):
+                for term, weight in term_weights[q]:
+                    doc_ids, scores = term_scores[term]
+                    keys.append(doc_ids.astype(np.int64) + row * num_docs)
+                    weights.append(scores * weight)
+            matrix = np.bincount(np.concatenate(keys), np.concatenate(weights),
+                                 minlength=len(rows) * num_docs).reshape(len(rows), num_docs)
+            if deleted:
+                matrix[:, deleted] = 0.0
+            for row, q in enumerate(rows):
+                scores = matrix[row]
+                if candidates[q] is not None:
+                    # 布尔查询的结果是查询计划匹配的文档，没有可打分的词时得分为0
+                    lo, hi = np.searchsorted(candidates[q], [base, base + num_docs])
+                    local_ids = candidates[q][lo:hi] - base
+                else:
+                    local_ids = np.flatnonzero(scores)
+                # 每个段先各自取前 limit 名，最后再合并
+                ids, top_scores = top_hits(local_ids + base, scores[local_ids], limit)
+                hit_ids[q].append(ids)
+                hit_scores[q].append(top_scores)
+
+    for q in range(len(queries)):
+        if not hit_ids[q]:
+            continue
+        for doc_id, score in rank_hits(np.concatenate(hit_ids[q]), np.concatenate(hit_scores[q]), limit):
+            doc = reader.document(doc_id)
+            results[q].append({
+                'path': doc['path'],
+                'type': doc['type'],
+                'score': score,
+                'duplicates': [duplicate[0] for duplicate in doc.get('duplicates') or ()],
+            })
+    logger.info(f"批量检索完成，用时: {time.time() - start_time:.2f}秒")
+    return results
@@ -0,0 +1,371 @@
+import argparse
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from difflib import get_close_matches
+
+from cache_codec import BinaryCodec, JsonZlibCodec
+from fuzzy_index import FuzzyTermIndex
+from postings import PostingsBuilder
+
+# 性能基准测试，使用合成语料，不依赖GUI
+# 用法: python benchmark.py postings-memory --docs 2000
+#       python benchmark.py fuzzy --vocab 200000
+#       python benchmark.py topk --docs 10000 --scorer bm25
+#       python benchmark.py cache-codec
+#       python benchmark.py boolean --docs 20000
+#       python benchmark.py batch --queries 300
+#       python benchmark.py tokenize --sentences 50000
+
+
+def make_corpus(num_docs, words_per_doc, vocab_size, seed=42, prefix="词"):
+    # 按Zipf分布生成词序列，近似真实文档的词频分布
+    rng = random.Random(seed)
+    vocab = [f"{prefix}{i}" for i in range(vocab_size)]
+    weights = [1 / (rank + 1) for rank in range(vocab_size)]
+    corpus = []
+    for _ in range(num_docs):
+        words = rng.choices(vocab, weights, k=words_per_doc)
+        word_positions = defaultdict(list)
+        for pos, word in enumerate(words):
+            word_positions[word].append(pos)
+        corpus.append(dict(word_positions))
+    return corpus
+
+
+def measure(func):
+    # tracemalloc 会显著拖慢执行，耗时与内存分两次测量
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = func()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def bench_postings_memory(args):
+    corpus = make_corpus(args.docs, args.words, args.vocab)
+
+    def build_tuples():
+        # 旧实现：defaultdict(list) 保存 (doc_id, pos) 元组
+        inverted_index = defaultdict(list)
+        for doc_id, word_positions in enumerate(corpus):
+            for word, positions in word_positions.items():
+                for pos in positions:
+                    inverted_index[word].append((doc_id, pos))
+        return inverted_index
+
+    def build_store():
+        builder = PostingsBuilder()
+        for word_positions in corpus:
+            builder.add_document(word_positions)
+        return builder.build()
+
+    _, tuple_bytes, tuple_time = measure(build_tuples)
+    store, store_bytes, store_time = measure(build_store)
+    print(f"文档数: {args.docs}, 每文档词数: {args.words}, 词表大小: {args.vocab}")
+    print(f"元组倒排索引: {tuple_bytes / 1024 / 1024:.2f}MB, 构建 {tuple_time:.2f}秒")
+    print(f"数组倒排索引: {store_bytes / 1024 / 1024:.2f}MB, 构建 {store_time:.2f}秒 "
+          f"(nbytes估算 {store.nbytes() / 1024 / 1024:.2f}MB)")
+    print(f"内存节省: {(1 - store_bytes / tuple_bytes) * 100:.1f}%")
+
+
+def make_vocab(vocab_size, charset_size=3000, seed=42):
+    # 用常用汉字区间随机组合出1~4字的词，近似结巴分词后的词表
+    rng = random.Random(seed)
+    charset = [chr(0x4e00 + i) for i in range(charset_size)]
+    vocab = set()
+    while len(vocab) < vocab_size:
+        length = rng.choices([1, 2, 3, 4], [1, 6, 3, 2])[0]
+        vocab.add(''.join(rng.choices(charset, k=length)))
+    return sorted(vocab)
+
+
+def bench_fuzzy(args):
+    vocab = make_vocab(args.vocab)
+    rng = random.Random(7)
+    queries = rng.sample(vocab, args.queries // 2)
+    # 一半查询词做单字替换，模拟输入错误
+    for word in rng.sample(vocab, args.queries - len(queries)):
+        pos = rng.randrange(len(word))
+        queries.append(word[:pos] + chr(0x4e00 + rng.randrange(3000)) + word[pos + 1:])
+
+    start = time.perf_counter()
+    index = FuzzyTermIndex(vocab)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = [get_close_matches(q, vocab, n=args.n, cutoff=args.cutoff) for q in queries]
+    difflib_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [index.get_close_matches(q, n=args.n, cutoff=args.cutoff) for q in queries]
+    index_time = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+    print(f"词表大小: {len(vocab)}, 查询数: {len(queries)}, n={args.n}, cutoff={args.cutoff}")
+    print(f"相似词索引构建: {build_time:.2f}秒")
+    print(f"difflib: 平均 {difflib_time / len(queries) * 1000:.3f}毫秒/查询")
+    print(f"相似词索引: 平均 {index_time / len(queries) * 1000:.3f}毫秒/查询")
+    print(f"结果不一致: {mismatches}")
+
+
+def build_search_corpus(args):
+    # 词形为 w123，结巴分词会把字母数字串保留为一个词，便于构造查询
+    corpus = make_corpus(args.docs, args.words, args.vocab, prefix="w")
+    builder = PostingsBuilder()
+    for word_positions in corpus:
+        builder.add_document(word_positions)
+    documents = [{'path': f"doc{i}.docx", 'type': 'docx', 'content': ''} for i in range(args.docs)]
+    return documents, builder.build()
+
+
+def bench_topk(args):
+    from scoring import SCORERS
+    from search_engine import search_documents
+    from search_index import SearchIndex
+
+    documents, store = build_search_corpus(args)
+    store.fuzzy_index
+    index = SearchIndex()
+    index.add_segment(documents, store)
+    keyword = ' '.join(args.query)
+    scorer = SCORERS[args.scorer]
+    hits = len(search_documents(index, keyword, scorer=scorer))
+    print(f"文档数: {args.docs}, 查询: {keyword}, 打分: {args.scorer}, 命中: {hits}")
+
+    def timed(**kwargs):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            search_documents(index, keyword, scorer=scorer, **kwargs)
+        return (time.perf_counter() - start) / args.repeat * 1000
+
+    print(f"全量排序: {timed():.1f}毫秒/查询")
+    for offset in (0, hits // 10, hits // 2, max(0, hits - args.limit)):
+        print(f"limit={args.limit} offset={offset}: {timed(limit=args.limit, offset=offset):.1f}毫秒/查询")
+
+
+def bench_boolean(args):
+    from search_engine import search_documents
+    from search_index import SearchIndex
+
+    documents, store = build_search_corpus(args)
+    store.fuzzy_index
+    index = SearchIndex()
+    index.add_segment(documents, store)
+    print(f"文档数: {args.docs}")
+    # 同样的词分别按原来的 OR 方式和 AND 方式查询
+    for words in args.query:
+        for keyword in (words.replace(',', ' '), words.replace(',', ' AND ')):
+            hits = len(search_documents(index, keyword))
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                search_documents(index, keyword, limit=args.limit)
+            elapsed = (time.perf_counter() - start) / args.repeat * 1000
+            print(f"{keyword}: 命中 {hits}, {elapsed:.1f}毫秒/查询")
+
+
+def bench_batch(args):
+    from batch_search import search_batch
+    from search_engine import search_documents
+    from search_index import IndexReader, SearchIndex
+
+    documents, store = build_search_corpus(args)
+    store.fuzzy_index
+    if args.no_fuzzy:
+        # 合成词表的词形相近，相似词查找占了大部分耗时，关闭后只比较打分部分
+        IndexReader.get_close_matches = lambda self, word, n=3, cutoff=0.6: [word] if self.doc_freq(word) else []
+    # 每个查询由2~4个随机词组成，模拟保存的检索条件
+    rng = random.Random(11)
+    queries = [' '.join(f"w{rng.randrange(args.vocab)}" for _ in range(rng.randint(2, 4)))
+               for _ in range(args.queries)]
+    print(f"文档数: {args.docs}, 查询数: {len(queries)}, limit={args.limit}")
+
+    # 每次计时都用新建的索引，相似词缓存和IDF等统计量都从空开始，
+    # 两种方式轮流先执行，不让后执行的一方沾前一方的光
+    def loop(index):
+        for keyword in queries:
+            search_documents(index, keyword, limit=args.limit)
+
+    def batch(index):
+        search_batch(index, queries, limit=args.limit)
+
+    timings = {'逐个查询': [], '批量查询': []}
+    runs = list(zip(timings, (loop, batch)))
+    for round_no in range(args.repeat):
+        for name, func in (runs if round_no % 2 == 0 else runs[::-1]):
+            index = SearchIndex()
+            index.add_segment(documents, store)
+            start = time.perf_counter()
+            func(index)
+            timings[name].append(time.perf_counter() - start)
+    for name, times in timings.items():
+        best = min(times)
+        print(f"{name}: {best:.2f}秒 ({best / len(queries) * 1000:.1f}毫秒/查询，{args.repeat} 轮中最快)")
+
+
+def bench_tokenize(args):
+    import psutil
+    import tokenizer
+    from postings import pack_word_positions
+
+    # 用结巴词典中的常用词拼成句子，句末加标点，近似正文；
+    # 随机汉字组合会让结巴大量走HMM新词识别，不代表真实文本
+    tokenizer.load_dictionary()
+    import jieba
+    rng = random.Random(5)
+    vocab = [word for word, freq in jieba.dt.FREQ.items() if freq > 50 and len(word) > 1][:args.vocab]
+    sentences = [''.join(rng.choices(vocab, k=rng.randint(5, 20))) + rng.choice('，。；！？\n')
+                 for _ in range(args.sentences)]
+    text = ''.join(sentences)
+
+    def per_token():
+        # 旧实现：逐词生成器，每1000词检查一次内存，每个词检查一次超时，
+        # 按批把 (位置, 词) 元组写入词列表和位置字典（不含每批的日志输出）
+        process = psutil.Process()
+        start_time = time.time()
+
+        def word_generator(text):
+            for i, word in enumerate(tokenizer.cut(text)):
+                if i % 1000 == 0:
+                    process.memory_info()
+                    time.time() - start_time
+                yield i, word
+
+        words = []
+        word_positions = defaultdict(list)
+        current_batch = []
+        for i, word in word_generator(text):
+            time.time() - start_time
+            current_batch.append((i, word))
+            if len(current_batch) >= 5000:
+                for idx, w in current_batch:
+                    words.append(w)
+                    word_positions[w].append(idx)
+                process.memory_info()
+                current_batch = []
+        for idx, w in current_batch:
+            words.append(w)
+            word_positions[w].append(idx)
+        return pack_word_positions(word_positions)
+
+    def packed():
+        return tokenizer.tokenize_packed(text)
+
+    def jieba_only():
+        # 只分词不建倒排数据，作为处理速度的上限
+        for _ in tokenizer.cut(text):
+            pass
+
+    results = {}
+    timings = defaultdict(list)
+    for _ in range(args.repeat):
+        # 两种实现交替运行，减少机器负载波动的影响
+        for name, func in (("纯分词", jieba_only), ("逐词处理", per_token), ("紧凑数组", packed)):
+            start = time.perf_counter()
+            results[name] = func()
+            timings[name].append(time.perf_counter() - start)
+    words = len(results["紧凑数组"][2])
+    print(f"文本长度: {len(text)} 字符, 词数: {words}, "
+          f"结果一致: {[list(part) for part in results['逐词处理']] == [list(part) for part in results['紧凑数组']]}")
+    for name, elapsed in timings.items():
+        print(f"{name}: 最佳 {min(elapsed):.2f}秒, {words / min(elapsed):.0f} 词/秒")
+
+
+def bench_cache_codec(args):
+    from postings import pack_word_positions
+
+    rng = random.Random(3)
+    vocab = make_vocab(args.vocab)
+    documents = []
+    for i in range(args.docs):
+        words = rng.choices(vocab, k=args.words)
+        word_positions = defaultdict(list)
+        for pos, word in enumerate(words):
+            word_positions[word].append(pos)
+        terms, term_tfs, positions = pack_word_positions(word_positions)
+        documents.append({'path': f"doc{i}.docx", 'type': 'docx', 'content': ''.join(words),
+                          'terms': terms, 'term_tfs': term_tfs, 'positions': positions})
+
+    print(f"文档数: {args.docs}, 每文档词数: {args.words}")
+    for name, codec in (("JSON+zlib9", JsonZlibCodec()), ("二进制+zlib1", BinaryCodec('zlib')),
+                        ("二进制不压缩", BinaryCodec('none'))):
+        start = time.perf_counter()
+        encoded = [codec.encode(doc) for doc in documents]
+        encode_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for data in encoded:
+            codec.decode(data)
+        decode_time = time.perf_counter() - start
+        size = sum(map(len, encoded))
+        print(f"{name}: 编码 {encode_time / args.docs * 1000:.2f}毫秒/文档, "
+              f"解码 {decode_time / args.docs * 1000:.2f}毫秒/文档, 大小 {size / 1024 / 1024:.2f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文档检索性能基准测试")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    postings_parser = subparsers.add_parser('postings-memory', help="倒排索引内存占用对比")
+    postings_parser.add_argument('--docs', type=int, default=2000)
+    postings_parser.add_argument('--words', type=int, default=2000)
+    postings_parser.add_argument('--vocab', type=int, default=50000)
+    postings_parser.set_defaults(func=bench_postings_memory)
+
+    fuzzy_parser = subparsers.add_parser('fuzzy', help="相似词查找与difflib对比")
+    fuzzy_parser.add_argument('--vocab', type=int, default=200000)
+    fuzzy_parser.add_argument('--queries', type=int, default=200)
+    fuzzy_parser.add_argument('--n', type=int, default=2)
+    fuzzy_parser.add_argument('--cutoff', type=float, default=0.8)
+    fuzzy_parser.set_defaults(func=bench_fuzzy)
+
+    topk_parser = subparsers.add_parser('topk', help="分页检索与全量排序对比")
+    topk_parser.add_argument('--docs', type=int, default=10000)
+    topk_parser.add_argument('--words', type=int, default=500)
+    topk_parser.add_argument('--vocab', type=int, default=20000)
+    topk_parser.add_argument('--limit', type=int, default=50)
+    topk_parser.add_argument('--repeat', type=int, default=5)
+    topk_parser.add_argument('--query', nargs='+', default=['w3', 'w200', 'w5000'])
+    topk_parser.add_argument('--scorer', choices=['bm25', 'position'], default='bm25')
+    topk_parser.set_defaults(func=bench_topk)
+
+    boolean_parser = subparsers.add_parser('boolean', help="AND查询与OR打分对比")
+    boolean_parser.add_argument('--docs', type=int, default=20000)
+    boolean_parser.add_argument('--words', type=int, default=300)
+    boolean_parser.add_argument('--vocab', type=int, default=20000)
+    boolean_parser.add_argument('--limit', type=int, default=50)
+    boolean_parser.add_argument('--repeat', type=int, default=5)
+    boolean_parser.add_argument('--query', nargs='+', default=['w3,w5000', 'w10,w2000,w8000', 'w0,w1'])
+    boolean_parser.set_defaults(func=bench_boolean)
+
+    batch_parser = subparsers.add_parser('batch', help="批量查询与逐个查询对比")
+    batch_parser.add_argument('--docs', type=int, default=20000)
+    batch_parser.add_argument('--words', type=int, default=300)
+    batch_parser.add_argument('--vocab', type=int, default=20000)
+    batch_parser.add_argument('--queries', type=int, default=300)
+    batch_parser.add_argument('--limit', type=int, default=10)
+    batch_parser.add_argument('--repeat', type=int, default=4)
+    batch_parser.add_argument('--no-fuzzy', action='store_true', help="不展开相似词")
+    batch_parser.set_defaults(func=bench_batch)
+
+    tokenize_parser = subparsers.add_parser('tokenize', help="分词到倒排数据的处理速度对比")
+    tokenize_parser.add_argument('--sentences', type=int, default=50000)
+    tokenize_parser.add_argument('--vocab', type=int, default=20000)
+    tokenize_parser.add_argument('--repeat', type=int, default=3)
+    tokenize_parser.set_defaults(func=bench_tokenize)
+
+    codec_parser = subparsers.add_parser('cache-codec', help="缓存编码格式对比")
+    codec_parser.add_argument('--docs', type=int, default=200)
+    codec_parser.add_argument('--words', type=int, default=20000)
+    codec_parser.add_argument('--vocab', type=int, default=20000)
+    codec_parser.set_defaults(func=bench_cache_codec)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import json
+import struct
+import sys
+import zlib
+from array import array
+
+from postings import pack_word_positions
+
+# 缓存数据的编码格式，版本号保存在 document_cache.schema_version 列中。
+# 版本1: 整个文档字典序列化为JSON后用 zlib level 9 压缩（旧版本写入的数据）
+# 版本2: 二进制格式，倒排数组直接以原始字节保存，可选压缩
+SCHEMA_JSON_ZLIB = 1
+SCHEMA_BINARY = 2
+
+_ITEMSIZE = array('I').itemsize
+
+
+class JsonZlibCodec:
+    schema_version = SCHEMA_JSON_ZLIB
+
+    def encode(self, document_data):
+        # 倒排数组转成列表后序列化为JSON并压缩
+        data = dict(document_data)
+        for key in ('term_tfs', 'positions'):
+            if key in data:
+                data[key] = data[key].tolist()
+        return zlib.compress(json.dumps(data).encode('utf-8'), level=9)
+
+    def decode(self, compressed_data):
+        # 使用流式解压缩
+        decompressor = zlib.decompressobj()
+        decompressed_data = decompressor.decompress(compressed_data)
+        decompressed_data += decompressor.flush()
+        document = json.loads(decompressed_data)
+        if 'word_positions' in document:
+            # 兼容更早的格式：保存的是词列表和位置字典
+            document['terms'], document['term_tfs'], document['positions'] = \
+                pack_word_positions(document.pop('word_positions'))
+            document.pop('words', None)
+        else:
+            document['term_tfs'] = array('I', document['term_tfs'])
+            document['positions'] = array('I', document['positions'])
+        return document
+
+
+class BinaryCodec:
+    """二进制缓存格式。
+
+    布局: 压缩方式(1字节) + 数据体，数据体为
+      头部 <IQII: 元数据长度, 正文字节数, 词项数, 位置数
+      元数据JSON(path/type等) | 正文UTF-8 | 各词项字符数(I) | 词项拼接串UTF-8
+      | 词频(I) | 位置(I)
+    词项只在词典中出现一次，位置按词分组保存为原始整数数组。
+    """
+
+    schema_version = SCHEMA_BINARY
+    _HEADER = struct.Struct('<IQII')
+    _COMPRESSORS = {
+        b'N': (lambda data: data, lambda data: data),
+        b'Z': (lambda data: zlib.compress(data, 1), zlib.decompress),
+    }
+
+    def __init__(self, compression='zlib'):
+        self.compression = b'Z' if compression == 'zlib' else b'N'
+
+    def encode(self, document_data):
+        meta = {key: value for key, value in document_data.items()
+                if key not in ('content', 'terms', 'term_tfs', 'positions')}
+        meta_bytes = json.dumps(meta).encode('utf-8')
+        content = document_data['content'].encode('utf-8')
+        terms = document_data['terms']
+        term_lengths = array('I', map(len, terms))
+        terms_bytes = ''.join(terms).encode('utf-8')
+        term_tfs = array('I', document_data['term_tfs'])
+        positions = array('I', document_data['positions'])
+        if sys.byteorder != 'little':
+            for arr in (term_lengths, term_tfs, positions):
+                arr.byteswap()
+
+        body = b''.join((
+            self._HEADER.pack(len(meta_bytes), len(content), len(terms), len(positions)),
+            meta_bytes, content, term_lengths.tobytes(), terms_bytes,
+            term_tfs.tobytes(), positions.tobytes(),
+        ))
+        return self.compression + self._COMPRESSORS[self.compression][0](body)
+
+    def decode(self, data):
+        body = self._COMPRESSORS[bytes(data[:1])][1](data[1:])
+        meta_len, content_len, num_terms, num_positions = self._HEADER.unpack_from(body, 0)
+        offset = self._HEADER.size
+
+        def take(nbytes):
+            nonlocal offset
+            chunk = body[offset:offset + nbytes]
+            offset += nbytes
+            return chunk
+
+        def take_array(count):
+            arr = array('I')
+            arr.frombytes(take(count * _ITEMSIZE))
+            if sys.byteorder != 'little':
+                arr.byteswap()
+            return arr
+
+        document = json.loads(take(meta_len))
+        document['content'] = take(content_len).decode('utf-8')
+        term_lengths = take_array(num_terms)
+        terms_text = take(len(body) - offset - (num_terms + num_positions) * _ITEMSIZE).decode('utf-8')
+        terms = []
+        start = 0
+        for length in term_lengths:
+            terms.append(terms_text[start:start + length])
+            start += length
+        document['terms'] = terms
+        document['term_tfs'] = take_array(num_terms)
+        document['positions'] = take_array(num_positions)
+        return document
+
+
+CODECS = {codec.schema_version: codec for codec in (JsonZlibCodec(), BinaryCodec())}
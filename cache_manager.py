@@ -1,43 +1,120 @@
 import sqlite3
+import mmap
 import os
-import json
 from pathlib import Path
 from datetime import datetime
 import sys
 import logging
 import zlib
+import hashlib
+import threading
+import struct
+from cache_codec import CODECS, SCHEMA_BINARY, SCHEMA_JSON_ZLIB
+from extractors import is_current_extraction
 import logger_config
 
 logger = logger_config.setup_logger(__name__)
 
+# 部分哈希只读取文件头尾各64KB，用于在计算完整哈希前快速排除不同的文件
+PARTIAL_HASH_BYTES = 64 * 1024
+
+
+def partial_file_hash(file_path, size):
+    h = hashlib.blake2b(str(size).encode('ascii'), digest_size=8)
+    with open(file_path, 'rb') as f:
+        h.update(f.read(PARTIAL_HASH_BYTES))
+        if size > PARTIAL_HASH_BYTES * 2:
+            f.seek(-PARTIAL_HASH_BYTES, os.SEEK_END)
+            h.update(f.read(PARTIAL_HASH_BYTES))
+        elif size > PARTIAL_HASH_BYTES:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def full_file_hash(file_path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_hashes(file_path, size):
+    # 返回 (完整哈希, 部分哈希)
+    return full_file_hash(file_path), partial_file_hash(file_path, size)
+
+
+def buffer_hashes(data):
+    # 与 file_hashes 相同，但对已读入或映射到内存的整个文件（bytes、mmap 等）计算
+    size = len(data)
+    h = hashlib.blake2b(str(size).encode('ascii'), digest_size=8)
+    h.update(data[:PARTIAL_HASH_BYTES])
+    if size > PARTIAL_HASH_BYTES * 2:
+        h.update(data[-PARTIAL_HASH_BYTES:])
+    elif size > PARTIAL_HASH_BYTES:
+        h.update(data[PARTIAL_HASH_BYTES:])
+    return hashlib.blake2b(data, digest_size=16).hexdigest(), h.hexdigest()
+
+
+def opened_file_hashes(f):
+    # 在已打开文件的只读映射上计算 (完整哈希, 部分哈希)，不移动文件的读取位置
+    if os.fstat(f.fileno()).st_size == 0:
+        return buffer_hashes(b'')
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return buffer_hashes(data)
+
+def get_cache_dir(app_name='word_search'):
+    # 获取应用程序的基础目录
+    if getattr(sys, 'frozen', False):
+        # 如果是打包后的exe运行
+        base_dir = Path(sys.executable).parent
+    else:
+        # 如果是开发环境运行
+        base_dir = Path(__file__).parent
+
+    # 在应用程序目录下创建cache文件夹
+    try:
+        cache_dir = base_dir / 'cache'
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    except Exception as e:
+        # 如果无法在应用程序目录创建缓存文件夹，则使用临时目录
+        import tempfile
+        cache_dir = Path(tempfile.gettempdir()) / app_name / 'cache'
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
 class CacheManager:
-    def __init__(self, app_name='word_search'):
-        # 获取应用程序的基础目录
-        if getattr(sys, 'frozen', False):
-            # 如果是打包后的exe运行
-            base_dir = Path(sys.executable).parent
-        else:
-            # 如果是开发环境运行
-            base_dir = Path(__file__).parent
-
-        # 在应用程序目录下创建cache文件夹
-        try:
-            self.cache_dir = base_dir / 'cache'
-            self.cache_dir.mkdir(parents=True, exist_ok=True)
-        except Exception as e:
-            # 如果无法在应用程序目录创建缓存文件夹，则使用临时目录
-            import tempfile
-            self.cache_dir = Path(tempfile.gettempdir()) / app_name / 'cache'
-            self.cache_dir.mkdir(parents=True, exist_ok=True)
+    def __init__(self, app_name='word_search', codec=None):
+        # 新写入的缓存使用的编码，读取时按每条记录的 schema_version 选择解码器
+        self.codec = codec or CODECS[SCHEMA_BINARY]
+        self.cache_dir = get_cache_dir(app_name)
         self.db_path = self.cache_dir / 'document_cache.db'
         logger.info(f"缓存数据库路径: {self.db_path}")
+        # 每个线程复用自己的数据库连接
+        self._local = threading.local()
         self.init_database()
 
+    def get_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path))
+            # WAL模式下读写互不阻塞，NORMAL同步级别在WAL下仍能保证数据库不损坏
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
     def init_database(self):
         logger.info("初始化缓存数据库...")
-        with sqlite3.connect(str(self.db_path)) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
+        conn = self.get_connection()
+        with conn:
+            conn.execute("""
                 CREATE TABLE IF NOT EXISTS document_cache (
                     file_path TEXT PRIMARY KEY,
                     last_modified INTEGER,
@@ -46,9 +123,37 @@ class CacheManager:
                     created_at INTEGER
                 )
             """)
-            conn.commit()
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(document_cache)")}
+            if 'file_size' not in columns:
+                # 旧版本数据库没有文件大小列，旧记录的大小为NULL，只按修改时间判断
+                conn.execute("ALTER TABLE document_cache ADD COLUMN file_size INTEGER")
+            if 'schema_version' not in columns:
+                # 旧记录的版本为NULL，按JSON格式读取，命中时迁移为当前格式
+                conn.execute("ALTER TABLE document_cache ADD COLUMN schema_version INTEGER")
+            if 'partial_hash' not in columns:
+                # 旧记录没有内容哈希，按路径命中时补算
+                conn.execute("ALTER TABLE document_cache ADD COLUMN partial_hash TEXT")
+            conn.execute("""CREATE INDEX IF NOT EXISTS idx_document_cache_partial
+                ON document_cache (file_size, partial_hash)""")
+            # 旧版本保存的目录名单已不再使用
+            conn.execute("DROP TABLE IF EXISTS directory_listing")
+            # 处理时超时、内存超限或使工作进程崩溃的文件，在修改时间和大小变化前不再处理
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS quarantine (
+                    file_path TEXT PRIMARY KEY,
+                    last_modified INTEGER,
+                    file_size INTEGER,
+                    reason TEXT,
+                    created_at INTEGER
+                )
+            """)
         logger.info("缓存数据库初始化完成")
 
+    def get_index_path(self, directory):
+        # 每个被扫描的文件夹对应一个索引段文件，与缓存数据库放在同一目录
+        key = hashlib.md5(os.path.normcase(os.path.abspath(directory)).encode('utf-8')).hexdigest()[:16]
+        return self.cache_dir / f'index_{key}.seg'
+
     def get_file_info(self, file_path):
         try:
             stat = os.stat(file_path)
@@ -60,87 +165,216 @@ class CacheManager:
             logger.error(f"获取文件信息失败: {file_path}, 错误: {str(e)}")
             return None
 
-    def get_cached_document(self, file_path):
-        logger.info(f"尝试获取缓存文档: {file_path}")
-        file_info = self.get_file_info(file_path)
-        if not file_info:
-            logger.warning(f"无法获取文件信息: {file_path}")
-            return None
+    def encode_document(self, document_data):
+        return self.codec.encode(document_data)
+
+    def decode_document(self, cache_data, schema_version=None):
+        # schema_version 为空的是加入版本列之前写入的JSON数据
+        return CODECS[schema_version or SCHEMA_JSON_ZLIB].decode(cache_data)
+
+    def migrate_rows(self, documents):
+        # documents 为 {路径: 文档}，把旧格式的记录用当前编码重写，不改变修改时间和大小
+        rows = [(self.codec.schema_version, self.encode_document(document), file_path)
+                for file_path, document in documents.items()]
+        conn = self.get_connection()
+        with conn:
+            conn.executemany("""UPDATE document_cache SET schema_version = ?, cache_data = ?
+                WHERE file_path = ?""", rows)
+        logger.info(f"旧格式缓存已迁移: {len(rows)} 条")
+
+    def get_file_infos(self, file_paths):
+        file_infos = {}
+        for file_path in file_paths:
+            file_info = self.get_file_info(file_path)
+            if file_info:
+                file_infos[str(file_path)] = file_info
+        return file_infos
 
+    def get_cached_documents(self, file_paths, file_infos=None):
+        # 把 (路径, 修改时间, 大小) 写入临时表，一次连接查询出所有未过期的缓存，
+        # 返回 {路径: 文档}。file_infos 可由调用方传入以避免重复stat；
+        # 按旧版本提取方式缓存的文档视为未命中，不再为其计算哈希或迁移格式
+        if file_infos is None:
+            file_infos = self.get_file_infos(file_paths)
+        logger.info(f"批量查询缓存: {len(file_paths)} 个文件")
+        cached = {}
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
-                cursor = conn.cursor()
-                # 使用流式方式读取BLOB数据
-                cursor.execute("""SELECT cache_data FROM document_cache
-                    WHERE file_path = ? AND last_modified = ?""", 
-                    (str(file_path), file_info['last_modified']))
-                
-                row = cursor.fetchone()
-                if not row:
-                    logger.info(f"未找到缓存数据: {file_path}")
-                    return None
-
-                logger.info(f"找到缓存数据: {file_path}")
-                # 使用流式解压缩
-                decompressor = zlib.decompressobj()
-                compressed_data = row[0]
-                decompressed_data = decompressor.decompress(compressed_data)
-                decompressed_data += decompressor.flush()
-
-                return json.loads(decompressed_data)
+            conn = self.get_connection()
+            with conn:
+                conn.execute("""CREATE TEMP TABLE IF NOT EXISTS cache_lookup (
+                    file_path TEXT PRIMARY KEY, last_modified INTEGER, file_size INTEGER)""")
+                conn.execute("DELETE FROM cache_lookup")
+                conn.executemany("INSERT OR REPLACE INTO cache_lookup VALUES (?, ?, ?)",
+                                 ((str(path), file_infos[str(path)]['last_modified'], file_infos[str(path)]['size'])
+                                  for path in file_paths if str(path) in file_infos))
+                rows = conn.execute("""SELECT d.file_path, d.cache_data, d.schema_version,
+                    d.content_hash, d.partial_hash FROM document_cache d
+                    JOIN cache_lookup l ON d.file_path = l.file_path
+                    WHERE d.last_modified = l.last_modified
+                    AND (d.file_size IS NULL OR d.file_size = l.file_size)""").fetchall()
+                conn.execute("DELETE FROM cache_lookup")
+            outdated = {}
+            missing_hashes = []
+            for file_path, cache_data, schema_version, content_hash, partial_hash in rows:
+                try:
+                    document = self.decode_document(cache_data, schema_version)
+                except (ValueError, KeyError, zlib.error, struct.error) as e:
+                    logger.error(f"缓存数据解析失败: {file_path}, 错误: {str(e)}")
+                    continue
+                if not is_current_extraction(document):
+                    continue
+                if content_hash is None:
+                    try:
+                        content_hash, partial_hash = file_hashes(file_path, file_infos[file_path]['size'])
+                    except OSError as e:
+                        logger.error(f"计算文件哈希失败: {file_path}, 错误: {str(e)}")
+                        continue
+                    missing_hashes.append((content_hash, partial_hash, file_path))
+                document['content_hash'] = content_hash
+                document['partial_hash'] = partial_hash
+                cached[file_path] = document
+                if schema_version != self.codec.schema_version:
+                    outdated[file_path] = document
+            if outdated:
+                self.migrate_rows(outdated)
+            if missing_hashes:
+                with conn:
+                    conn.executemany("""UPDATE document_cache SET content_hash = ?, partial_hash = ?
+                        WHERE file_path = ?""", missing_hashes)
         except sqlite3.Error as e:
-            logger.error(f"数据库操作失败: {file_path}, 错误: {str(e)}")
-            return None
-        except (json.JSONDecodeError, zlib.error) as e:
-            logger.error(f"缓存数据解析失败: {file_path}, 错误: {str(e)}")
-            return None
-        except Exception as e:
-            logger.error(f"获取缓存数据时发生未知错误: {file_path}, 错误: {str(e)}")
-            return None
+            logger.error(f"批量查询缓存失败, 错误: {str(e)}")
+        logger.info(f"缓存命中: {len(cached)}/{len(file_paths)} 个文件")
+        return cached
 
-    def cache_document(self, file_path, document_data):
-        logger.info(f"开始缓存文档: {file_path}")
-        file_info = self.get_file_info(file_path)
-        if not file_info:
-            logger.error(f"无法获取文件信息，缓存失败: {file_path}")
-            return False
+    def get_documents_by_content(self, file_paths, file_infos):
+        # 按路径未命中的文件，先按大小、再用 (大小, 部分哈希) 在缓存中预筛，完整哈希一致时复用
+        # 提取结果（包括被移动、复制的文件，以及内容未变只是修改时间变化的同一路径），并写入缓存记录
+        try:
+            # 大小与缓存中任何文档都不同的文件不可能命中，不读取文件内容（首次扫描时全部如此）
+            cached_sizes = {row[0] for row in self.get_connection().execute(
+                "SELECT DISTINCT file_size FROM document_cache WHERE partial_hash IS NOT NULL")}
+        except sqlite3.Error as e:
+            logger.error(f"按内容查询缓存失败, 错误: {str(e)}")
+            return {}
+        partial_hashes = {}
+        for file_path in file_paths:
+            path = str(file_path)
+            if file_infos[path]['size'] not in cached_sizes:
+                continue
+            try:
+                partial_hashes[path] = partial_file_hash(path, file_infos[path]['size'])
+            except OSError as e:
+                logger.error(f"计算文件哈希失败: {path}, 错误: {str(e)}")
+        if not partial_hashes:
+            return {}
 
+        found = {}
         try:
-            # 将数据转换为JSON字符串并压缩
-            json_data = json.dumps(document_data)
-            compressed_data = zlib.compress(json_data.encode('utf-8'), level=9)
-            
-            with sqlite3.connect(str(self.db_path)) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
+            conn = self.get_connection()
+            with conn:
+                conn.execute("""CREATE TEMP TABLE IF NOT EXISTS content_lookup (
+                    file_path TEXT PRIMARY KEY, file_size INTEGER, partial_hash TEXT)""")
+                conn.execute("DELETE FROM content_lookup")
+                conn.executemany("INSERT OR REPLACE INTO content_lookup VALUES (?, ?, ?)",
+                                 ((path, file_infos[path]['size'], partial_hash)
+                                  for path, partial_hash in partial_hashes.items()))
+                rows = conn.execute("""SELECT l.file_path, d.content_hash, d.cache_data, d.schema_version
+                    FROM content_lookup l JOIN document_cache d
+                    ON d.file_size = l.file_size AND d.partial_hash = l.partial_hash
+                    WHERE d.content_hash IS NOT NULL""").fetchall()
+                conn.execute("DELETE FROM content_lookup")
+
+            full_hashes = {}
+            for path, content_hash, cache_data, schema_version in rows:
+                if path in found:
+                    continue
+                # 先排除旧版本提取的记录，再读取整个文件计算完整哈希
+                document = self.decode_document(cache_data, schema_version)
+                if not is_current_extraction(document):
+                    continue
+                if path not in full_hashes:
+                    full_hashes[path] = full_file_hash(path)
+                if full_hashes[path] != content_hash:
+                    continue
+                document['path'] = path
+                document['content_hash'] = content_hash
+                document['partial_hash'] = partial_hashes[path]
+                found[path] = document
+        except (sqlite3.Error, OSError, ValueError, KeyError, zlib.error, struct.error) as e:
+            logger.error(f"按内容查询缓存失败, 错误: {str(e)}")
+        if found:
+            logger.info(f"按内容哈希复用缓存: {len(found)} 个文件")
+            self.cache_documents(list(found.values()), file_infos)
+        return found
+
+    def cache_documents(self, documents, file_infos=None):
+        # 一个事务内批量写入，documents 中每个文档的 'path' 为其文件路径
+        rows = []
+        now = int(datetime.now().timestamp())
+        for document_data in documents:
+            path = str(document_data['path'])
+            file_info = file_infos.get(path) if file_infos else None
+            file_info = file_info or self.get_file_info(path)
+            if not file_info:
+                logger.error(f"无法获取文件信息，缓存失败: {path}")
+                continue
+            rows.append((path, file_info['last_modified'], file_info['size'],
+                         document_data.get('content_hash'), document_data.get('partial_hash'),
+                         self.codec.schema_version, self.encode_document(document_data), now))
+        if not rows:
+            return 0
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.executemany("""
                     INSERT OR REPLACE INTO document_cache
-                    (file_path, last_modified, cache_data, created_at)
-                    VALUES (?, ?, ?, ?)
-                """, (
-                    str(file_path),
-                    file_info['last_modified'],
-                    compressed_data,
-                    int(datetime.now().timestamp())
-                ))
-                conn.commit()
-            logger.info(f"文档缓存成功: {file_path}")
-            return True
+                    (file_path, last_modified, file_size, content_hash, partial_hash,
+                     schema_version, cache_data, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+            logger.info(f"批量缓存文档成功: {len(rows)} 个")
+            return len(rows)
         except Exception as e:
-            logger.error(f"缓存文档失败: {file_path}, 错误: {str(e)}")
-            return False
-
-    def clear_cache(self):
-        logger.info("清除所有缓存")
-        with sqlite3.connect(str(self.db_path)) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM document_cache")
-            conn.commit()
-        logger.info("缓存清除完成")
-
-    def remove_cache(self, file_path):
-        logger.info(f"移除文档缓存: {file_path}")
-        with sqlite3.connect(str(self.db_path)) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM document_cache WHERE file_path = ?", (str(file_path),))
-            conn.commit()
-        logger.info(f"文档缓存已移除: {file_path}")
\ No newline at end of file
+            logger.error(f"批量缓存文档失败, 错误: {str(e)}")
+            return 0
+
+    def quarantine_files(self, failures, file_infos):
+        # failures 为 {路径: 原因}，按当前的修改时间和大小记录
+        now = int(datetime.now().timestamp())
+        rows = [(path, file_infos[path]['last_modified'], file_infos[path]['size'], reason, now)
+                for path, reason in failures.items() if path in file_infos]
+        if not rows:
+            return
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.executemany("""INSERT OR REPLACE INTO quarantine
+                    (file_path, last_modified, file_size, reason, created_at)
+                    VALUES (?, ?, ?, ?, ?)""", rows)
+            for path, _, _, reason, _ in rows:
+                logger.warning(f"文件已隔离（{reason}），修改前不再处理: {path}")
+        except sqlite3.Error as e:
+            logger.error(f"记录隔离文件失败, 错误: {str(e)}")
+
+    def get_quarantined(self, file_paths, file_infos):
+        # 返回 {路径: 原因}，只包含隔离后未被修改的文件；已修改的文件移出隔离表，重新处理
+        paths = {str(path) for path in file_paths}
+        quarantined = {}
+        stale = []
+        try:
+            conn = self.get_connection()
+            for file_path, last_modified, file_size, reason in conn.execute(
+                    "SELECT file_path, last_modified, file_size, reason FROM quarantine"):
+                if file_path not in paths:
+                    continue
+                file_info = file_infos.get(file_path)
+                if file_info and file_info['last_modified'] == last_modified and file_info['size'] == file_size:
+                    quarantined[file_path] = reason
+                else:
+                    stale.append((file_path,))
+            if stale:
+                with conn:
+                    conn.executemany("DELETE FROM quarantine WHERE file_path = ?", stale)
+        except sqlite3.Error as e:
+            logger.error(f"查询隔离文件失败, 错误: {str(e)}")
+        return quarantined
@@ -1,203 +1,210 @@
 import os
 import time
-import psutil
-import docx
-from pdfminer.high_level import extract_text
-from collections import defaultdict
-import jieba
-from cache_manager import CacheManager
+import tokenizer
+from cache_manager import opened_file_hashes
+from extractors import PAGES_PER_TASK, get_extractor
 import logger_config
 
 logger = logger_config.setup_logger(__name__)
 
-def process_document(file_path, doc_type, timeout=180, cache_manager=None):
+def process_task(task):
+    # 进程池任务入口，task 为 (file_path, doc_type)，或分页文档的页范围 (file_path, doc_type, 起始页, 结束页)
+    if len(task) == 4:
+        return process_page_range(*task)
+    file_path, doc_type = task
+    return process_document(file_path, doc_type)
+
+# 每个任务的时间上限和内存增长上限，由主进程的调度器（task_pool.TaskPool）在进程外强制执行；
+# 超限的工作进程被终止，文件被隔离，修改前不再处理
+TASK_TIMEOUT = 180
+TASK_MEMORY_MB = 1024
+
+def task_limits(file_size):
+    # 返回 (时间上限秒数, 内存增长上限MB)；大于100MB的文件时间上限加倍
+    if file_size > 100 * 1024 * 1024:
+        return TASK_TIMEOUT * 2, TASK_MEMORY_MB
+    return TASK_TIMEOUT, TASK_MEMORY_MB
+
+def count_task_pages(task):
+    # 进程池任务入口，task 为 (file_path, doc_type)，返回 (页数, 完整哈希, 部分哈希)；
+    # 页数超过 PAGES_PER_TASK 的文档会拆成页范围任务，由本任务在读取页数的同一文件上计算内容哈希，
+    # 各页范围任务不必再读取整个文件；其余文档的哈希为 None，由处理该文档的任务计算
+    file_path, doc_type = task
+    with open(file_path, 'rb') as f:
+        page_count = get_extractor(doc_type).count_pages(f)
+        if page_count <= PAGES_PER_TASK:
+            return page_count, None, None
+        return (page_count, *opened_file_hashes(f))
+
+def extract_stream(blocks):
+    """边提取边分词：blocks 逐块产出文本（分页文档的页、docx 的文本块），每取得一块立即转小写并分词，
+    不必先拼出全文。
+
+    返回 (各块文本, (词列表, 词频, 位置数组, 各块第一个词的位置), 提取用时, 分词用时)。
+    """
+    texts = []
+    extract_time = 0.0
+
+    def lowered_blocks():
+        nonlocal extract_time
+        block_iter = iter(blocks)
+        while True:
+            extract_start = time.time()
+            text = next(block_iter, None)
+            extract_time += time.time() - extract_start
+            if text is None:
+                return
+            texts.append(text)
+            yield text.lower()
+
+    start_time = time.time()
+    packed = tokenizer.tokenize_stream(lowered_blocks())
+    return texts, packed, extract_time, time.time() - start_time - extract_time
+
+def extract_page_range(file_path, doc_type, first, last, source=None):
+    """提取并分词分页文档 [first, last) 范围内的页，每提取完一页立即分词。
+
+    source 为已打开的文件对象，为 None 时按路径打开。
+    返回的部分结果中 page_lengths 为各页的字符数，page_starts 为各页第一个词的位置（从本部分开始计）。
+    """
+    pages, (terms, term_tfs, positions, page_starts), extract_time, tokenize_time = extract_stream(
+        get_extractor(doc_type).extract(file_path if source is None else source, first, last))
+    return {
+        'path': str(file_path),
+        'type': doc_type,
+        'page_range': (first, first + len(pages)),
+        'content': ''.join(pages),
+        'page_lengths': [len(text) for text in pages],
+        'page_starts': list(page_starts),
+        'terms': terms,
+        'term_tfs': term_tfs,
+        'positions': positions,
+        'extract_time': extract_time,
+        'tokenize_time': tokenize_time,
+    }
+
+def merge_page_ranges(parts):
+    # 在主进程中按页序合并同一文档各页范围的结果，生成与 process_document 相同格式的文档；
+    # 任一部分失败或全文为空时返回 None
+    if any(part.get('failed') for part in parts):
+        return None
+    parts = sorted(parts, key=lambda part: part['page_range'][0])
+    page_offsets = []
+    char_offset = token_offset = 0
+    packed = []
+    for part in parts:
+        for length, token_start in zip(part['page_lengths'], part['page_starts']):
+            page_offsets.append([char_offset, token_offset + token_start])
+            char_offset += length
+        packed.append((part['terms'], part['term_tfs'], part['positions'], token_offset))
+        token_offset += len(part['positions'])
+    content = ''.join(part['content'] for part in parts)
+    if not content.strip():
+        logger.info(f"[分页文档处理] 文本提取失败: {parts[0]['path']} 无法提取文本内容")
+        return None
+    if len(parts) == 1:
+        terms, term_tfs, positions = parts[0]['terms'], parts[0]['term_tfs'], parts[0]['positions']
+    else:
+        terms, term_tfs, positions = tokenizer.merge_packed(packed)
+    first = parts[0]
+    return {
+        'path': first['path'],
+        'content': content,
+        'type': first['type'],
+        'extractor_version': get_extractor(first['type']).version,
+        'page_offsets': page_offsets,
+        'terms': terms,
+        'term_tfs': term_tfs,
+        'positions': positions,
+        'content_hash': first.get('content_hash'),
+        'partial_hash': first.get('partial_hash'),
+        'process_time': sum(part['process_time'] for part in parts),
+    }
+
+def process_page_range(file_path, doc_type, first, last):
+    # 处理长文档的一个页范围，内容哈希已由读取页数的任务算好（见 count_task_pages）；
+    # 失败时返回带 failed 标记的结果，主进程据此放弃整个文档
+    start_time = time.time()
+    try:
+        part = extract_page_range(file_path, doc_type, first, last)
+        part['process_time'] = time.time() - start_time
+        part['tokenize_stats'] = (os.getpid(), len(part['positions']), part['tokenize_time'])
+        logger.info(f"[分页文档处理] {file_path} 第 {first + 1}-{last} 页: {len(part['content'])} 字符，"
+                    f"{len(part['positions'])} 个词，提取 {part['extract_time']:.2f}秒，"
+                    f"分词 {part['tokenize_time']:.2f}秒")
+        return part
+    except Exception as e:
+        logger.info(f"\n错误: 处理{doc_type}文档 {file_path} 第 {first + 1}-{last} 页失败")
+        logger.info(f"错误信息: {str(e)}")
+        logger.info(f"错误类型: {type(e).__name__}")
+        return {'path': str(file_path), 'type': doc_type, 'page_range': (first, last), 'failed': True,
+                'tokenize_stats': (os.getpid(), 0, 0.0)}
+
+def process_document(file_path, doc_type):
+    # 缓存的读写由主进程统一负责，这里只做文本提取和分词；超时和内存由调度器在进程外检查
     try:
         logger.info(f"\n[文档处理] 开始处理{doc_type}文档")
         logger.info(f"[文档处理] 文件路径: {file_path}")
         start_time = time.time()
-
-        # 检查缓存
-        if cache_manager:
-            cached_doc = cache_manager.get_cached_document(file_path)
-            if cached_doc:
-                logger.info(f"[文档处理] 找到缓存数据，直接使用缓存")
-                return cached_doc
         text = ""
 
-        # 检查文件大小并设置动态超时
         file_size = os.path.getsize(file_path) / (1024 * 1024)  # 转换为MB
         logger.info(f"[文档处理] 文件大小: {file_size:.2f}MB")
         if file_size > 100:  # 如果文件大于100MB
             logger.info(f"[文档处理] 警告: 文件大小超过100MB，可能需要较长处理时间")
-            timeout = min(timeout * 2, 600)  # 大文件增加超时时间，但不超过10分钟
 
-        # 获取当前内存使用情况
+        import psutil
         process = psutil.Process()
-        memory_info = process.memory_info()
-        initial_memory = memory_info.rss / 1024 / 1024
-        logger.info(f"[文档处理] 初始内存使用: {initial_memory:.2f}MB")
-
-        # 添加内存监控函数
-        def check_memory_usage():
-            current_memory = process.memory_info().rss / 1024 / 1024
-            memory_increase = current_memory - initial_memory
-            if memory_increase > 1024:  # 如果内存增加超过1GB
-                raise MemoryError(f"内存使用增加过多: {memory_increase:.2f}MB")
-            if time.time() - start_time > timeout:
-                raise TimeoutError(f"处理超时（{timeout}秒）")
-
-        if doc_type == 'docx':
-            logger.info("\n[Word文档处理] 开始读取文件...")
-            logger.info(f"[Word文档处理] 文件路径: {file_path}")
-            # 使用内存映射优化Word文档读取
-            with open(file_path, 'rb') as f:
-                logger.info("[Word文档处理] 正在加载文档对象...")
-                doc = docx.Document(f)
-                text_parts = []
-                total_paragraphs = len(doc.paragraphs)
-                logger.info(f"[Word文档处理] 文档加载完成，总段落数: {total_paragraphs}")
-                
-                for i, paragraph in enumerate(doc.paragraphs):
-                    if time.time() - start_time > timeout:
-                        raise TimeoutError(f"处理超时（{timeout}秒）")
-                    if paragraph.text.strip():  # 只添加非空段落
-                        text_parts.append(paragraph.text)
-                    if i % 50 == 0:  # 每处理50个段落输出一次进度
-                        progress = (i / total_paragraphs) * 100
-                        elapsed_time = time.time() - start_time
-                        memory_info = process.memory_info()
-                        logger.info(f"[Word文档处理] 进度: {progress:.1f}% ({i}/{total_paragraphs} 段落)")
-                        logger.info(f"[Word文档处理] 已用时间: {elapsed_time:.1f}秒")
-                        logger.info(f"[Word文档处理] 当前内存使用: {memory_info.rss / 1024 / 1024:.1f}MB")
-                        if i > 0:
-                            avg_time_per_para = elapsed_time / i
-                            remaining_paras = total_paragraphs - i
-                            estimated_remaining_time = avg_time_per_para * remaining_paras
-                            logger.info(f"[Word文档处理] 预计剩余时间: {estimated_remaining_time:.1f}秒")
-                
-                text = '\n'.join(text_parts)
-                logger.info(f"\n[Word文档处理] 文档读取完成")
-                logger.info(f"[Word文档处理] 有效段落数: {len(text_parts)}")
-                logger.info(f"[Word文档处理] 文本总长度: {len(text)} 字符")
-                del doc, text_parts  # 释放内存
-        else:  # pdf
-            logger.info("\n[PDF文档处理] 开始读取文件...")
-            logger.info(f"[PDF文档处理] 文件路径: {file_path}")
-            # 使用pdfminer.six优化PDF处理
-            # 检查文件大小，对大文件采取特殊处理
-            if file_size > 50:  # 如果文件大于50MB
-                logger.info(f"[PDF文档处理] 大文件处理模式")
-                timeout = min(timeout, 300)  # 限制最大超时时间为5分钟
-
-            logger.info("[PDF文档处理] 正在提取文本...")
-            extract_start_time = time.time()
-            try:
-                with open(file_path, 'rb') as pdf_file:
-                    text = extract_text(
-                        pdf_file,
-                        maxpages=50,  # 限制最大页数
-                        caching=True,  # 启用缓存
-                        codec='utf-8'
-                    )
-                    if not text:
-                        raise ValueError("无法提取文本内容")
-                    
-                extract_time = time.time() - extract_start_time
-                logger.info(f"[PDF文档处理] 文本提取耗时: {extract_time:.1f}秒")
-                logger.info(f"[PDF文档处理] 文本提取完成，文本长度: {len(text)} 字符")
-            except Exception as e:
-                logger.info(f"[PDF文档处理] 文本提取失败: {str(e)}")
-                return None
-
-        logger.info("\n[分词处理] 开始进行分词...")
-        text_lower = text.lower()
-        logger.info(f"[分词处理] 文本预处理完成，准备分词")
-        batch_size = min(5000, max(1000, int(1000000 / file_size)))  # 根据文件大小动态调整批处理大小
-        words = []
-        word_positions = defaultdict(list)
-        
-        # 使用生成器优化内存使用
-        def word_generator(text):
-            logger.info("[分词处理] 初始化分词生成器...")
-            for i, word in enumerate(jieba.cut(text)):
-                if i % 1000 == 0:  # 增加检查频率
-                    check_memory_usage()
-                yield i, word
-
-        # 分批处理分词
-        word_gen = word_generator(text_lower)
-        current_batch = []
-        total_words = 0
-        batch_count = 0
-
-        logger.info("[分词处理] 开始批量处理...")
-        segment_start_time = time.time()
-        while True:
-            try:
-                if time.time() - start_time > timeout:
-                    raise TimeoutError(f"处理超时（{timeout}秒）")
-                
-                i, word = next(word_gen)
-                current_batch.append((i, word))
-                
-                if len(current_batch) >= batch_size:
-                    batch_count += 1
-                    batch_start_time = time.time()
-                    
-                    for idx, w in current_batch:
-                        words.append(w)
-                        word_positions[w].append(idx)
-                    total_words += len(current_batch)
-                    
-                    batch_time = time.time() - batch_start_time
-                    segment_time = time.time() - segment_start_time
-                    memory_info = process.memory_info()
-                    
-                    logger.info(f"\n[分词处理] 批次 {batch_count} 处理完成:")
-                    logger.info(f"[分词处理] - 本批处理耗时: {batch_time:.2f}秒")
-                    logger.info(f"[分词处理] - 总耗时: {segment_time:.2f}秒")
-                    logger.info(f"[分词处理] - 当前已处理: {total_words} 个词")
-                    logger.info(f"[分词处理] - 当前词典大小: {len(word_positions)} 个不同词")
-                    logger.info(f"[分词处理] - 当前内存使用: {memory_info.rss / 1024 / 1024:.1f}MB")
-                    logger.info(f"[分词处理] - 平均处理速度: {total_words/segment_time:.1f} 词/秒")
-                    
-                    current_batch = []
-                    
-            except StopIteration:
-                # 处理最后一批
-                if current_batch:
-                    for idx, w in current_batch:
-                        words.append(w)
-                        word_positions[w].append(idx)
-                    total_words += len(current_batch)
-                    logger.info("\n[分词处理] 处理最后一批数据完成")
-                break
+        logger.info(f"[文档处理] 初始内存使用: {process.memory_info().rss / 1024 / 1024:.2f}MB")
+
+        extractor = get_extractor(doc_type)
+        # 内容哈希用于识别被移动、复制或重复的文件；先在文件的映射上计算，
+        # 提取器再从同一打开的文件读取（命中刚读入的页缓存），文件内容只从磁盘读取一遍
+        with open(file_path, 'rb') as f:
+            content_hash, partial_hash = opened_file_hashes(f)
+            if extractor.paged:
+                # 页数不多的分页文档整体在一个任务中处理，逐页提取并分词，不限制页数；
+                # 长文档由主进程拆成页范围任务（process_page_range）
+                part = extract_page_range(file_path, doc_type, 0, None, f)
+            else:
+                # 支持流式提取的格式（docx）逐块提取、逐块分词，分词结果直接写成紧凑的词ID与位置数组
+                blocks, (terms, term_tfs, positions, _), extract_time, tokenize_time = extract_stream(
+                    extractor.iter_text(f))
+
+        if extractor.paged:
+            logger.info(f"[{extractor.label}处理] 文本提取完成，{len(part['page_lengths'])} 页，"
+                        f"{len(part['content'])} 字符，提取 {part['extract_time']:.2f}秒，"
+                        f"分词 {part['tokenize_time']:.2f}秒")
+            part['content_hash'], part['partial_hash'] = content_hash, partial_hash
+            part['process_time'] = time.time() - start_time
+            document = merge_page_ranges([part])
+            if document is not None:
+                document['tokenize_stats'] = (os.getpid(), len(part['positions']), part['tokenize_time'])
+            return document
 
+        text = ''.join(blocks)
+        blocks = None
+        logger.info(f"[{extractor.label}处理] 文档读取完成，文本总长度: {len(text)} 字符，"
+                    f"提取 {extract_time:.2f}秒")
         process_time = time.time() - start_time
-        memory_info = process.memory_info()
-        
-        logger.info(f"\n[处理完成] 文档处理结果汇总:")
-        logger.info(f"[处理完成] - 总用时: {process_time:.2f}秒")
-        logger.info(f"[处理完成] - 总词数: {len(words)}")
-        logger.info(f"[处理完成] - 不同词数: {len(word_positions)}")
-        logger.info(f"[处理完成] - 最终内存使用: {memory_info.rss / 1024 / 1024:.1f}MB")
-        logger.info(f"[处理完成] - 平均处理速度: {len(words)/process_time:.1f} 词/秒")
-
-        result = {
+        logger.info(f"[分词处理] {len(positions)} 个词，{len(terms)} 个不同词，"
+                    f"分词 {tokenize_time:.2f}秒 ({len(positions) / max(tokenize_time, 1e-6):.0f} 词/秒)，"
+                    f"总用时 {process_time:.2f}秒，内存 {process.memory_info().rss / 1024 / 1024:.1f}MB")
+
+        return {
             'path': str(file_path),
             'content': text,
             'type': doc_type,
-            'word_positions': dict(word_positions),
-            'words': words,
-            'process_time': process_time
+            'extractor_version': extractor.version,
+            'terms': terms,
+            'term_tfs': term_tfs,
+            'positions': positions,
+            'content_hash': content_hash,
+            'partial_hash': partial_hash,
+            'process_time': process_time,
+            # (工作进程号, 词数, 分词用时)，由主进程汇总为每个工作进程的分词速度
+            'tokenize_stats': (os.getpid(), len(positions), tokenize_time)
         }
-
-        # 保存到缓存
-        if cache_manager:
-            cache_manager.cache_document(file_path, result)
-            logger.info(f"[文档处理] 文档处理结果已保存到缓存")
-
-        return result
     except Exception as e:
         logger.info(f"\n错误: 处理{doc_type}文档 {file_path} 失败")
         logger.info(f"错误信息: {str(e)}")
@@ -0,0 +1,113 @@
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_P, _T, _TAB, _BR, _CR = _W + 'p', _W + 't', _W + 'tab', _W + 'br', _W + 'cr'
+_TBL, _TR, _TC = _W + 'tbl', _W + 'tr', _W + 'tc'
+# 文本框等内容在 mc:AlternateContent 中另有一份旧格式的副本，跳过副本避免文字重复
+_FALLBACK = '{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback'
+_PART = re.compile(r'word/(header|footer)\d*\.xml$')
+# 脚注和尾注；分隔线等特殊注释只含 w:separator 等元素，没有文字
+_NOTES = ('word/footnotes.xml', 'word/endnotes.xml')
+
+# extract_docx 每次产出的文本块大小（字符数）
+BLOCK_CHARS = 64 * 1024
+
+
+def iter_part_lines(source):
+    """流式解析一个 WordprocessingML 部件，按文档顺序逐行产出文本。
+
+    正文段落一段一行；表格每行一行，单元格之间用制表符分隔，
+    单元格内的多个段落（包括嵌套表格中的段落）用空格连接。
+    """
+    runs = []        # 段落栈（文本框中的段落嵌套在外层段落内），每层为该段落的文本片段
+    rows = []        # 表格栈，每层为当前行的单元格列表
+    cell = []        # 当前单元格（最外层表格）的段落
+    skip = 0         # 位于 mc:Fallback 内的层数
+    for event, elem in iterparse(source, events=('start', 'end')):
+        tag = elem.tag
+        if tag == _FALLBACK:
+            skip += 1 if event == 'start' else -1
+            if event == 'end':
+                elem.clear()
+            continue
+        if skip:
+            continue
+        if event == 'start':
+            if tag == _P:
+                runs.append([])
+            elif tag == _TBL:
+                rows.append(None)
+            elif tag == _TR and len(rows) == 1:
+                rows[-1] = []
+            continue
+        if not runs and tag in (_T, _TAB, _BR, _CR):
+            continue
+        if tag == _T:
+            runs[-1].append(elem.text or '')
+        elif tag == _TAB:
+            runs[-1].append('\t')
+        elif tag in (_BR, _CR):
+            runs[-1].append('\n')
+        elif tag == _P:
+            text = ''.join(runs.pop()).strip()
+            if rows:
+                if text:
+                    cell.append(text)
+            elif text:
+                yield text
+            elem.clear()
+        elif tag == _TC and len(rows) == 1:
+            rows[-1].append(' '.join(cell))
+            cell = []
+        elif tag == _TR and len(rows) == 1:
+            line = '\t'.join(rows[-1]).strip()
+            if line:
+                yield line
+        elif tag == _TBL:
+            rows.pop()
+            elem.clear()
+
+
+def iter_lines(file_path):
+    # 直接读取 docx 压缩包中的 XML，不构建完整的文档对象树：
+    # 先是正文（含表格），再是脚注、尾注，最后是页眉和页脚；多个页眉页脚中重复的行只保留一次
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open('word/document.xml') as part:
+            yield from iter_part_lines(part)
+        names = set(archive.namelist())
+        for name in _NOTES:
+            if name in names:
+                with archive.open(name) as part:
+                    yield from iter_part_lines(part)
+        seen = set()
+        parts = sorted((match.group(1) == 'footer', name) for name in names
+                       for match in [_PART.match(name)] if match)
+        for _, name in parts:
+            with archive.open(name) as part:
+                for line in iter_part_lines(part):
+                    if line not in seen:
+                        seen.add(line)
+                        yield line
+
+
+def extract_docx(file_path):
+    """逐块产出文档文本，各块依次拼接即为全文（各行以换行符连接）。
+
+    每块约 BLOCK_CHARS 个字符，由调用方边提取边分词，不必先在内存中拼出全文。
+    块在行首处切开，换行符留在下一块的开头，分词结果与整篇分词相同。
+    """
+    block = []
+    size = 0
+    separator = ''
+    for line in iter_lines(file_path):
+        block.append(separator + line)
+        size += len(line) + 1
+        separator = '\n'
+        if size >= BLOCK_CHARS:
+            yield ''.join(block)
+            block = []
+            size = 0
+    if block:
+        yield ''.join(block)
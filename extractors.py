@@ -0,0 +1,114 @@
+import contextlib
+import importlib
+import os
+from bisect import bisect_right
+
+# 分页格式中页数超过 PAGES_PER_TASK 的文档按页范围拆成多个任务，由多个工作进程并行提取；
+# 小于 SPLIT_MIN_BYTES 的文档不读取页数，直接整体作为一个任务（即使页数较多，提取也很快）
+PAGES_PER_TASK = 25
+SPLIT_MIN_BYTES = 256 * 1024
+
+
+class Extractor:
+    """一种文档格式的文本提取器，提取函数所在的模块在第一次使用时才导入。
+
+    非分页格式的 function(source) 返回全文，streamed 为 True 时则逐块产出全文（各块依次拼接即为全文）；
+    分页格式的 function(source, first, last) 逐页产出 [first, last) 范围内各页的文本，
+    page_counter(source) 返回页数（无法读取时为0）。
+    source 为文件路径，或已打开的二进制文件对象（见 open_source）。
+    version 为提取方式的版本号，随文档缓存，提取方式改变后加一，旧结果会重新提取。
+    """
+
+    def __init__(self, doc_type, label, module, function, version=1, page_counter=None, streamed=False):
+        self.doc_type = doc_type
+        self.label = label
+        self.module = module
+        self.function = function
+        self.version = version
+        self.page_counter = page_counter
+        self.streamed = streamed
+
+    @property
+    def paged(self):
+        return self.page_counter is not None
+
+    def _load(self, name):
+        return getattr(importlib.import_module(self.module), name)
+
+    def extract(self, file_path, *page_range):
+        return self._load(self.function)(file_path, *page_range)
+
+    def iter_text(self, file_path):
+        # 非分页格式逐块产出全文，不支持流式提取的格式整体作为一块
+        if self.streamed:
+            yield from self.extract(file_path)
+        else:
+            yield self.extract(file_path)
+
+    def count_pages(self, file_path):
+        return self._load(self.page_counter)(file_path)
+
+
+# 扩展名（小写） -> 提取器；文档类型 -> 提取器
+EXTRACTORS = {}
+EXTRACTORS_BY_TYPE = {}
+
+
+def register(extensions, extractor):
+    for extension in extensions:
+        EXTRACTORS[extension] = extractor
+    EXTRACTORS_BY_TYPE[extractor.doc_type] = extractor
+
+
+register(['.docx'], Extractor('docx', 'Word文档', 'docx_extractor', 'extract_docx', version=3, streamed=True))
+register(['.pdf'], Extractor('pdf', 'PDF文档', 'pdf_extractor', 'iter_pages', version=2,
+                             page_counter='count_pages'))
+register(['.txt'], Extractor('txt', '文本文件', 'text_extractor', 'extract_text'))
+register(['.md', '.markdown'], Extractor('md', 'Markdown文档', 'text_extractor', 'extract_text'))
+
+
+def open_source(source):
+    # 提取函数的 source 可以是文件路径，也可以是已打开的二进制文件对象（如整个文件的只读映射），
+    # 后者由调用方负责关闭
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb')
+    return contextlib.nullcontext(source)
+
+
+def extractor_for(file_path):
+    # 按扩展名查找提取器，不支持的格式返回 None
+    return EXTRACTORS.get(os.path.splitext(str(file_path))[1].lower())
+
+
+def is_document(file_path):
+    # 只处理有已注册提取器的格式；Word 打开文档时会生成 ~$ 开头的锁文件，不是真正的文档
+    name = os.path.basename(str(file_path))
+    return extractor_for(name) is not None and not name.startswith("~$")
+
+
+def get_extractor(doc_type):
+    return EXTRACTORS_BY_TYPE.get(doc_type)
+
+
+def type_label(doc_type):
+    extractor = get_extractor(doc_type)
+    return extractor.label if extractor else doc_type
+
+
+def is_current_extraction(doc):
+    # 文档是否由该格式当前版本的提取器提取；未记录版本的是版本1
+    extractor = get_extractor(doc.get('type'))
+    return (doc.get('extractor_version') or 1) == (extractor.version if extractor else 1)
+
+
+def page_ranges(page_count, pages_per_task=PAGES_PER_TASK):
+    # 把 [0, page_count) 均分为若干个不超过 pages_per_task 页的区间
+    parts = -(-page_count // pages_per_task)
+    bounds = [page_count * i // parts for i in range(parts + 1)]
+    return list(zip(bounds, bounds[1:]))
+
+
+def hit_pages(page_offsets, positions):
+    # page_offsets 为每页的 [起始字符位置, 起始词位置]，返回命中词所在的页码（从1开始）
+    token_starts = [token_start for _, token_start in page_offsets]
+    return sorted({bisect_right(token_starts, pos) for pos in positions})
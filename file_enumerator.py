@@ -0,0 +1,96 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from extractors import is_document
+import logger_config
+
+logger = logger_config.setup_logger(__name__)
+
+# 并行列目录的线程数；列目录主要等待IO（网络共享尤其明显），线程数可以多于CPU核心数
+ENUM_THREADS = 8
+# 跳过的路径：超过 Windows MAX_PATH、目录深度过大、系统目录
+MAX_PATH = 260
+MAX_DEPTH = 20
+SYSTEM_DIRS = ('windows', 'system32', 'programdata', 'application data')
+
+
+def excluded_reason(path, depth):
+    # depth 为路径解析后的层数；返回跳过的原因，不跳过时返回 None
+    if len(path) > MAX_PATH:
+        return "路径过长"
+    if depth > MAX_DEPTH:
+        return "目录深度过大"
+    if any(system_dir in path.lower() for system_dir in SYSTEM_DIRS):
+        return "系统目录"
+    return None
+
+
+class FileEnumerator:
+    """用 os.scandir 并行遍历文件夹，返回其中的文档及其修改时间和大小。
+
+    条目的类型取自 DirEntry，不需要额外的系统调用；修改时间和大小取自 DirEntry.stat，
+    Windows 上同样不需要额外的系统调用。符号链接、超长路径、过深的目录和系统目录在遍历时直接剪掉。
+    """
+
+    def __init__(self, threads=ENUM_THREADS):
+        self.threads = threads
+        self.listed_dirs = 0
+
+    def _list_directory(self, directory, depth):
+        # 列出一个目录，返回 ({文档文件名: 文件信息}, [子目录名])
+        subdirs = []
+        files = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    # follow_symlinks=False：符号链接既不是目录也不是文件，直接跳过
+                    if entry.is_dir(follow_symlinks=False):
+                        reason = excluded_reason(entry.path, depth + 1)
+                        if reason:
+                            logger.warning(f"跳过{reason}: {entry.path}")
+                            continue
+                        subdirs.append(entry.name)
+                    elif is_document(entry.name) and entry.is_file(follow_symlinks=False):
+                        reason = excluded_reason(entry.path, depth + 1)
+                        if reason:
+                            logger.warning(f"跳过{reason}: {entry.path}")
+                            continue
+                        files[entry.name] = _file_info(entry.stat(follow_symlinks=False))
+                except OSError:
+                    # 列目录之后被删除的条目
+                    continue
+        return files, subdirs
+
+    def scan(self, root):
+        # 返回 {文档路径: {'last_modified': 修改时间, 'size': 大小}}，路径格式与 str(Path) 一致
+        start_time = time.time()
+        root = os.path.normpath(root)
+        # 遍历中不跟随符号链接，各项解析后的层数等于根目录解析后的层数加上相对深度
+        root_depth = len(Path(root).resolve().parts)
+        found = {}
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            pending = {executor.submit(self._list_directory, root, root_depth): (root, root_depth)}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    directory, depth = pending.pop(future)
+                    try:
+                        files, subdirs = future.result()
+                    except OSError as e:
+                        logger.warning(f"无法读取目录: {directory}, 错误: {str(e)}")
+                        continue
+                    self.listed_dirs += 1
+                    for name, file_info in files.items():
+                        found[os.path.join(directory, name)] = file_info
+                    for name in subdirs:
+                        subdir = os.path.join(directory, name)
+                        pending[executor.submit(self._list_directory, subdir, depth + 1)] = (subdir, depth + 1)
+        logger.info(f"遍历完成: {len(found)} 个文档，列出 {self.listed_dirs} 个目录，"
+                    f"用时 {time.time() - start_time:.2f}秒")
+        return found
+
+
+def _file_info(stat):
+    return {'last_modified': int(stat.st_mtime), 'size': stat.st_size}
@@ -1,11 +1,120 @@
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from extractors import is_document
+import logger_config
 import os
+import threading
 import time
 
+logger = logger_config.setup_logger(__name__)
+
+# 事件静默 DEBOUNCE_SECONDS 后合并为一批；事件持续不断时最多等待 MAX_BATCH_DELAY
+DEBOUNCE_SECONDS = 1.0
+MAX_BATCH_DELAY = 10.0
+# 文件大小和修改时间在两次检查之间不再变化，才认为已经写入完成
+STABLE_CHECK_SECONDS = 1.0
+
+class EventQueue(QObject):
+    """把监视器的逐个事件防抖、合并成批。
+
+    同一路径的多次事件只保留最终状态；新建或修改的文件要等大小和修改时间
+    稳定后才放入批次，避免读到仍在复制中的文件。批次为
+    {'changed': [路径], 'deleted': [路径], 'moved': [(原路径, 新路径)]}，
+    按 moved、deleted、changed 的顺序应用。
+    """
+
+    batch_ready = pyqtSignal(dict)
+
+    def __init__(self):
+        super().__init__()
+        self.states = {}  # 路径 -> 'changed' 或 'deleted'
+        self.moves = []
+        self._stats = {}
+        self._first_event = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+
+    def clear(self):
+        self._timer.stop()
+        self.states.clear()
+        self.moves.clear()
+        self._stats.clear()
+        self._first_event = None
+
+    def _schedule(self, delay=DEBOUNCE_SECONDS):
+        # 每来一个事件就重新计时，但不超过第一个事件之后的最长等待时间
+        now = time.monotonic()
+        if self._first_event is None:
+            self._first_event = now
+        remaining = self._first_event + MAX_BATCH_DELAY - now
+        self._timer.start(int(max(0.0, min(delay, remaining)) * 1000))
+
+    def add_changed(self, file_path):
+        self.states[file_path] = 'changed'
+        self._is_stable(file_path)
+        self._schedule()
+
+    def add_deleted(self, file_path):
+        self.states[file_path] = 'deleted'
+        self._stats.pop(file_path, None)
+        self._schedule()
+
+    def add_moved(self, src_path, dest_path):
+        if self.states.get(src_path) == 'changed':
+            # 原文件本身还没建索引，移动后直接按新路径处理
+            self.states[src_path] = 'deleted'
+            self.states[dest_path] = 'changed'
+            self._is_stable(dest_path)
+        else:
+            # 目标路径之前的事件已被覆盖
+            self.states.pop(src_path, None)
+            self.states.pop(dest_path, None)
+            self.moves.append((src_path, dest_path))
+        self._schedule()
+
+    def _is_stable(self, file_path):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        current = (stat.st_size, stat.st_mtime)
+        previous = self._stats.get(file_path)
+        self._stats[file_path] = current
+        return current == previous
+
+    def flush(self):
+        changed, waiting, deleted = [], [], []
+        for file_path, state in self.states.items():
+            if state == 'deleted':
+                deleted.append(file_path)
+                continue
+            stable = self._is_stable(file_path)
+            if stable:
+                changed.append(file_path)
+            elif stable is not None:
+                waiting.append(file_path)
+        batch = {'changed': changed, 'deleted': deleted, 'moved': self.moves}
+
+        self.states = {file_path: 'changed' for file_path in waiting}
+        self.moves = []
+        self._first_event = None
+        for file_path in changed:
+            self._stats.pop(file_path, None)
+        if waiting:
+            # 仍在写入的文件稍后再检查
+            self._timer.start(int(STABLE_CHECK_SECONDS * 1000))
+        if changed or deleted or batch['moved']:
+            logger.info(f"文件变化批次: 新增或修改 {len(changed)} 个，删除 {len(deleted)} 个，"
+                        f"移动 {len(batch['moved'])} 个，等待写入完成 {len(waiting)} 个")
+            self.batch_ready.emit(batch)
+
 class FileWatcher(QObject):
     file_added = pyqtSignal(str)
+    file_modified = pyqtSignal(str)
+    file_deleted = pyqtSignal(str)
+    file_moved = pyqtSignal(str, str)
     
     def __init__(self):
         super().__init__()
@@ -13,19 +122,24 @@ class FileWatcher(QObject):
         self.handler = None
         self.watching = False
         self.watched_directory = None
+        # 监视线程中发出的信号排队到GUI线程，由事件队列合并成批
+        self.events = EventQueue()
+        self.file_added.connect(self.events.add_changed)
+        self.file_modified.connect(self.events.add_changed)
+        self.file_deleted.connect(self.events.add_deleted)
+        self.file_moved.connect(self.events.add_moved)
 
     def start_watching(self, directory):
+        # 路径格式与扫描器一致（os.path.normpath），事件中的路径才能与已知文件对应
+        directory = os.path.normpath(directory)
         if self.watching and self.watched_directory == directory:
             return
 
         if self.watching:
             self.stop_watching()
 
-        # 先初始化handler
+        # 先初始化handler；已有的文件不再单独遍历，由扫描器遍历后通过 add_known_files 提供
         self.handler = DocFileHandler(self)
-        
-        # 扫描目录下的所有文件
-        self.scan_existing_files(directory)
 
         self.observer = Observer()
         self.observer.schedule(self.handler, directory, recursive=True)
@@ -33,43 +147,94 @@ class FileWatcher(QObject):
         self.watching = True
         self.watched_directory = directory
 
-    def scan_existing_files(self, directory):
-        for root, _, files in os.walk(directory):
-            for file in files:
-                file_path = os.path.join(root, file)
-                _, ext = os.path.splitext(file_path)
-                if ext.lower() in [".docx", ".pdf"]:
-                    self.handler.processed_files.add(file_path)
+    def add_known_files(self, file_paths):
+        # 扫描器遍历文件夹得到的文档，之后这些文件的修改、删除和移动会被通知
+        if self.handler is not None:
+            self.handler.add_known_files(file_paths)
 
     def stop_watching(self):
         if self.observer:
             self.observer.stop()
             self.observer.join()
+            self.events.clear()
             self.watching = False
             self.watched_directory = None
 
 class DocFileHandler(FileSystemEventHandler):
+    """在监视线程中处理文件系统事件，只通知文档的变化。
+
+    processed_files 由监视线程和GUI线程（add_known_files）共同修改，读写都在 lock 内进行；
+    信号在释放锁之后发出。
+    """
+
     def __init__(self, watcher):
         super().__init__()
         self.watcher = watcher
         self.processed_files = set()
-        self.is_processing = False
+        self.lock = threading.Lock()
+
+    def add_known_files(self, file_paths):
+        with self.lock:
+            self.processed_files.update(file_paths)
 
     def on_created(self, event):
-        if event.is_directory or self.is_processing:
-            return
-            
-        file_path = event.src_path
-        if file_path in self.processed_files:
+        if event.is_directory:
+            # 新建（或复制、移入）的目录中可能已有文档，逐个通知；
+            # 之后为其中的文件收到的创建事件因已在 processed_files 中而被忽略
+            created = [os.path.join(root, name) for root, _, names in os.walk(event.src_path)
+                       for name in names]
+        else:
+            created = [event.src_path]
+        with self.lock:
+            added = [file_path for file_path in created
+                     if file_path not in self.processed_files and is_document(file_path)]
+            self.processed_files.update(added)
+        for file_path in added:
+            self.watcher.file_added.emit(file_path)
+
+    def on_modified(self, event):
+        # 只关心已经处理过的文件，新文件由 on_created 处理
+        if event.is_directory:
             return
+        with self.lock:
+            known = event.src_path in self.processed_files
+        if known:
+            self.watcher.file_modified.emit(event.src_path)
+
+    def on_deleted(self, event):
+        with self.lock:
+            if event.is_directory:
+                # 删除目录时，目录下已处理的文件逐个通知
+                prefix = os.path.join(event.src_path, '')
+                removed = [path for path in self.processed_files if path.startswith(prefix)]
+            else:
+                removed = [event.src_path] if event.src_path in self.processed_files else []
+            self.processed_files.difference_update(removed)
+        for file_path in removed:
+            self.watcher.file_deleted.emit(file_path)
 
-        _, ext = os.path.splitext(file_path)
-        
-        if ext.lower() in [".docx", ".pdf"]:
-            self.is_processing = True
-            try:
-                self.watcher.file_added.emit(file_path)
-            finally:
-                self.processed_files.add(file_path)
-                self.is_processing = False
-            self.is_processing = False
\ No newline at end of file
+    def on_moved(self, event):
+        signals = []
+        with self.lock:
+            if event.is_directory:
+                # 移动目录时，把目录下已处理的文件映射到新路径
+                src_prefix = os.path.join(event.src_path, '')
+                moves = [(path, os.path.join(event.dest_path, path[len(src_prefix):]))
+                         for path in self.processed_files if path.startswith(src_prefix)]
+            else:
+                moves = [(event.src_path, event.dest_path)]
+            for src_path, dest_path in moves:
+                src_known = src_path in self.processed_files
+                self.processed_files.discard(src_path)
+                if not is_document(dest_path):
+                    if src_known:
+                        signals.append((self.watcher.file_deleted, (src_path,)))
+                    continue
+                self.processed_files.add(dest_path)
+                if src_known:
+                    signals.append((self.watcher.file_moved, (src_path, dest_path)))
+                else:
+                    # 编辑器常先写临时文件再改名覆盖，按新文件或修改处理
+                    signals.append((self.watcher.file_added, (dest_path,)))
+        for signal, args in signals:
+            signal.emit(*args)
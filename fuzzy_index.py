@@ -0,0 +1,89 @@
+import math
+from array import array
+from collections import Counter
+from difflib import SequenceMatcher, get_close_matches
+from heapq import nlargest
+
+
+def _gram_keys(term):
+    # 以 (字符, 第k次出现) 作为键，两个词共享的键数即字符多重集的交集大小
+    counts = Counter()
+    keys = []
+    for ch in term:
+        counts[ch] += 1
+        keys.append((ch, counts[ch]))
+    return keys
+
+
+class FuzzyTermIndex:
+    """词表上的字符倒排索引，用于快速查找相似词。
+
+    get_close_matches 的结果与 difflib.get_close_matches 完全一致：
+    SequenceMatcher 的匹配字符数不超过两个词字符多重集的交集，
+    因此先用字符倒排找出交集足够大的候选词，再只对候选词计算相似度。
+    """
+
+    def __init__(self, terms=()):
+        self.terms = []
+        self.term_ids = {}
+        self.term_lengths = array('I')
+        self._grams = {}
+        self.add_terms(terms)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def add_terms(self, terms):
+        for term in terms:
+            if term in self.term_ids:
+                continue
+            term_id = len(self.terms)
+            self.term_ids[term] = term_id
+            self.terms.append(term)
+            self.term_lengths.append(len(term))
+            for key in _gram_keys(term):
+                postings = self._grams.get(key)
+                if postings is None:
+                    postings = self._grams[key] = array('I')
+                postings.append(term_id)
+
+    def candidates(self, word, cutoff):
+        # 相似度 2M/(la+lb) >= cutoff 要求 lb >= cutoff*la/(2-cutoff)，
+        # 由此得到候选词与查询词至少需要共享的字符数 min_overlap
+        word_len = len(word)
+        min_len = math.ceil(cutoff * word_len / (2 - cutoff) - 1e-9)
+        min_overlap = math.ceil(cutoff * (word_len + min_len) / 2 - 1e-9)
+        if min_overlap <= 0:
+            return None
+        max_len = math.floor((2 - cutoff) * word_len / cutoff + 1e-9)
+
+        # 前缀过滤：交集不小于 min_overlap 的词一定出现在最稀有的
+        # len(keys) - min_overlap + 1 个键中的至少一个里
+        keys = sorted(_gram_keys(word), key=lambda key: len(self._grams.get(key, ())))
+        found = set()
+        for key in keys[:len(keys) - min_overlap + 1]:
+            found.update(self._grams.get(key, ()))
+        return [self.terms[term_id] for term_id in found
+                if min_len <= self.term_lengths[term_id] <= max_len]
+
+    def get_close_matches(self, word, n=3, cutoff=0.6):
+        if not n > 0:
+            raise ValueError("n must be > 0: %r" % (n,))
+        if not 0.0 <= cutoff <= 1.0:
+            raise ValueError("cutoff must be in [0.0, 1.0]: %r" % (cutoff,))
+        candidates = self.candidates(word, cutoff)
+        if candidates is None:
+            return get_close_matches(word, self.terms, n, cutoff)
+
+        # 与 difflib.get_close_matches 相同的判定与排序规则
+        result = []
+        s = SequenceMatcher()
+        s.set_seq2(word)
+        for x in candidates:
+            s.set_seq1(x)
+            if s.real_quick_ratio() >= cutoff and \
+               s.quick_ratio() >= cutoff and \
+               s.ratio() >= cutoff:
+                result.append((s.ratio(), x))
+        result = nlargest(n, result)
+        return [x for score, x in result]
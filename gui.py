@@ -1,27 +1,46 @@
+import threading
+from collections import Counter
+from functools import partial
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLineEdit, QPushButton, QProgressBar, QTextEdit,
                              QFileDialog)
 from PyQt6.QtGui import QTextCursor, QTextCharFormat, QColor, QTextDocument
 from PyQt6.QtCore import Qt
-from search_engine import DocumentScanner, search_documents
+from search_engine import DocumentScanner, create_result_cache, search_documents
+from search_index import SearchIndex
+from query import parse_query
 from file_watcher import FileWatcher
+from extractors import type_label
+from tokenizer import load_dictionary
 import logger_config
-import jieba
-import os
 
 logger = logger_config.setup_logger(__name__)
 
+# 每次搜索返回的结果数量，点击"更多结果"时继续向后取一页
+SEARCH_PAGE_SIZE = 50
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Word文档全文检索系统")
         self.setMinimumSize(800, 600)
-        self.documents = []
-        self.inverted_index = {}  # 初始化inverted_index
+        self.index = SearchIndex()
+        # 结果按索引版本号缓存，扫描完成或增量更新后版本号改变，旧结果自然失效
+        self.result_cache = create_result_cache()
         self.is_scanning = False  # 添加扫描状态标志
+        self.search_keyword = ""
+        self.search_results = []
+        self.scanner = None
+        # 每次启动扫描加一；被取消的扫描排队中的信号可能在新扫描开始后才送达，据此忽略
+        self.scan_generation = 0
+        # 等待增量处理的文件，以及完整扫描期间暂存的文件变化批次
+        self.pending_files = set()
+        self.pending_batches = []
         self.file_watcher = FileWatcher()
-        self.file_watcher.file_added.connect(self.handle_new_file)
+        self.file_watcher.events.batch_ready.connect(self.handle_file_changes)
         self.setup_ui()
+        # 结巴词典在后台线程中加载，窗口不必等待，第一次搜索时通常已经加载完成
+        threading.Thread(target=load_dictionary, daemon=True).start()
 
     def setup_ui(self):
         # 创建主窗口部件和布局
@@ -41,12 +60,16 @@ class MainWindow(QMainWindow):
         # 创建搜索栏
         search_layout = QHBoxLayout()
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("输入搜索关键词")
+        self.search_input.setPlaceholderText("输入搜索关键词（支持 AND/OR/NOT、\"短语\"、NEAR/5、type:pdf、path:）")
         self.search_input.returnPressed.connect(self.search_documents)
         search_button = QPushButton("搜索")
         search_button.clicked.connect(self.search_documents)
+        self.more_button = QPushButton("更多结果")
+        self.more_button.clicked.connect(self.load_more_results)
+        self.more_button.setVisible(False)
         search_layout.addWidget(self.search_input)
         search_layout.addWidget(search_button)
+        search_layout.addWidget(self.more_button)
 
         # 创建进度条
         self.progress_bar = QProgressBar()
@@ -66,9 +89,12 @@ class MainWindow(QMainWindow):
         folder = QFileDialog.getExistingDirectory(self, "选择文件夹")
         if folder:
             # 清空现有数据
-            self.documents = []
-            self.inverted_index = {}
+            self.index = SearchIndex()
+            self.result_cache.clear()
+            self.pending_files.clear()
+            self.pending_batches.clear()
             self.results_display.clear()
+            self.more_button.setVisible(False)
             # 如果选择了新文件夹，更新路径显示并开始扫描
             self.folder_path.setText(folder)
             # 先停止之前的监视器
@@ -78,68 +104,140 @@ class MainWindow(QMainWindow):
             # 开始监控文件夹变化
             self.file_watcher.start_watching(folder)
 
-    def handle_new_file(self, file_path):
-        if not self.is_scanning and os.path.exists(file_path):
-            logger.info(f"检测到新文件: {file_path}")
-            # 只处理新文件
-            self.scanner = DocumentScanner(os.path.dirname(file_path), [file_path])
-            self.scanner.progress_updated.connect(self.update_progress)
-            self.scanner.scan_completed.connect(self.handle_new_file_scan_completed)
-            self.scanner.start()
-
-    def handle_new_file_scan_completed(self, scan_result):
-        new_documents, new_inverted_index = scan_result
-        if new_documents:
-            # 将新文档添加到现有文档列表中
-            self.documents.extend(new_documents)
-            # 更新倒排索引
-            for word, positions in new_inverted_index.items():
-                if word not in self.inverted_index:
-                    self.inverted_index[word] = []
-                # 调整文档ID以匹配新的位置
-                adjusted_positions = [(len(self.documents) - len(new_documents) + doc_id, pos) 
-                                    for doc_id, pos in positions]
-                self.inverted_index[word].extend(adjusted_positions)
-            
-            # 更新显示
-            docx_count = sum(1 for doc in self.documents if doc.get('type') == 'docx')
-            pdf_count = sum(1 for doc in self.documents if doc.get('type') == 'pdf')
-            self.results_display.setText(f"已扫描 {docx_count} 个Word文档和 {pdf_count} 个PDF文档")
+    def handle_file_changes(self, batch):
+        if self.is_scanning:
+            # 完整扫描期间变化的文件可能还没有提交到索引，变化留到扫描完成后再应用
+            self.pending_batches.append(batch)
+            return
+        changed = False
+        for src_path, dest_path in batch['moved']:
+            if self.index.rename_path(src_path, dest_path):
+                changed = True
+            else:
+                # 原路径不在索引中，按新文件处理
+                self.pending_files.add(dest_path)
+        for file_path in batch['deleted']:
+            self.pending_files.discard(file_path)
+            changed = self.index.remove_path(file_path) or changed
+        self.pending_files.update(batch['changed'])
+        if changed:
+            self.show_document_counts()
+        self.start_incremental_scan()
+
+    def start_incremental_scan(self):
+        # 同一时间只运行一个扫描，运行期间到达的文件在扫描完成后作为下一批处理
+        if self.is_scanning or not self.pending_files:
+            return
+        if self.scanner is not None and self.scanner.isRunning():
+            return
+        files = sorted(self.pending_files)
+        self.pending_files.clear()
+        logger.info(f"增量处理 {len(files)} 个新增或修改的文件")
+        self.start_scanner(self.folder_path.text(), files, self.handle_new_file_scan_completed)
+
+    def start_scanner(self, directory, specific_files, on_completed):
+        # 扫描器是单例，先断开上一次扫描连接的槽，避免重复处理结果
+        self.scanner = DocumentScanner(directory, specific_files)
+        for signal in (self.scanner.progress_updated, self.scanner.segment_ready, self.scanner.scan_completed,
+                       self.scanner.files_listed):
+            try:
+                signal.disconnect()
+            except TypeError:
+                pass
+        self.scan_generation += 1
+        current = partial(self.handle_scan_signal, self.scan_generation)
+        self.scanner.progress_updated.connect(partial(current, self.update_progress))
+        self.scanner.files_listed.connect(partial(current, self.file_watcher.add_known_files))
+        # 完整扫描和增量扫描都逐段加入当前索引，已提交的段可以直接搜索
+        self.scanner.segment_ready.connect(partial(current, self.handle_segment_ready))
+        # 扫描被取消时也会发出完成信号，由 on_completed 恢复界面状态并处理暂存的变化
+        self.scanner.scan_completed.connect(partial(current, on_completed))
+        self.scanner.start()
+
+    def handle_scan_signal(self, generation, slot, *args):
+        # 只处理当前这次扫描的信号
+        if generation == self.scan_generation:
+            slot(*args)
+
+    def handle_new_file_scan_completed(self):
+        self.show_document_counts()
+        self.start_incremental_scan()
+
+    def show_document_counts(self):
+        documents = self.index.live_documents()
+        type_counts = Counter(doc.get('type') for doc in documents)
+        self.results_display.setText("已扫描 " + ("、".join(
+            f"{count} 个{type_label(doc_type)}" for doc_type, count in sorted(type_counts.items())) or "0 个文档"))
+
+    def stop_scanner(self):
+        # 取消仍在运行的扫描，等待扫描线程退出后才能复用扫描器
+        if self.scanner is not None and self.scanner.isRunning():
+            self.scanner.cancel()
+            self.scanner.wait()
+
+    def closeEvent(self, event):
+        self.stop_scanner()
+        self.file_watcher.stop_watching()
+        if self.scanner is not None:
+            self.scanner.shutdown_pool()
+        super().closeEvent(event)
 
     def scan_documents(self, folder):
+        self.stop_scanner()
         self.is_scanning = True  # 设置扫描状态
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
-        self.scanner = DocumentScanner(folder)
-        self.scanner.progress_updated.connect(self.update_progress)
-        self.scanner.scan_completed.connect(self.scan_finished)
-        self.scanner.start()
+        # 扫描期间逐段加入新索引，已提交的段可以直接搜索
+        self.index = SearchIndex()
+        self.start_scanner(folder, None, self.scan_finished)
 
     def update_progress(self, value):
         self.progress_bar.setValue(value)
 
-    def scan_finished(self, scan_result):
-        self.documents, self.inverted_index = scan_result
+    def handle_segment_ready(self, segment):
+        # 同一路径的旧版本会被打上墓碑，内容相同的文件只记录为重复路径
+        self.index.add_segment(*segment)
+        if self.is_scanning:
+            self.progress_bar.setFormat(f"%p%  已可搜索 {self.index.num_docs} 个文档")
+
+    def scan_finished(self):
+        # 扫描期间提交的各段就是最终索引，由 SearchIndex 在后台合并；需要时合并后写入段文件
+        # （扫描被取消时不保存）
+        self.scanner.save_index(self.index)
+        self.progress_bar.setFormat("%p%")
         self.progress_bar.setVisible(False)
         self.is_scanning = False  # 重置扫描状态
-        docx_count = sum(1 for doc in self.documents if doc.get('type') == 'docx')
-        pdf_count = sum(1 for doc in self.documents if doc.get('type') == 'pdf')
-        self.results_display.setText(f"已扫描 {docx_count} 个Word文档和 {pdf_count} 个PDF文档")
+        self.more_button.setVisible(False)
+        self.show_document_counts()
+        batches, self.pending_batches = self.pending_batches, []
+        for batch in batches:
+            self.handle_file_changes(batch)
 
     def search_documents(self):
-        if self.is_scanning:  # 检查是否正在扫描
-            self.results_display.setText("文档正在扫描中，请等待扫描完成后再进行搜索")
-            return
-
-        keyword = self.search_input.text().lower()
+        # 扫描期间也可以搜索，结果只包含已经提交的段
+        # 不转小写：AND/OR/NOT 运算符需要大写，词语在解析查询时统一转小写
+        keyword = self.search_input.text().strip()
         if not keyword:
             return
 
-        # 执行搜索
-        results = search_documents(self.documents, self.inverted_index, keyword)
+        # 执行搜索，只取第一页
+        self.search_keyword = keyword
+        self.search_results = search_documents(self.index, keyword,
+                                               limit=SEARCH_PAGE_SIZE, cache=self.result_cache)
+        self.more_button.setVisible(len(self.search_results) == SEARCH_PAGE_SIZE)
 
         # 显示搜索结果
-        self.display_search_results(results, keyword)
+        self.display_search_results(self.search_results, keyword)
+
+    def load_more_results(self):
+        if not self.search_keyword:
+            return
+        results = search_documents(self.index, self.search_keyword,
+                                   limit=SEARCH_PAGE_SIZE, offset=len(self.search_results),
+                                   cache=self.result_cache)
+        self.search_results.extend(results)
+        self.more_button.setVisible(len(results) == SEARCH_PAGE_SIZE)
+        self.display_search_results(self.search_results, self.search_keyword)
 
     def display_search_results(self, results, keyword):
         if not results:
@@ -157,12 +255,16 @@ class MainWindow(QMainWindow):
             html_content += f"\n<p>文档 {i+1}:</p>"
             html_content += f"<p><b style='font-size: 14px;'>路径: {result['path']}</b></p>"
             html_content += f"<p>类型: {result['type'].upper()}</p>"
+            if result.get('duplicates'):
+                html_content += f"<p>相同内容的文件: {'<br>'.join(result['duplicates'])}</p>"
             html_content += f"<p>相关度得分: {result['score']:.4f}</p>"
+            if result.get('pages'):
+                html_content += f"<p>命中页码: {', '.join(map(str, result['pages']))}</p>"
 
             # 显示文档内容预览
             content = result['content'][:500] + "..." if len(result['content']) > 500 else result['content']
             # 高亮关键词
-            for kw in jieba.lcut(keyword):
+            for kw in parse_query(keyword).terms:
                 content = content.replace(kw, f"<span style='background-color: yellow;'>{kw}</span>")
             html_content += f"<p>内容预览:</p>"
             html_content += f"<p>{content}</p><br>"
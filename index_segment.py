@@ -0,0 +1,179 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from postings import PostingsStore
+import logger_config
+
+logger = logger_config.setup_logger(__name__)
+
+# 段文件格式：
+#   头部  magic(4s) version(I) meta_len(Q)
+#   元数据 JSON（文档表、各数据区的偏移与长度）
+#   数据区 每个区按8字节对齐，可直接以 memoryview 映射为类型化数组
+SEGMENT_MAGIC = b'WSEG'
+SEGMENT_VERSION = 6
+_HEADER = struct.Struct('<4sIQ')
+_ALIGN = 8
+
+# 文档表中持久化的字段，content 单独存放在数据区；
+# duplicates 为内容相同的其它文件 [[路径, 修改时间, 大小], ...]；
+# extractor_version 为提取方式的版本号，见 extractors.Extractor；
+# page_offsets 为PDF每页的 [起始字符位置, 起始词位置]
+DOCUMENT_FIELDS = ('path', 'type', 'last_modified', 'size', 'content_hash', 'duplicates', 'extractor_version',
+                   'page_offsets')
+
+
+class SegmentDocument(dict):
+    """段文件中的文档：正文留在段文件的映射中，读取 doc['content'] 时才解码。
+
+    打开段时只解析文档表，不把全部正文读入内存；正文通常只有返回给界面的结果才会读取。
+    """
+
+    __slots__ = ('_content',)
+
+    def __init__(self, fields, content):
+        super().__init__(fields)
+        self._content = content
+
+    def __missing__(self, key):
+        if key == 'content':
+            return str(self._content, 'utf-8')
+        raise KeyError(key)
+
+
+def _versions(path):
+    # 返回 [(版本号, 文件路径)]，按版本号升序；旧版本程序写入的 path 本身为版本0
+    directory, name = os.path.split(path)
+    versions = []
+    try:
+        entries = os.listdir(directory or '.')
+    except OSError:
+        return versions
+    for entry in entries:
+        if entry == name:
+            versions.append((0, os.path.join(directory, entry)))
+        elif entry.startswith(name + '.') and entry[len(name) + 1:].isdigit():
+            versions.append((int(entry[len(name) + 1:]), os.path.join(directory, entry)))
+    return sorted(versions)
+
+
+def _remove_versions(versions):
+    # 旧版本可能仍被映射（Windows 上无法删除被映射的文件），删除失败时留到下次保存或加载时再删
+    for _, version_path in versions:
+        try:
+            os.remove(version_path)
+        except OSError:
+            pass
+
+
+def _encode_strings(strings):
+    offsets = array('Q', [0])
+    blob = bytearray()
+    for s in strings:
+        blob += s.encode('utf-8') if isinstance(s, str) else s
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+def _decode_strings(offsets, blob):
+    return [str(blob[offsets[i]:offsets[i + 1]], 'utf-8') for i in range(len(offsets) - 1)]
+
+
+def save_segment(path, documents, store):
+    # 每次保存写入新版本的文件 path.N，不替换当前可能仍被映射的文件，写完后删除旧版本
+    path = str(path)
+    versions = _versions(path)
+    version_path = f"{path}.{versions[-1][0] + 1 if versions else 1}"
+    term_offsets, term_blob = _encode_strings(store.terms)
+    # 仍在映射中的正文直接复制原始字节，不必解码
+    content_offsets, content_blob = _encode_strings(
+        doc._content if isinstance(doc, SegmentDocument) and 'content' not in doc else doc['content']
+        for doc in documents)
+    sections = [
+        ('term_starts', store.term_starts),
+        ('doc_ids', store.doc_ids),
+        ('pos_starts', store.pos_starts),
+        ('positions', store.positions),
+        ('doc_lengths', store.doc_lengths),
+        ('doc_norms', store.doc_norms),
+        ('term_offsets', term_offsets),
+        ('term_blob', term_blob),
+        ('content_offsets', content_offsets),
+        ('content_blob', content_blob),
+    ]
+
+    # 先计算各区偏移（相对数据区起点），再写入元数据
+    layout = {}
+    offset = 0
+    for name, data in sections:
+        nbytes = len(memoryview(data).cast('B'))
+        layout[name] = [offset, nbytes]
+        offset += nbytes + (-nbytes % _ALIGN)
+
+    meta = json.dumps({
+        'byteorder': sys.byteorder,
+        'sections': layout,
+        'documents': [{field: doc.get(field) for field in DOCUMENT_FIELDS} for doc in documents],
+    }, ensure_ascii=False).encode('utf-8')
+    meta += b' ' * (-(len(meta) + _HEADER.size) % _ALIGN)
+
+    # 先写临时文件再改名，避免中途失败留下损坏的段
+    tmp_path = f"{version_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, len(meta)))
+        f.write(meta)
+        for name, data in sections:
+            f.write(data)
+            f.write(b'\0' * (-layout[name][1] % _ALIGN))
+    os.replace(tmp_path, version_path)
+    _remove_versions(versions)
+    logger.info(f"索引段已保存: {version_path} ({os.path.getsize(version_path) / 1024 / 1024:.2f}MB)")
+
+
+def load_segment(path):
+    # 加载最新版本的段文件；文档正文留在映射中，见 SegmentDocument
+    versions = _versions(str(path))
+    if not versions:
+        return None
+    _remove_versions(versions[:-1])
+    path = versions[-1][1]
+    try:
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_len = _HEADER.unpack_from(mm, 0)
+        if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            logger.info(f"索引段版本不匹配，忽略: {path}")
+            mm.close()
+            return None
+        meta = json.loads(mm[_HEADER.size:_HEADER.size + meta_len])
+        if meta['byteorder'] != sys.byteorder:
+            logger.info(f"索引段字节序不匹配，忽略: {path}")
+            mm.close()
+            return None
+
+        base = _HEADER.size + meta_len
+        view = memoryview(mm)
+
+        def section(name, typecode=None):
+            start, nbytes = meta['sections'][name]
+            data = view[base + start:base + start + nbytes]
+            return data.cast(typecode) if typecode else data
+
+        terms = _decode_strings(section('term_offsets', 'Q'), section('term_blob'))
+        content_offsets = section('content_offsets', 'Q')
+        content_blob = section('content_blob')
+        store = PostingsStore(terms, section('term_starts', 'Q'), section('doc_ids', 'I'),
+                              section('pos_starts', 'Q'), section('positions', 'I'),
+                              section('doc_lengths', 'I'), buffer=mm,
+                              doc_norms=section('doc_norms', 'B'))
+        documents = [SegmentDocument(doc, content_blob[content_offsets[i]:content_offsets[i + 1]])
+                     for i, doc in enumerate(meta['documents'])]
+        logger.info(f"已加载索引段: {path}，文档数: {len(documents)}，词项数: {len(terms)}")
+        return documents, store
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        logger.error(f"加载索引段失败: {path}, 错误: {str(e)}")
+        return None
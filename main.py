@@ -1,31 +1,61 @@
+import time
 import sys
-from PyQt6.QtWidgets import QApplication
-from gui import MainWindow
 import logger_config
-from PyQt6.QtNetwork import QLocalServer, QLocalSocket
 
 logger = logger_config.setup_logger(__name__)
 
-class SingleApplication(QApplication):
-    def __init__(self, argv):
-        super().__init__(argv)
-        self._server = None
-        self._socket = QLocalSocket()
-        self._socket.connectToServer("WordSearchSystem")
-        
-        if self._socket.waitForConnected():
-            # 如果已经有实例在运行，则退出
-            sys.exit(0)
-        else:
-            # 创建并启动服务器
-            self._server = QLocalServer()
-            self._server.removeServer("WordSearchSystem")
-            self._server.listen("WordSearchSystem")
+# 启动后检查这些模块是否已被导入，它们应在第一次使用时才导入
+LAZY_MODULES = ('jieba', 'pdfminer', 'docx_extractor', 'text_extractor')
+
+def report_startup(timings, eager, window):
+    # 窗口第一次进入事件循环后调用：输出各阶段用时，并测量一个工作进程从启动到完成第一个任务的用时，然后退出
+    import psutil
+    from PyQt6.QtWidgets import QApplication
+    from task_pool import TaskPool
+    from tokenizer import init_worker, lcut, load_dictionary
+    timings['首次显示窗口'] = time.perf_counter() - timings.pop('_shown')
+    total = time.time() - psutil.Process().create_time()
+    # 与扫描时创建进程池一样，先等后台线程加载完词典，fork 出的工作进程不会继承被占用的锁
+    dictionary_start = time.perf_counter()
+    load_dictionary()
+    timings['等待后台词典加载'] = time.perf_counter() - dictionary_start
+    worker_start = time.perf_counter()
+    pool = TaskPool(1, initializer=init_worker)
+    list(pool.run(lcut, ['启动'], lambda _: (60, 1024)))
+    pool.terminate()
+    timings['工作进程启动并完成第一个任务'] = time.perf_counter() - worker_start
+    lines = [f"[启动耗时] 进程启动到窗口显示: {total:.3f}秒"]
+    lines += [f"[启动耗时] {name}: {seconds:.3f}秒" for name, seconds in timings.items()]
+    lines.append(f"[启动耗时] 启动时已导入的延迟模块: {', '.join(eager) or '无'}")
+    for line in lines:
+        logger.info(line)
+    window.close()
+    QApplication.quit()
 
 def main():
-    app = SingleApplication(sys.argv)
+    # --profile-startup: 测量并输出冷启动各阶段的用时后退出
+    profile_startup = '--profile-startup' in sys.argv
+    argv = [arg for arg in sys.argv if arg != '--profile-startup']
+    timings = {}
+    # Qt、界面和检索模块都在这里导入：spawn 方式的工作进程会以 __mp_main__ 重新导入本模块，
+    # 模块顶层只导入日志，工作进程不加载 Qt
+    import_start = time.perf_counter()
+    from PyQt6.QtCore import QTimer
+    from single_application import SingleApplication
+    import_time = time.perf_counter() - import_start
+    # 已有实例在运行时在这里退出，不必再导入界面模块
+    app = SingleApplication(argv)
+    gui_import_start = time.perf_counter()
+    from gui import MainWindow
+    timings['导入模块'] = import_time + time.perf_counter() - gui_import_start
+    eager = [name for name in LAZY_MODULES if name in sys.modules]
+    window_start = time.perf_counter()
     window = MainWindow()
     window.show()
+    timings['创建主窗口'] = time.perf_counter() - window_start
+    if profile_startup:
+        timings['_shown'] = time.perf_counter()
+        QTimer.singleShot(0, lambda: report_startup(timings, eager, window))
     sys.exit(app.exec())
 
 if __name__ == '__main__':
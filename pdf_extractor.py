@@ -0,0 +1,93 @@
+from io import StringIO
+
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import LITERAL_PAGE, LITERAL_PAGES, PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import dict_value, list_value, resolve1
+
+from extractors import open_source
+
+
+def count_pages(source):
+    # 读取页树根节点中记录的页数，不解析页面内容；无法读取时返回0（按整个文档处理）
+    try:
+        with open_source(source) as pdf_file:
+            document = PDFDocument(PDFParser(pdf_file))
+            count = resolve1(resolve1(document.catalog['Pages']).get('Count'))
+            if isinstance(count, int) and count > 0:
+                return count
+            return sum(1 for _ in PDFPage.create_pages(document))
+    except Exception:
+        return 0
+
+
+def iter_page_objects(document, first=0, last=None):
+    """沿页树逐个产出 [first, last) 范围内的页对象，last 为 None 时到最后一页。
+
+    整棵子树都在 first 之前时按其 Count 跳过，不读取其中的页；到达 last 后不再继续遍历，
+    因此各页范围任务只读取自己的页。没有页树时退回 PDFPage.create_pages 逐页枚举。
+    """
+    if 'Pages' not in document.catalog:
+        for page_no, page in enumerate(PDFPage.create_pages(document)):
+            if last is not None and page_no >= last:
+                break
+            if page_no >= first:
+                yield page
+        return
+
+    page_no = 0
+    visited = set()
+
+    def walk(ref, inherited):
+        nonlocal page_no
+        objid = getattr(ref, 'objid', None)
+        if objid is not None:
+            # 防止页树中的循环引用
+            if objid in visited:
+                return
+            visited.add(objid)
+        node = dict_value(ref).copy()
+        for key, value in inherited.items():
+            if key in PDFPage.INHERITABLE_ATTRS and key not in node:
+                node[key] = value
+        node_type = node.get('Type', node.get('type'))
+        if node_type is LITERAL_PAGES and 'Kids' in node:
+            count = resolve1(node.get('Count'))
+            if isinstance(count, int) and count > 0 and page_no + count <= first:
+                page_no += count
+                return
+            for child in list_value(node['Kids']):
+                if last is not None and page_no >= last:
+                    return
+                yield from walk(child, node)
+        elif node_type is LITERAL_PAGE:
+            if page_no >= first:
+                yield PDFPage(document, objid, node, None)
+            page_no += 1
+
+    yield from walk(document.catalog['Pages'], {})
+
+
+def iter_pages(source, first=0, last=None):
+    """逐页提取 [first, last) 范围内各页的文本，last 为 None 时到最后一页。
+
+    每页文本以换页符结尾，与 pdfminer.high_level.extract_text 的输出相同。
+    """
+    resources = PDFResourceManager(caching=True)
+    output = StringIO()
+    device = TextConverter(resources, output, codec='utf-8', laparams=LAParams())
+    interpreter = PDFPageInterpreter(resources, device)
+    try:
+        with open_source(source) as pdf_file:
+            document = PDFDocument(PDFParser(pdf_file))
+            for page in iter_page_objects(document, first, last):
+                interpreter.process_page(page)
+                text = output.getvalue()
+                output.seek(0)
+                output.truncate()
+                yield text
+    finally:
+        device.close()
@@ -0,0 +1,292 @@
+import sys
+from array import array
+from bisect import bisect_left
+
+from fuzzy_index import FuzzyTermIndex
+
+
+def pack_word_positions(word_positions):
+    # 把 {词: [位置]} 压成 (词列表, 各词的词频, 按词分组的位置数组)
+    terms = list(word_positions)
+    term_tfs = array('I', (len(positions) for positions in word_positions.values()))
+    positions = array('I')
+    for word_pos in word_positions.values():
+        positions.extend(word_pos)
+    return terms, term_tfs, positions
+
+
+def _long_to_int4(i):
+    # 4位有效数字的浮点编码：低3位为尾数（最高位隐含），其余为指数
+    num_bits = i.bit_length()
+    if num_bits < 4:
+        return i
+    shift = num_bits - 4
+    return ((i >> shift) & 0x07) | ((shift + 1) << 3)
+
+
+def _int4_to_long(i):
+    bits = i & 0x07
+    shift = (i >> 3) - 1
+    return bits if shift == -1 else (bits | 0x08) << shift
+
+
+# 文档长度量化为1字节（与 Lucene 的 SmallFloat.intToByte4 相同）：
+# 小于 _NORM_EXACT 的长度精确保存，更长的文档按对数刻度保留约3位有效数字
+_NORM_EXACT = 255 - _long_to_int4(2 ** 31 - 1)
+
+
+def encode_norm(doc_length):
+    if doc_length < _NORM_EXACT:
+        return doc_length
+    return _NORM_EXACT + _long_to_int4(doc_length - _NORM_EXACT)
+
+
+def decode_norm(norm):
+    if norm < _NORM_EXACT:
+        return norm
+    return _NORM_EXACT + _int4_to_long(norm - _NORM_EXACT)
+
+
+# 量化值 -> 近似文档长度，打分时按量化值查表
+NORM_LENGTHS = [decode_norm(norm) for norm in range(256)]
+
+
+def encode_norms(doc_lengths):
+    return array('B', map(encode_norm, doc_lengths))
+
+
+class PostingsStore:
+    """紧凑的倒排索引：词项字典 + 连续的类型化数组。
+
+    词项 t 的倒排记录位于 doc_ids[term_starts[t]:term_starts[t+1]]，
+    第 i 条记录的词位置位于 positions[pos_starts[i]:pos_starts[i+1]]。
+    每个词项内部的文档ID严格递增。文档频率由 term_starts 直接得到，
+    doc_lengths 保存每个文档的词数，doc_norms 为建索引时量化好的1字节长度，
+    打分时只需按量化值查表。
+    """
+
+    def __init__(self, terms=None, term_starts=None, doc_ids=None,
+                 pos_starts=None, positions=None, doc_lengths=None,
+                 buffer=None, doc_norms=None):
+        self.terms = terms if terms is not None else []
+        self.term_ids = {term: term_id for term_id, term in enumerate(self.terms)}
+        self.term_starts = term_starts if term_starts is not None else array('Q', [0])
+        self.doc_ids = doc_ids if doc_ids is not None else array('I')
+        self.pos_starts = pos_starts if pos_starts is not None else array('Q', [0])
+        self.positions = positions if positions is not None else array('I')
+        self.doc_lengths = doc_lengths if doc_lengths is not None else array('I')
+        self.doc_norms = doc_norms if doc_norms is not None else encode_norms(self.doc_lengths)
+        # 从段文件映射时，数组是 mmap 上的 memoryview，需要保持映射存活
+        self._buffer = buffer
+        self._fuzzy_index = None
+        # 打分用的 NumPy 视图，由 scoring.postings_arrays 首次使用时创建
+        self._arrays = None
+
+    def __len__(self):
+        return len(self.terms)
+
+    @property
+    def num_docs(self):
+        return len(self.doc_lengths)
+
+    @property
+    def fuzzy_index(self):
+        # 相似词索引按需构建
+        if self._fuzzy_index is None:
+            self._fuzzy_index = FuzzyTermIndex(self.terms)
+        return self._fuzzy_index
+
+    def term_range(self, term):
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return 0, 0
+        return self.term_starts[term_id], self.term_starts[term_id + 1]
+
+    def doc_freq(self, term):
+        start, end = self.term_range(term)
+        return end - start
+
+    def postings(self, term):
+        # 逐文档返回 (doc_id, positions)，positions 为只读的数组视图
+        start, end = self.term_range(term)
+        positions = memoryview(self.positions)
+        for i in range(start, end):
+            yield self.doc_ids[i], positions[self.pos_starts[i]:self.pos_starts[i + 1]]
+
+    def doc_positions(self, term, doc_id):
+        # 在词项的文档ID列表中二分查找，返回该文档内的词位置（不存在时为空）
+        start, end = self.term_range(term)
+        i = bisect_left(self.doc_ids, doc_id, start, end)
+        if i == end or self.doc_ids[i] != doc_id:
+            return ()
+        return self.positions[self.pos_starts[i]:self.pos_starts[i + 1]]
+
+    def select(self, keep_doc_ids):
+        # 只保留指定的文档，并把文档ID按原顺序重新压缩编号
+        remap = {}
+        for doc_id in sorted(keep_doc_ids):
+            remap[doc_id] = len(remap)
+
+        terms = []
+        term_starts = array('Q', [0])
+        doc_ids = array('I')
+        pos_starts = array('Q')
+        positions = array('I')
+        for term_id, term in enumerate(self.terms):
+            for i in range(self.term_starts[term_id], self.term_starts[term_id + 1]):
+                new_id = remap.get(self.doc_ids[i])
+                if new_id is None:
+                    continue
+                doc_ids.append(new_id)
+                pos_starts.append(len(positions))
+                positions.extend(self.positions[self.pos_starts[i]:self.pos_starts[i + 1]])
+            if len(doc_ids) > term_starts[-1]:
+                terms.append(term)
+                term_starts.append(len(doc_ids))
+        pos_starts.append(len(positions))
+        doc_lengths = array('I', (self.doc_lengths[doc_id] for doc_id in remap))
+        doc_norms = array('B', (self.doc_norms[doc_id] for doc_id in remap))
+        return PostingsStore(terms, term_starts, doc_ids, pos_starts, positions, doc_lengths,
+                             doc_norms=doc_norms)
+
+    def nbytes(self):
+        # 估算索引占用的内存（数组 + 词项字典）
+        size = sum(len(arr) * arr.itemsize for arr in
+                   (self.term_starts, self.doc_ids, self.pos_starts, self.positions,
+                    self.doc_lengths, self.doc_norms))
+        size += sys.getsizeof(self.terms) + sys.getsizeof(self.term_ids)
+        size += sum(sys.getsizeof(term) for term in self.terms)
+        return size
+
+
+def merge_stores(stores):
+    # 多路合并：各索引的文档依次接在前一个之后，每个词项的倒排记录只复制一次
+    terms = []
+    seen = set()
+    for store in stores:
+        for term in store.terms:
+            if term not in seen:
+                seen.add(term)
+                terms.append(term)
+
+    doc_offsets = []
+    num_docs = 0
+    for store in stores:
+        doc_offsets.append(num_docs)
+        num_docs += store.num_docs
+
+    doc_ids = array('I')
+    pos_starts = array('Q')
+    positions = array('I')
+    term_starts = array('Q', [0])
+    for term in terms:
+        for store, doc_offset in zip(stores, doc_offsets):
+            term_id = store.term_ids.get(term)
+            if term_id is None:
+                continue
+            _append_range(store, store.term_starts[term_id], store.term_starts[term_id + 1],
+                          doc_offset, doc_ids, pos_starts, positions)
+        term_starts.append(len(doc_ids))
+    pos_starts.append(len(positions))
+    doc_lengths = array('I')
+    doc_norms = array('B')
+    for store in stores:
+        doc_lengths.extend(store.doc_lengths)
+        doc_norms.extend(store.doc_norms)
+    return PostingsStore(terms, term_starts, doc_ids, pos_starts, positions, doc_lengths,
+                         doc_norms=doc_norms)
+
+
+def _append_range(store, start, end, doc_offset, doc_ids, pos_starts, positions):
+    if start == end:
+        return
+    if doc_offset:
+        doc_ids.extend(doc_id + doc_offset for doc_id in store.doc_ids[start:end])
+    else:
+        doc_ids.extend(store.doc_ids[start:end])
+    first, last = store.pos_starts[start], store.pos_starts[end]
+    shift = len(positions) - first
+    pos_starts.extend(p + shift for p in store.pos_starts[start:end])
+    positions.extend(store.positions[first:last])
+
+
+class PostingsBuilder:
+    """按文档顺序收集词位置，build() 时一次性转置为 PostingsStore。
+
+    构建期间只保存正排的扁平数组，避免为每个词项创建独立对象。
+    """
+
+    def __init__(self):
+        self.terms = []
+        self.term_ids = {}
+        self._doc_starts = array('Q', [0])
+        self._doc_terms = array('I')
+        self._doc_tfs = array('I')
+        self._doc_positions = array('I')
+        self._doc_lengths = array('I')
+
+    @property
+    def num_docs(self):
+        return len(self._doc_lengths)
+
+    def add_document(self, word_positions):
+        return self.add_packed_document(*pack_word_positions(word_positions))
+
+    def add_packed_document(self, terms, term_tfs, positions):
+        # 参数格式同 pack_word_positions 的返回值
+        for word in terms:
+            term_id = self.term_ids.get(word)
+            if term_id is None:
+                term_id = len(self.terms)
+                self.term_ids[word] = term_id
+                self.terms.append(word)
+            self._doc_terms.append(term_id)
+        self._doc_tfs.extend(term_tfs)
+        self._doc_positions.extend(positions)
+        self._doc_starts.append(len(self._doc_terms))
+        self._doc_lengths.append(len(positions))
+        return self.num_docs - 1
+
+    def build(self):
+        num_terms = len(self.terms)
+        total_postings = len(self._doc_terms)
+
+        # 第一遍：统计每个词项的文档数与位置总数
+        doc_counts = [0] * num_terms
+        pos_counts = [0] * num_terms
+        for term_id, tf in zip(self._doc_terms, self._doc_tfs):
+            doc_counts[term_id] += 1
+            pos_counts[term_id] += tf
+
+        term_starts = array('Q', [0])
+        doc_cursor = []
+        pos_cursor = []
+        doc_total = pos_total = 0
+        for term_id in range(num_terms):
+            doc_cursor.append(doc_total)
+            pos_cursor.append(pos_total)
+            doc_total += doc_counts[term_id]
+            pos_total += pos_counts[term_id]
+            term_starts.append(doc_total)
+
+        # 第二遍：把正排记录放到各词项的槽位上
+        doc_ids = array('I', [0]) * total_postings
+        pos_starts = array('Q', [0]) * (total_postings + 1)
+        positions = array('I', [0]) * len(self._doc_positions)
+        src = 0
+        for doc_id in range(self.num_docs):
+            for j in range(self._doc_starts[doc_id], self._doc_starts[doc_id + 1]):
+                term_id = self._doc_terms[j]
+                tf = self._doc_tfs[j]
+                slot = doc_cursor[term_id]
+                doc_cursor[term_id] = slot + 1
+                dest = pos_cursor[term_id]
+                pos_cursor[term_id] = dest + tf
+                doc_ids[slot] = doc_id
+                pos_starts[slot] = dest
+                positions[dest:dest + tf] = self._doc_positions[src:src + tf]
+                src += tf
+        pos_starts[total_postings] = len(positions)
+
+        return PostingsStore(self.terms, term_starts, doc_ids, pos_starts, positions,
+                             self._doc_lengths)
@@ -0,0 +1,423 @@
+import re
+from bisect import bisect_left
+
+from tokenizer import lcut
+
+import logger_config
+
+logger = logger_config.setup_logger(__name__)
+
+# 查询语法：
+#   机器学习 搜索          空格分隔的普通词任一出现即可（与原来相同），按所有词打分
+#   "倒排索引设计"         短语：各词在文档中按顺序相邻出现
+#   深度 NEAR/5 网络       邻近：两侧的词（或短语）起始位置相差不超过5个词
+#   A AND B / A OR B / NOT A / ( )   布尔组合，运算符须大写，优先级 NOT > AND > OR
+#   type:pdf  path:报告     按文件类型、路径（子串，不区分大小写）过滤
+# 空格并列时，短语、邻近、过滤、NOT 和括号表达式都必须满足；
+# 同时有短语或邻近条件时，普通词只参与打分
+_QUERY_TOKEN = re.compile(
+    r'(?P<lparen>\()|(?P<rparen>\))'
+    r'|(?P<field>type|path):(?:"(?P<field_quoted>[^"]*)"|(?P<field_value>[^\s()"]+))'
+    r'|"(?P<phrase>[^"]*)"|(?P<near>NEAR/\d+)|(?P<word>[^\s()"]+)',
+    re.IGNORECASE)
+_OPERATORS = ('AND', 'OR', 'NOT')
+# type: 过滤接受的别名
+_TYPE_ALIASES = {'word': 'docx', 'doc': 'docx'}
+
+
+def gallop(arr, target, lo, hi):
+    # 在有序数组 arr[lo:hi] 中找第一个 >= target 的下标：
+    # 先按 1,2,4... 的步长向后跳，再在最后一跳的区间内二分，
+    # 目标离当前位置越近代价越小，适合多个有序列表的求交
+    if lo >= hi or arr[lo] >= target:
+        return lo
+    step = 1
+    while lo + step < hi and arr[lo + step] < target:
+        lo += step
+        step <<= 1
+    return bisect_left(arr, target, lo + 1, min(lo + step, hi))
+
+
+def find_postings(doc_ids, start, end, candidates):
+    # 在倒排列表 doc_ids[start:end] 中用 searchsorted 一次性定位升序的候选文档，
+    # 返回 (找到的候选的掩码, 其倒排记录下标)
+    import numpy as np
+    slots = start + np.searchsorted(doc_ids[start:end], candidates)
+    found = slots < end
+    found[found] = doc_ids[slots[found]] == candidates[found]
+    return found, slots[found]
+
+
+def intersect_postings(postings, terms):
+    # 在一个索引段内求同时包含所有词的文档：从最短的倒排列表出发，
+    # 在其余列表中按从短到长的顺序用 searchsorted 筛选，位置只为求交剩下的文档读取；
+    # 返回 [(doc_id, [各词在该文档中的位置])]
+    import numpy as np
+    from scoring import postings_arrays
+    ranges = [postings.term_range(term) for term in terms]
+    if any(start == end for start, end in ranges):
+        return []
+    order = sorted(range(len(terms)), key=lambda i: ranges[i][1] - ranges[i][0])
+    arrays = postings_arrays(postings)
+    lead_start, lead_end = ranges[order[0]]
+    candidates = arrays.doc_ids[lead_start:lead_end]
+    slots = [None] * len(terms)
+    slots[order[0]] = np.arange(lead_start, lead_end)
+    for j in order[1:]:
+        found, term_slots = find_postings(arrays.doc_ids, *ranges[j], candidates)
+        candidates = candidates[found]
+        for i in order:
+            if i == j:
+                break
+            slots[i] = slots[i][found]
+        slots[j] = term_slots
+        if not len(candidates):
+            return []
+    pos_starts = postings.pos_starts
+    positions = memoryview(postings.positions)
+    return [(doc_id, [positions[pos_starts[k]:pos_starts[k + 1]] for k in doc_slots])
+            for doc_id, doc_slots in zip(candidates.tolist(), zip(*(s.tolist() for s in slots)))]
+
+
+def phrase_starts(position_lists):
+    # 返回短语在文档中的起始位置：第 i 个词出现在 起始位置 + i 处
+    lead = min(range(len(position_lists)), key=lambda i: len(position_lists[i]))
+    cursors = [0] * len(position_lists)
+    starts = []
+    for p in position_lists[lead]:
+        start = p - lead
+        if start < 0:
+            continue
+        for i, positions in enumerate(position_lists):
+            if i == lead:
+                continue
+            k = gallop(positions, start + i, cursors[i], len(positions))
+            cursors[i] = k
+            if k == len(positions):
+                return starts
+            if positions[k] != start + i:
+                break
+        else:
+            starts.append(start)
+    return starts
+
+
+def within(left, right, distance):
+    # 两个有序位置列表中是否存在相差不超过 distance 的一对位置
+    if len(left) > len(right):
+        left, right = right, left
+    cursor = 0
+    for p in left:
+        cursor = gallop(right, p - distance, cursor, len(right))
+        if cursor == len(right):
+            return False
+        if right[cursor] <= p + distance:
+            return True
+    return False
+
+
+def _doc_array(doc_ids):
+    import numpy as np
+    return np.asarray(doc_ids, dtype=np.int64)
+
+
+class Node:
+    """查询计划中的节点，在单个索引段上求值。
+
+    match() 返回满足条件的段内文档ID（升序的 NumPy 数组），filter() 只在给定的候选文档中筛选，
+    cost() 估计匹配的文档数，AND 据此从最小的子条件开始求交。
+    numpy 在求值时才导入，只解析查询（如界面启动时）不必加载。
+    """
+
+    def cost(self, segment):
+        return len(segment)
+
+    def filter(self, segment, doc_ids):
+        import numpy as np
+        return np.intersect1d(doc_ids, self.match(segment), assume_unique=True)
+
+
+class Phrase(Node):
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    def __repr__(self):
+        return f'"{"".join(self.tokens)}"'
+
+    def cost(self, segment):
+        return min(segment.postings.doc_freq(token) for token in self.tokens)
+
+    def match(self, segment):
+        from scoring import postings_arrays
+        postings = segment.postings
+        if len(self.tokens) == 1:
+            start, end = postings.term_range(self.tokens[0])
+            return postings_arrays(postings).doc_ids[start:end].astype('int64')
+        return _doc_array([doc_id for doc_id, position_lists in intersect_postings(postings, self.tokens)
+                           if phrase_starts(position_lists)])
+
+    def filter(self, segment, doc_ids):
+        if len(self.tokens) > 1:
+            return super().filter(segment, doc_ids)
+        # 单个词直接在倒排列表上定位候选文档，不必取出整个列表
+        from scoring import postings_arrays
+        start, end = segment.postings.term_range(self.tokens[0])
+        found, _ = find_postings(postings_arrays(segment.postings).doc_ids, start, end, doc_ids)
+        return doc_ids[found]
+
+
+class Near(Node):
+    def __init__(self, left, right, distance):
+        self.left = left
+        self.right = right
+        self.distance = distance
+
+    def __repr__(self):
+        return f"{self.left!r} NEAR/{self.distance} {self.right!r}"
+
+    def cost(self, segment):
+        return min(self.left.cost(segment), self.right.cost(segment))
+
+    def match(self, segment):
+        # 两侧所有词一起求交，只在同时包含全部词的文档中比较位置
+        n = len(self.left.tokens)
+        docs = []
+        for doc_id, position_lists in intersect_postings(segment.postings, self.left.tokens + self.right.tokens):
+            left = phrase_starts(position_lists[:n])
+            if not left:
+                continue
+            right = phrase_starts(position_lists[n:])
+            if right and within(left, right, self.distance):
+                docs.append(doc_id)
+        return _doc_array(docs)
+
+
+class Field(Node):
+    def __init__(self, name, value):
+        self.name = name.lower()
+        self.value = value.lower()
+        if self.name == 'type':
+            self.value = _TYPE_ALIASES.get(self.value, self.value)
+
+    def __repr__(self):
+        return f"{self.name}:{self.value}"
+
+    def accepts(self, doc):
+        if self.name == 'type':
+            return doc.get('type') == self.value
+        paths = [doc['path']] + [duplicate[0] for duplicate in doc.get('duplicates') or ()]
+        return any(self.value in path.lower() for path in paths)
+
+    def match(self, segment):
+        return _doc_array([doc_id for doc_id, doc in enumerate(segment.documents) if self.accepts(doc)])
+
+    def filter(self, segment, doc_ids):
+        return doc_ids[[self.accepts(segment.documents[doc_id]) for doc_id in doc_ids.tolist()]]
+
+
+class Not(Node):
+    def __init__(self, child):
+        self.child = child
+
+    def __repr__(self):
+        return f"NOT {self.child!r}"
+
+    def match(self, segment):
+        import numpy as np
+        return np.setdiff1d(np.arange(len(segment)), self.child.match(segment), assume_unique=True)
+
+    def filter(self, segment, doc_ids):
+        import numpy as np
+        return np.setdiff1d(doc_ids, self.child.filter(segment, doc_ids), assume_unique=True)
+
+
+class And(Node):
+    def __init__(self, children):
+        self.children = children
+
+    def __repr__(self):
+        return f"({' AND '.join(map(repr, self.children))})"
+
+    def cost(self, segment):
+        return min(child.cost(segment) for child in self.children)
+
+    def plan(self, segment):
+        # 文档最少的子条件先求值，其余子条件只在已有结果上筛选；NOT 放在最后
+        return sorted(self.children, key=lambda child: (isinstance(child, Not), child.cost(segment)))
+
+    def match(self, segment):
+        children = self.plan(segment)
+        doc_ids = children[0].match(segment)
+        for child in children[1:]:
+            if not len(doc_ids):
+                break
+            doc_ids = child.filter(segment, doc_ids)
+        return doc_ids
+
+    def filter(self, segment, doc_ids):
+        for child in self.plan(segment):
+            if not len(doc_ids):
+                break
+            doc_ids = child.filter(segment, doc_ids)
+        return doc_ids
+
+
+class Or(Node):
+    def __init__(self, children):
+        self.children = children
+
+    def __repr__(self):
+        return f"({' OR '.join(map(repr, self.children))})"
+
+    def cost(self, segment):
+        return min(len(segment), sum(child.cost(segment) for child in self.children))
+
+    def match(self, segment):
+        import numpy as np
+        return np.unique(np.concatenate([child.match(segment) for child in self.children]))
+
+    def filter(self, segment, doc_ids):
+        import numpy as np
+        return np.unique(np.concatenate([child.filter(segment, doc_ids) for child in self.children]))
+
+
+class Query:
+    def __init__(self, root, terms):
+        # root: 查询计划，只有普通词时为 None（任一词出现即可，不需要求交）；
+        # terms: 参与打分的全部词（NOT 之下的词除外）
+        self.root = root
+        self.terms = terms
+
+
+class _Parser:
+    # 递归下降：or_expr := and_expr (OR and_expr)*
+    #           and_expr := group (AND group)*
+    #           group := unary+          空格并列
+    #           unary := NOT unary | primary (NEAR/k primary)*
+    #           primary := ( or_expr ) | 短语 | 过滤 | 普通词
+
+    def __init__(self, keyword):
+        self.tokens = [(match.lastgroup if match.lastgroup not in ('field_quoted', 'field_value') else 'field', match)
+                       for match in _QUERY_TOKEN.finditer(keyword)]
+        self.pos = 0
+        self.negated = 0
+        self.terms = []
+
+    def peek(self):
+        if self.pos >= len(self.tokens):
+            return None, None
+        kind, match = self.tokens[self.pos]
+        if kind == 'word' and match.group() in _OPERATORS:
+            return match.group(), match
+        return kind, match
+
+    def parse(self):
+        node = self.or_expr()
+        while self.pos < len(self.tokens):
+            # 多余的右括号等无法解析的部分忽略后继续
+            logger.info(f"忽略无法解析的查询片段: {self.tokens[self.pos][1].group()}")
+            self.pos += 1
+            rest = self.or_expr()
+            if rest is not None:
+                node = rest if node is None else _combine(And, [node, rest])
+        return node
+
+    def or_expr(self):
+        children = [self.and_expr()]
+        while self.peek()[0] == 'OR':
+            self.pos += 1
+            children.append(self.and_expr())
+        return _combine(Or, children)
+
+    def and_expr(self):
+        children = [self.group()]
+        while self.peek()[0] == 'AND':
+            self.pos += 1
+            children.append(self.group())
+        return _combine(And, children)
+
+    def group(self):
+        constraints, words, positional = [], [], False
+        while True:
+            kind = self.peek()[0]
+            if kind is None or kind in ('rparen', 'AND', 'OR'):
+                break
+            node, plain = self.unary()
+            if node is None:
+                continue
+            if plain:
+                words.extend(Phrase([token]) for token in node.tokens)
+            else:
+                constraints.append(node)
+                positional = positional or isinstance(node, (Phrase, Near))
+        if not constraints:
+            return _combine(Or, words)
+        if words and not positional:
+            constraints.append(_combine(Or, words))
+        return _combine(And, constraints)
+
+    def unary(self):
+        # 返回 (节点, 是否为普通词)
+        kind, match = self.peek()
+        if kind == 'NOT':
+            self.pos += 1
+            self.negated += 1
+            node, _ = self.unary()
+            self.negated -= 1
+            return (Not(node) if node is not None else None), False
+        node, plain = self.primary()
+        while self.peek()[0] == 'near' and isinstance(node, Phrase):
+            distance = int(self.peek()[1].group().split('/')[1])
+            self.pos += 1
+            right, _ = self.primary()
+            if isinstance(right, Phrase):
+                node, plain = Near(node, right, distance), False
+        return node, plain
+
+    def primary(self):
+        kind, match = self.peek()
+        if kind is None:
+            return None, False
+        self.pos += 1
+        if kind == 'lparen':
+            node = self.or_expr()
+            if self.peek()[0] == 'rparen':
+                self.pos += 1
+            return node, False
+        if kind == 'field':
+            value = match.group('field_quoted') if match.group('field_quoted') is not None else match.group('field_value')
+            return Field(match.group('field'), value), False
+        if kind == 'phrase':
+            # 引号内的文本保留空白，按文档中相同的方式切分
+            tokens = lcut(match.group('phrase').strip().lower())
+            return self.leaf(tokens), len(tokens) == 1
+        if kind == 'word':
+            return self.leaf(lcut(match.group().lower())), True
+        # 孤立的运算符、右括号、NEAR 忽略
+        return None, False
+
+    def leaf(self, tokens):
+        if not tokens:
+            return None
+        if not self.negated:
+            self.terms.extend(token for token in tokens if token.strip())
+        return Phrase(tokens)
+
+
+def _combine(cls, children):
+    children = [child for child in children if child is not None]
+    if not children:
+        return None
+    return children[0] if len(children) == 1 else cls(children)
+
+
+def parse_query(keyword):
+    parser = _Parser(keyword)
+    root = parser.parse()
+    # 只有普通词时保持原来的行为：不求交，任一词（含相似词）出现即参与排序
+    if isinstance(root, Phrase) and len(root.tokens) == 1:
+        root = None
+    elif isinstance(root, Or) and all(isinstance(child, Phrase) and len(child.tokens) == 1
+                                      for child in root.children):
+        root = None
+    return Query(root, parser.terms)
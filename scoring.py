@@ -0,0 +1,144 @@
+import math
+
+import numpy as np
+
+from postings import NORM_LENGTHS
+
+# 候选文档少于倒排列表长度的 1/SUBSET_RATIO 时，只为候选文档查找倒排记录
+SUBSET_RATIO = 4
+
+_NORM_LENGTHS = np.array(NORM_LENGTHS, dtype=np.float64)
+
+
+class PostingsArrays:
+    """PostingsStore 各数组的 NumPy 视图（零拷贝），按索引对象缓存。"""
+
+    def __init__(self, store):
+        self.doc_ids = np.frombuffer(store.doc_ids, dtype=np.uint32)
+        self.pos_starts = np.frombuffer(store.pos_starts, dtype=np.uint64).astype(np.int64, copy=False)
+        self.positions = np.frombuffer(store.positions, dtype=np.uint32)
+        self.doc_lengths = np.frombuffer(store.doc_lengths, dtype=np.uint32)
+        self.doc_norms = np.frombuffer(store.doc_norms, dtype=np.uint8)
+
+
+def postings_arrays(store):
+    if store._arrays is None:
+        store._arrays = PostingsArrays(store)
+    return store._arrays
+
+
+def _slots(arrays, start, end, subset):
+    # 词项倒排记录的下标；给出候选文档（段内ID，升序）且候选较少时，
+    # 用 searchsorted 一次性二分定位，不再扫描整个列表
+    if subset is None or len(subset) * SUBSET_RATIO >= end - start:
+        return np.arange(start, end)
+    doc_ids = arrays.doc_ids[start:end]
+    idx = np.searchsorted(doc_ids, subset)
+    found = idx < len(doc_ids)
+    found[found] = doc_ids[idx[found]] == subset[found]
+    return start + idx[found]
+
+
+class BM25Scorer:
+    """BM25 打分：idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))。
+
+    dl 取建索引时量化的长度，(1 - b + b * dl / avgdl) 对256个量化值预先算成表；
+    idf 与平均长度按索引版本缓存在 reader.stats_cache 中。
+    """
+
+    name = 'bm25'
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+
+    def idf(self, reader, term):
+        key = (self.name, 'idf', term)
+        idf = reader.stats_cache.get(key)
+        if idf is None:
+            doc_freq = reader.doc_freq(term)
+            idf = reader.stats_cache[key] = math.log(1 + (reader.num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        return idf
+
+    def norm_table(self, reader):
+        key = (self.name, 'norms', self.k1, self.b)
+        table = reader.stats_cache.get(key)
+        if table is None:
+            avg_length = max(average_doc_length(reader), 1.0)
+            table = reader.stats_cache[key] = self.k1 * (1 - self.b + self.b * _NORM_LENGTHS / avg_length)
+        return table
+
+    def score_term(self, reader, store, term, subset=None):
+        # 返回 (段内文档ID数组, 得分数组)，一个词在一个段内的所有记录一次算完
+        start, end = store.term_range(term)
+        if start == end:
+            return np.empty(0, dtype=np.uint32), np.empty(0)
+        arrays = postings_arrays(store)
+        slots = _slots(arrays, start, end, subset)
+        doc_ids = arrays.doc_ids[slots]
+        tf = (arrays.pos_starts[slots + 1] - arrays.pos_starts[slots]).astype(np.float64)
+        norms = self.norm_table(reader)[arrays.doc_norms[doc_ids]]
+        return doc_ids, self.idf(reader, term) * tf * (self.k1 + 1) / (tf + norms)
+
+
+class PositionScorer:
+    """原来的打分方式：TF-IDF * 位置权重（词越靠前权重越高，即 sum(1/(pos+1))）。"""
+
+    name = 'position'
+
+    def idf(self, reader, term):
+        key = (self.name, 'idf', term)
+        idf = reader.stats_cache.get(key)
+        if idf is None:
+            idf = reader.stats_cache[key] = math.log(reader.num_docs / (reader.doc_freq(term) + 1)) + 1
+        return idf
+
+    def score_term(self, reader, store, term, subset=None):
+        start, end = store.term_range(term)
+        if start == end:
+            return np.empty(0, dtype=np.uint32), np.empty(0)
+        arrays = postings_arrays(store)
+        doc_ids = arrays.doc_ids[start:end]
+        first, last = arrays.pos_starts[start], arrays.pos_starts[end]
+        offsets = arrays.pos_starts[start:end] - first
+        # 每条记录的 sum(1/(pos+1)) 用 reduceat 按记录分段求和
+        weights = np.add.reduceat(1.0 / (arrays.positions[first:last] + 1.0), offsets)
+        tf = np.diff(arrays.pos_starts[start:end + 1]) / np.maximum(arrays.doc_lengths[doc_ids], 1)
+        return doc_ids, self.idf(reader, term) * tf * weights
+
+
+def average_doc_length(reader):
+    key = 'avg_doc_length'
+    avg_length = reader.stats_cache.get(key)
+    if avg_length is None:
+        total = 0
+        for segment in reader.segments:
+            doc_lengths = postings_arrays(segment.postings).doc_lengths
+            total += int(doc_lengths.sum(dtype=np.uint64))
+            if segment.deleted:
+                total -= int(doc_lengths[list(segment.deleted)].sum(dtype=np.uint64))
+        avg_length = reader.stats_cache[key] = total / max(reader.num_docs, 1)
+    return avg_length
+
+
+def top_hits(doc_ids, scores, top_n=None):
+    # 按得分降序、同分按文档ID升序取前 top_n 名（None 为全部），结果与全量排序一致；
+    # 先用 argpartition 找到第 top_n 名的得分，只对不低于它的文档排序
+    if top_n is not None and top_n < len(doc_ids):
+        if top_n <= 0:
+            return doc_ids[:0], scores[:0]
+        kth_score = scores[np.argpartition(-scores, top_n - 1)[top_n - 1]]
+        selected = np.flatnonzero(scores >= kth_score)
+        doc_ids, scores = doc_ids[selected], scores[selected]
+    order = np.lexsort((doc_ids, -scores))[:top_n]
+    return doc_ids[order], scores[order]
+
+
+def rank_hits(doc_ids, scores, limit=None, offset=0):
+    # 返回第 offset 名起的 limit 个 (文档ID, 得分)
+    doc_ids, scores = top_hits(doc_ids, scores, offset + limit if limit is not None else None)
+    return list(zip(doc_ids[offset:].tolist(), scores[offset:].tolist()))
+
+
+SCORERS = {scorer.name: scorer for scorer in (BM25Scorer(), PositionScorer())}
+DEFAULT_SCORER = SCORERS['bm25']
@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+
+# 检索结果缓存的内存上限；结果按索引版本号区分，索引变化后旧结果不再命中，随LRU淘汰
+RESULT_CACHE_BYTES = 64 * 1024 * 1024
+# 相似词缓存的词数上限；相似词只随词表变化，比检索结果缓存保留得更久
+FUZZY_CACHE_ENTRIES = 20000
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hit_rate}
+
+    def __str__(self):
+        return f"命中 {self.hits}，未命中 {self.misses}，淘汰 {self.evictions}，命中率 {self.hit_rate:.1%}"
+
+
+class LRUCache:
+    """线程安全的LRU缓存，容量按 sizeof(value) 之和计算（默认每项计1）。"""
+
+    def __init__(self, capacity, sizeof=None):
+        self.capacity = capacity
+        self.sizeof = sizeof or (lambda value: 1)
+        self.size = 0
+        self.stats = CacheStats()
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            if size > self.capacity:
+                return
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.capacity:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.stats.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
@@ -0,0 +1,64 @@
+import argparse
+import json
+import sys
+
+from batch_search import search_batch
+from cache_manager import CacheManager
+from index_segment import load_segment
+from scoring import SCORERS
+from search_index import SearchIndex
+
+# 命令行批量检索，不依赖Qt，使用图形界面上次扫描该文件夹时保存的索引段
+# 用法: python search_cli.py D:\文档 -q 合同 -q "报价 AND type:pdf"
+#       python search_cli.py D:\文档 --queries-file queries.txt --limit 20 --json
+
+
+def load_index(directory):
+    loaded = load_segment(CacheManager().get_index_path(directory))
+    if loaded is None:
+        return None
+    index = SearchIndex()
+    index.add_segment(*loaded)
+    return index
+
+
+def read_queries(args):
+    queries = list(args.query or [])
+    if args.queries_file:
+        # 每行一个查询，忽略空行；文件名为 - 时从标准输入读取
+        with (sys.stdin if args.queries_file == '-' else open(args.queries_file, encoding='utf-8')) as f:
+            queries.extend(line.strip() for line in f if line.strip())
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文档批量检索（命令行）")
+    parser.add_argument('directory', help="已在图形界面中扫描过的文件夹")
+    parser.add_argument('-q', '--query', action='append', help="查询，可重复指定")
+    parser.add_argument('--queries-file', help="查询文件，每行一个查询")
+    parser.add_argument('--limit', type=int, default=10, help="每个查询返回的结果数")
+    parser.add_argument('--scorer', choices=sorted(SCORERS), default='bm25')
+    parser.add_argument('--json', action='store_true', help="每个查询输出一行JSON")
+    args = parser.parse_args()
+
+    queries = read_queries(args)
+    if not queries:
+        parser.error("请通过 -q 或 --queries-file 指定查询")
+    index = load_index(args.directory)
+    if index is None:
+        print(f"未找到 {args.directory} 的索引，请先在图形界面中扫描该文件夹", file=sys.stderr)
+        return 1
+
+    results = search_batch(index, queries, limit=args.limit, scorer=SCORERS[args.scorer])
+    for query, hits in zip(queries, results):
+        if args.json:
+            print(json.dumps({'query': query, 'results': hits}, ensure_ascii=False))
+            continue
+        print(f"{query}: {len(hits)} 个结果")
+        for rank, hit in enumerate(hits, 1):
+            print(f"  {rank}. {hit['score']:.4f}  {hit['path']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
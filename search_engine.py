@@ -1,23 +1,38 @@
 import multiprocessing
 from pathlib import Path
-from collections import defaultdict
-from functools import partial
 import time
-import jieba
-import math
-from difflib import get_close_matches
+from collections import defaultdict
 from PyQt6.QtCore import QThread, pyqtSignal
 from cache_manager import CacheManager
+from postings import PostingsBuilder, PostingsStore
+from index_segment import load_segment, save_segment
 import logger_config
-from document_processor import process_document
+from document_processor import count_task_pages, merge_page_ranges, process_task, task_limits
+from file_enumerator import FileEnumerator
+from extractors import PAGES_PER_TASK, SPLIT_MIN_BYTES, extractor_for, get_extractor, hit_pages, is_current_extraction, page_ranges
+from tokenizer import init_worker, load_dictionary
+from query import parse_query
+from search_cache import RESULT_CACHE_BYTES, LRUCache
 import threading
-import psutil
 
 logger = logger_config.setup_logger(__name__)
 
+# 工作进程返回的结果在主进程中按批写入缓存
+CACHE_WRITE_BATCH = 200
+# 扫描期间每处理 SEGMENT_BATCH 个文档，或距上次提交超过 SEGMENT_INTERVAL 秒，
+# 就建成一个索引段发给GUI，已提交的段在扫描过程中即可搜索
+SEGMENT_BATCH = 500
+SEGMENT_INTERVAL = 5.0
+# 读取分页文档页数的任务的 (时间上限秒数, 内存增长上限MB)
+PAGE_COUNT_LIMITS = (60, 512)
+
 class DocumentScanner(QThread):
     progress_updated = pyqtSignal(int)
-    scan_completed = pyqtSignal(tuple)
+    files_listed = pyqtSignal(list)
+    # (新文档表, 倒排数据, 与之前提交的文档内容相同的文件)，交给 SearchIndex.add_segment
+    segment_ready = pyqtSignal(tuple)
+    # 扫描结束时总会发出，包括被取消、出错和没有文档的情况
+    scan_completed = pyqtSignal()
     _instance = None
     _lock = threading.Lock()
 
@@ -34,32 +49,297 @@ class DocumentScanner(QThread):
         self._initialized = True
         self.directory = directory
         self.specific_files = specific_files
-        self.inverted_index = defaultdict(list)
-        self.documents = []
+        self.index_path = None
         # 保留缓存管理器实例，这样可以继续使用已经持久化的缓存数据
         if not hasattr(self, 'cache_manager'):
-            self.cpu_count = multiprocessing.cpu_count()
+            # 根据系统CPU核心数确定进程数，使用系统核心数的75%
+            self.cpu_count = max(2, multiprocessing.cpu_count() * 3 // 4)
             self.cache_manager = CacheManager()
+            # 进程池在多次扫描之间复用，避免反复创建进程
+            self.pool = None
+            self._cancel_event = threading.Event()
+
+    def get_pool(self):
+        if self.pool is None:
+            # 先在主进程加载词典（检索时本来也要用）：fork 方式创建的工作进程直接继承，
+            # spawn 方式（Windows）的工作进程在初始化时读取已生成的词典缓存文件
+            load_dictionary()
+            from task_pool import TaskPool
+            logger.info(f"创建进程池，进程数: {self.cpu_count}")
+            self.pool = TaskPool(self.cpu_count, initializer=init_worker)
+        return self.pool
+
+    def shutdown_pool(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def cancel(self):
+        # 由GUI线程调用，扫描线程在下一次轮询时终止进程池并退出
+        self._cancel_event.set()
+
+    def process_files(self, tasks, process, initial_memory, file_infos=None):
+        # 按批产出处理结果，缓存命中的文档先产出，之后随进程池处理进度产出
+        if not tasks:
+            return
+        # 每个文件只stat一次，结果用于排序、缓存校验和文档表；遍历文件夹时已取得的直接使用
+        if file_infos is None:
+            file_infos = self.cache_manager.get_file_infos([file_path for file_path, _ in tasks])
+        tasks = [task for task in tasks if str(task[0]) in file_infos]
+        # 大文件优先，避免队尾被单个大文件拖住
+        tasks.sort(key=lambda task: file_infos[str(task[0])]['size'], reverse=True)
+        # 之前处理时超时、内存超限或崩溃的文件，修改前直接跳过
+        quarantined = self.cache_manager.get_quarantined([file_path for file_path, _ in tasks], file_infos)
+        if quarantined:
+            logger.info(f"跳过 {len(quarantined)} 个已隔离的文件")
+            tasks = [task for task in tasks if str(task[0]) not in quarantined]
+
+        # 缓存由主进程统一批量读取，命中的文件不再发送给工作进程；
+        # 按旧版本提取方式缓存的文档视为未命中，重新提取
+        results = list(self.cache_manager.get_cached_documents(
+            [file_path for file_path, _ in tasks], file_infos).values())
+        cached_paths = {doc['path'] for doc in results}
+        tasks = [task for task in tasks if str(task[0]) not in cached_paths]
+        # 路径未命中时按内容哈希查找，被移动或复制的文件不必重新提取
+        if tasks:
+            results.extend(self.cache_manager.get_documents_by_content(
+                [file_path for file_path, _ in tasks], file_infos).values())
+            cached_paths = {doc['path'] for doc in results}
+            tasks = [task for task in tasks if str(task[0]) not in cached_paths]
+        self.progress_updated.emit(int(len(results) / (len(results) + len(tasks)) * 100))
+
+        def with_file_info(batch):
+            for doc in batch:
+                file_info = file_infos[doc['path']]
+                doc['last_modified'] = file_info['last_modified']
+                doc['size'] = file_info['size']
+            return batch
+
+        for start in range(0, len(results), SEGMENT_BATCH):
+            yield with_file_info(results[start:start + SEGMENT_BATCH])
+        if tasks:
+            for batch in self.process_tasks(tasks, len(results), file_infos, process, initial_memory):
+                yield with_file_info(batch)
+
+    def split_paged_tasks(self, pool, tasks, file_infos):
+        # 页数超过 PAGES_PER_TASK 的分页文档（PDF）按页范围拆成多个任务，分散到各工作进程并行提取；
+        # 只有不小于 SPLIT_MIN_BYTES 的文档才读取页数，由工作进程并行读取（只读页树，不解析页面），
+        # 读取失败的按整个文档处理，其余任务直接分派。
+        # 返回 (任务列表, {路径: (完整哈希, 部分哈希)})，后者为拆分文档在读取页数时算好的内容哈希；
+        # 扫描被取消时返回 (None, None)
+        paged_tasks = [task for task in tasks if get_extractor(task[1]).paged
+                       and file_infos[str(task[0])]['size'] >= SPLIT_MIN_BYTES]
+        if not paged_tasks:
+            return tasks, {}
+        page_counts = {}
+        split_hashes = {}
+        for task, result, _ in pool.run(count_task_pages, paged_tasks, lambda _: PAGE_COUNT_LIMITS,
+                                        self._cancel_event):
+            page_count, content_hash, partial_hash = result or (0, None, None)
+            page_counts[task] = page_count or 0
+            if content_hash:
+                split_hashes[str(task[0])] = (content_hash, partial_hash)
+        if self._cancel_event.is_set():
+            return None, None
+        split_tasks = []
+        split_files = 0
+        for file_path, doc_type in tasks:
+            page_count = page_counts.get((file_path, doc_type), 0)
+            if page_count > PAGES_PER_TASK and str(file_path) in split_hashes:
+                split_tasks.extend((file_path, doc_type, first, last) for first, last in page_ranges(page_count))
+                split_files += 1
+            else:
+                split_tasks.append((file_path, doc_type))
+        if split_files:
+            logger.info(f"{split_files} 个长文档拆分为 {len(split_tasks) - len(tasks) + split_files} 个页范围任务")
+        return split_tasks, split_hashes
+
+    def process_tasks(self, tasks, cached_count, file_infos, process, initial_memory):
+        # 在进程池中处理未命中缓存的文件，按批产出结果并分批写入缓存；
+        # 超时、内存超限或使工作进程崩溃的文件写入隔离表
+        import psutil
+
+        total = cached_count + len(tasks)
+        num_documents = len(tasks)
+        pending_cache = []
+        batch = []
+        last_yield = time.time()
+        worker_stats = defaultdict(lambda: [0, 0.0])  # 工作进程号 -> [词数, 分词用时]
+        failures = {}  # 路径 -> 失败原因
+        logger.info(f"\n开始处理文档，共 {len(tasks)} 个")
+        try:
+            pool = self.get_pool()
+            tasks, split_hashes = self.split_paged_tasks(pool, tasks, file_infos)
+            if tasks is None:
+                self.shutdown_pool()
+                return
+            # 长文档的各页范围结果先暂存，全部完成后在主进程中按页序合并为一个文档
+            part_counts = defaultdict(int)
+            for task in tasks:
+                if len(task) == 4:
+                    part_counts[str(task[0])] += 1
+            page_parts = defaultdict(list)
+            done = 0
+            for task, result, error in pool.run(process_task, tasks,
+                                                lambda task: task_limits(file_infos[str(task[0])]['size']),
+                                                self._cancel_event):
+                done += 1
+                if error is not None:
+                    failures[str(task[0])] = error
+                    if len(task) == 4:
+                        result = {'path': str(task[0]), 'type': task[1], 'page_range': task[2:], 'failed': True}
+                if result and 'tokenize_stats' in result:
+                    worker, tokens, seconds = result.pop('tokenize_stats')
+                    worker_stats[worker][0] += tokens
+                    worker_stats[worker][1] += seconds
+                if result and 'page_range' in result:
+                    parts = page_parts[result['path']]
+                    parts.append(result)
+                    result = None
+                    if len(parts) == part_counts[parts[0]['path']]:
+                        result = merge_page_ranges(page_parts.pop(parts[0]['path']))
+                        if result:
+                            result['content_hash'], result['partial_hash'] = split_hashes[result['path']]
+                if result:
+                    batch.append(result)
+                    pending_cache.append(result)
+                    if len(pending_cache) >= CACHE_WRITE_BATCH:
+                        self.cache_manager.cache_documents(pending_cache, file_infos)
+                        pending_cache = []
+                self.progress_updated.emit(int((total - num_documents + done / len(tasks) * num_documents) / total * 100))
+                if batch and (len(batch) >= SEGMENT_BATCH or time.time() - last_yield >= SEGMENT_INTERVAL):
+                    # 调用方建好段后会清理文档中的倒排数据，产出前先写入缓存
+                    if pending_cache:
+                        self.cache_manager.cache_documents(pending_cache, file_infos)
+                        pending_cache = []
+                    yield batch
+                    batch = []
+                    last_yield = time.time()
+
+                # 定期监控系统资源使用
+                if done % 50 == 0 or done == len(tasks):
+                    current_memory = process.memory_info().rss / 1024 / 1024
+                    memory_increase = current_memory - initial_memory
+                    logger.info(f"\n[系统资源] 已完成 {done}/{len(tasks)} 个任务:")
+                    logger.info(f"[系统资源] CPU使用率: {psutil.cpu_percent()}%")
+                    logger.info(f"[系统资源] 当前内存: {current_memory:.2f}MB (增加: {memory_increase:.2f}MB)")
+            if self._cancel_event.is_set():
+                # 终止正在处理的任务，下次扫描时重新创建进程池
+                self.shutdown_pool()
+        except (BrokenPipeError, EOFError) as e:
+            logger.error(f"处理文档时发生错误: {str(e)}")
+            self.shutdown_pool()
+        if pending_cache:
+            self.cache_manager.cache_documents(pending_cache, file_infos)
+        if failures:
+            self.cache_manager.quarantine_files(failures, file_infos)
+        for worker, (tokens, seconds) in sorted(worker_stats.items()):
+            logger.info(f"[分词] 工作进程 {worker}: {tokens} 个词，{tokens / max(seconds, 1e-6):.0f} 词/秒")
+        if batch:
+            yield batch
 
     def build_inverted_index(self, documents):
-        inverted_index = defaultdict(list)
-        for doc_id, doc in enumerate(documents):
-            if doc is None:
+        builder = PostingsBuilder()
+        for doc in documents:
+            # 空文档也占用一个文档ID，保证与documents下标一致
+            if doc:
+                builder.add_packed_document(doc['terms'], doc['term_tfs'], doc['positions'])
+            else:
+                builder.add_document({})
+        return builder.build()
+
+    def deduplicate(self, documents, by_hash, kept_ids=()):
+        # 内容相同的文件只索引一份，其余路径记录在 duplicates 中；
+        # by_hash 为 内容哈希 -> 已索引文档，跨批次累积。
+        # 原文档在本批中时直接记入其 duplicates；原文档已随之前的段提交时单独返回，
+        # 由 SearchIndex.add_segment 记入，索引才能登记这些重复路径
+        unique = []
+        unique_ids = set()
+        earlier_duplicates = []
+        merged_into_kept = False
+        for doc in documents:
+            content_hash = doc.get('content_hash')
+            original = by_hash.get(content_hash) if content_hash else None
+            if original is None:
+                if content_hash:
+                    by_hash[content_hash] = doc
+                unique.append(doc)
+                unique_ids.add(id(doc))
                 continue
-            for pos, word in enumerate(doc['words']):
-                inverted_index[word].append((doc_id, pos))
-        return inverted_index
+            if id(original) in unique_ids:
+                # 重复路径同样记录修改时间和大小，重新打开文件夹时一并校验
+                original['duplicates'] = (original.get('duplicates') or []) + [[doc['path'], doc['last_modified'], doc['size']]]
+            else:
+                for key in ('terms', 'term_tfs', 'positions'):
+                    doc.pop(key, None)
+                earlier_duplicates.append(doc)
+            merged_into_kept = merged_into_kept or id(original) in kept_ids
+        if len(unique) < len(documents):
+            logger.info(f"发现 {len(documents) - len(unique)} 个重复文件，只索引一份")
+        return unique, earlier_duplicates, merged_into_kept
+
+    def save_index(self, index):
+        # 由GUI在完整扫描完成后调用，index 为扫描期间逐段提交的 SearchIndex；
+        # 在后台线程中等索引的各段合并为一个后写入新版本的段文件，不阻塞界面
+        if self.index_path is None:
+            return
+        index_path = self.index_path
+        self.index_path = None
+
+        def save():
+            documents, inverted_index = index.merge_all()
+            try:
+                save_segment(index_path, documents, inverted_index)
+            except OSError as e:
+                logger.error(f"保存索引段失败: {index_path}, 错误: {str(e)}")
+
+        threading.Thread(target=save, daemon=True).start()
+
+    def reconcile_segment(self, index_path, files, file_infos):
+        # 对比索引段中的文档表与磁盘文件，修改时间和大小都未变化的文档直接复用；
+        # file_infos 为遍历文件夹时取得的 {路径: 文件信息}
+        loaded = load_segment(index_path)
+        if loaded is None:
+            return [], None, files, False
+        documents, inverted_index = loaded
+        current_files = {str(f) for f in files}
+
+        def unchanged(path, last_modified, size):
+            if path not in current_files:
+                return False
+            file_info = file_infos.get(path)
+            return bool(file_info) and file_info['last_modified'] == last_modified and file_info['size'] == size
+
+        keep_ids = []
+        for doc_id, doc in enumerate(documents):
+            # 任一重复路径变化时整个文档重新处理（内容通常可直接从缓存取得）
+            if is_current_extraction(doc) and unchanged(doc['path'], doc['last_modified'], doc['size']) and \
+                    all(unchanged(*duplicate) for duplicate in doc.get('duplicates') or ()):
+                keep_ids.append(doc_id)
+
+        removed = len(keep_ids) < len(documents)
+        if removed:
+            inverted_index = inverted_index.select(keep_ids)
+            documents = [documents[doc_id] for doc_id in keep_ids]
+        kept_paths = {doc['path'] for doc in documents}
+        kept_paths.update(duplicate[0] for doc in documents for duplicate in doc.get('duplicates') or ())
+        pending = [f for f in files if str(f) not in kept_paths]
+        logger.info(f"索引段复用 {len(documents)} 个文档，需要重新处理 {len(pending)} 个文档")
+        return documents, inverted_index, pending, removed
 
     def run(self):
         logger.info("\n开始扫描文档...")
         start_time = time.time()
-        self.documents = []
-        self.inverted_index.clear()
+        self.index_path = None
+        self._cancel_event.clear()
         
         try:
+            # psutil 与 numpy 一样在用到时才导入，不计入界面的启动时间
+            import psutil
             # 获取初始系统资源使用情况
             process = psutil.Process()
-            initial_cpu_percent = psutil.cpu_percent(interval=1)
+            # 非阻塞采样：返回自上次调用以来的CPU使用率，不再等待1秒
+            initial_cpu_percent = psutil.cpu_percent(interval=None)
             initial_memory = process.memory_info().rss / 1024 / 1024
             logger.info(f"\n[系统资源] 初始状态:")
             logger.info(f"[系统资源] CPU使用率: {initial_cpu_percent}%")
@@ -91,96 +371,80 @@ class DocumentScanner(QThread):
                     logger.warning(f"无效路径: {path}, 错误: {str(e)}")
                     return False
 
+            # 文件按扩展名交给已注册的提取器，新增格式只需在 extractors 中注册
+            file_infos = None
             if self.specific_files:
-                docx_files = [Path(f) for f in self.specific_files if f.endswith('.docx') and is_valid_path(Path(f))]
-                pdf_files = [Path(f) for f in self.specific_files if f.endswith('.pdf') and is_valid_path(Path(f))]
+                tasks = [(Path(f), extractor_for(f).doc_type) for f in self.specific_files
+                         if extractor_for(f) and is_valid_path(Path(f))]
             else:
-                # 使用安全的文件遍历
-                docx_files = []
-                pdf_files = []
+                # 并行遍历文件夹，遍历时取得的修改时间和大小直接用于索引段复用和缓存校验，不再逐个stat
                 try:
-                    base_path = Path(self.directory)
-                    for item in base_path.rglob('*'):
-                        if not is_valid_path(item):
-                            continue
-                        if item.is_file():
-                            if item.suffix.lower() == '.docx':
-                                docx_files.append(item)
-                            elif item.suffix.lower() == '.pdf':
-                                pdf_files.append(item)
+                    file_infos = FileEnumerator().scan(self.directory)
                 except Exception as e:
                     logger.error(f"遍历目录时发生错误: {str(e)}")
-                    self.scan_completed.emit(([], defaultdict(list)))
                     return
-            total_files = len(docx_files) + len(pdf_files)
-            
-            logger.info(f"找到 {len(docx_files)} 个Word文档和 {len(pdf_files)} 个PDF文档")
-            
+                tasks = [(Path(path), extractor_for(path).doc_type) for path in file_infos]
+                # 文件监视器据此得知已有的文档，不必再遍历一次
+                self.files_listed.emit(list(file_infos))
+            total_files = len(tasks)
+
+            type_counts = defaultdict(int)
+            for _, doc_type in tasks:
+                type_counts[doc_type] += 1
+            logger.info(f"找到 {total_files} 个文档" + "".join(
+                f"，{get_extractor(doc_type).label} {count} 个" for doc_type, count in sorted(type_counts.items())))
+
             if total_files == 0:
                 logger.info("未找到任何文档")
-                self.scan_completed.emit(([], defaultdict(list)))
                 return
 
-            # 根据系统CPU核心数动态调整进程数，但不超过系统核心数的75%
-            self.cpu_count = max(2, min(self.cpu_count * 3 // 4, 8))  # 增加最大进程数限制
-            # 根据CPU数量动态调整批处理大小
-            batch_size = max(10, min(20, self.cpu_count * 3))  # 增加批处理大小
-            
-            # 分批处理Word文档
-            docx_results = []
-            logger.info("\n开始处理Word文档...")
-            for i in range(0, len(docx_files), batch_size):
-                batch_files = docx_files[i:i + batch_size]
-                logger.info(f"处理Word文档批次 {i//batch_size + 1}/{(len(docx_files)-1)//batch_size + 1}")
-                try:
-                    with multiprocessing.Pool(processes=self.cpu_count) as pool:
-                        batch_results = list(pool.imap(partial(process_document, doc_type='docx', cache_manager=self.cache_manager), batch_files))
-                        docx_results.extend([r for r in batch_results if r])
-                        progress = min(50, int((i + len(batch_files)) / total_files * 50))
-                        self.progress_updated.emit(progress)
-                        
-                        # 监控系统资源使用
-                        current_cpu_percent = psutil.cpu_percent()
-                        current_memory = process.memory_info().rss / 1024 / 1024
-                        memory_increase = current_memory - initial_memory
-                        logger.info(f"\n[系统资源] Word文档批次 {i//batch_size + 1} 处理后:")
-                        logger.info(f"[系统资源] CPU使用率: {current_cpu_percent}%")
-                        logger.info(f"[系统资源] 当前内存: {current_memory:.2f}MB (增加: {memory_increase:.2f}MB)")
-                except (BrokenPipeError, EOFError) as e:
-                    logger.error(f"处理Word文档时发生错误: {str(e)}")
-                    continue
+            # 完整扫描时先映射已保存的索引段，只处理变化过的文件
+            index_path = None
+            kept_documents, segment_changed = [], False
+            if not self.specific_files:
+                index_path = self.cache_manager.get_index_path(self.directory)
+                kept_documents, kept_index, pending, segment_changed = self.reconcile_segment(
+                    index_path, [file_path for file_path, _ in tasks], file_infos)
+                pending_paths = set(pending)
+                tasks = [task for task in tasks if task[0] in pending_paths]
+                if kept_documents:
+                    # 复用的文档先作为第一个段提交，扫描期间即可搜索；
+                    # 相似词索引在首次模糊查找时才建立，大多数检索用不到
+                    self.segment_ready.emit((kept_documents, kept_index, []))
+            pending_files = len(tasks)
 
-            # 分批处理PDF文档
-            pdf_results = []
-            logger.info("\n开始处理PDF文档...")
-            for i in range(0, len(pdf_files), batch_size):
-                batch_files = pdf_files[i:i + batch_size]
-                logger.info(f"处理PDF文档批次 {i//batch_size + 1}/{(len(pdf_files)-1)//batch_size + 1}")
-                try:
-                    with multiprocessing.Pool(processes=self.cpu_count) as pool:
-                        batch_results = list(pool.imap(partial(process_document, doc_type='pdf', cache_manager=self.cache_manager), batch_files))
-                        pdf_results.extend([r for r in batch_results if r])
-                        progress = 50 + min(50, int((i + len(batch_files)) / total_files * 50))
-                        self.progress_updated.emit(progress)
-                        
-                        # 监控系统资源使用
-                        current_cpu_percent = psutil.cpu_percent()
-                        current_memory = process.memory_info().rss / 1024 / 1024
-                        memory_increase = current_memory - initial_memory
-                        logger.info(f"\n[系统资源] PDF文档批次 {i//batch_size + 1} 处理后:")
-                        logger.info(f"[系统资源] CPU使用率: {current_cpu_percent}%")
-                        logger.info(f"[系统资源] 当前内存: {current_memory:.2f}MB (增加: {memory_increase:.2f}MB)")
-                except (BrokenPipeError, EOFError) as e:
-                    logger.error(f"处理PDF文档时发生错误: {str(e)}")
+            # 各种格式的文档放入同一个任务队列，由 process_files 按文件大小排序；
+            # 每批建成一个段提交给GUI，不在扫描结束时再合并，段的合并由 SearchIndex 在后台进行
+            by_hash = {doc['content_hash']: doc for doc in kept_documents if doc.get('content_hash')}
+            kept_ids = {id(doc) for doc in kept_documents}
+            new_count = 0
+            index_bytes = kept_index.nbytes() if kept_documents else 0
+            for batch in self.process_files(tasks, process, initial_memory, file_infos):
+                if self._cancel_event.is_set():
+                    break
+                # 与已有文档及之前各批的文档去重，重复文件只保留一份
+                new_documents, duplicates, duplicates_changed = self.deduplicate(batch, by_hash, kept_ids)
+                segment_changed = segment_changed or duplicates_changed
+                if not new_documents and not duplicates:
                     continue
+                new_index = self.build_inverted_index(new_documents) if new_documents else PostingsStore()
+                # 清理临时数据，位置信息已经保存在倒排索引中
+                for doc in new_documents:
+                    for key in ('terms', 'term_tfs', 'positions'):
+                        doc.pop(key, None)
+                new_count += len(new_documents)
+                index_bytes += new_index.nbytes()
+                new_index.fuzzy_index
+                self.segment_ready.emit((new_documents, new_index, duplicates))
+            kept_index = None
+            if self._cancel_event.is_set():
+                logger.info("扫描已取消")
+                return
 
-            # 合并结果
-            self.documents = docx_results + pdf_results
-            self.inverted_index = self.build_inverted_index(self.documents)
-
-            # 清理临时数据
-            for doc in self.documents:
-                doc.pop('words', None)
+            # 需要保存时由GUI调用 save_index，从合并后的 SearchIndex 写入段文件
+            save_needed = bool(index_path) and bool(new_count or segment_changed)
+            self.index_path = index_path if save_needed else None
+            self.progress_updated.emit(100)
 
             total_time = time.time() - start_time
             final_cpu_percent = psutil.cpu_percent()
@@ -189,74 +453,141 @@ class DocumentScanner(QThread):
             
             logger.info("文档扫描完成")
             logger.info(f"总用时: {total_time:.2f}秒")
-            logger.info(f"成功处理: {len(self.documents)}/{total_files} 个文档")
-            logger.info(f"索引词数量: {len(self.inverted_index)}")
+            logger.info(f"成功处理: {new_count}/{pending_files} 个文档，复用索引段 {len(kept_documents)} 个文档")
+            logger.info(f"索引内存占用: {index_bytes / 1024 / 1024:.2f}MB")
             logger.info(f"\n[系统资源] 最终状态:")
             logger.info(f"[系统资源] CPU使用率: {final_cpu_percent}%")
             logger.info(f"[系统资源] 内存使用: {final_memory:.2f}MB (总增加: {memory_increase:.2f}MB)")
-            self.scan_completed.emit((self.documents, self.inverted_index))
         except Exception as e:
             logger.error(f"扫描文档时发生错误: {str(e)}")
-            self.scan_completed.emit(([], defaultdict(list)))
+        finally:
+            self.scan_completed.emit()
 
-def search_documents(documents, inverted_index, keyword):
+def search_documents(index, keyword, limit=None, offset=0, scorer=None, cache=None):
     if not keyword:
         return []
 
+    from scoring import DEFAULT_SCORER, rank_hits
+
     logger.info(f"开始搜索关键词: {keyword}")
     start_time = time.time()
+    scorer = scorer or DEFAULT_SCORER
+    # 取得段列表的快照，检索期间索引的增量更新与后台合并不影响本次结果
+    reader = index.reader()
+    if not reader.num_docs:
+        return []
 
-    # 使用结巴分词处理搜索关键词
-    keywords = jieba.lcut(keyword)
-    logger.info(f"分词结果: {', '.join(keywords)}")
-    doc_scores = defaultdict(float)
-    total_docs = len(documents)
-
-    # 计算IDF值
-    idf_scores = {}
-    for word in keywords:
-        doc_freq = len(set(doc_id for doc_id, _ in inverted_index.get(word, [])))
-        idf_scores[word] = math.log(total_docs / (doc_freq + 1)) + 1
+    # 同一查询在索引未变化时直接复用上次的命中文档与得分，翻页时只需重新取前 k 名
+    key = (' '.join(keyword.split()), reader.generation, scorer.name)
+    cached = cache.get(key) if cache is not None else None
+    if cached is None:
+        cached = evaluate_query(reader, keyword, scorer)
+        if cache is not None:
+            cache.put(key, cached)
+    else:
+        logger.info(f"命中结果缓存（{cache.stats}）")
+    hit_ids, hit_scores, term_weights = cached
+    ranked = rank_hits(hit_ids, hit_scores, limit, offset)
 
-    # 对每个分词后的关键词进行搜索
-    for word in keywords:
-        # 支持模糊匹配，但限制相似词数量
-        similar_words = get_close_matches(word, inverted_index.keys(), n=2, cutoff=0.8)
-        logger.info(f"处理关键词: {word}, 找到相似词: {', '.join(similar_words)}")
-        for similar_word in similar_words:
-            matches = inverted_index[similar_word]
-            logger.info(f"相似词 '{similar_word}' 在 {len(set(doc_id for doc_id, _ in matches))} 个文档中找到匹配")
-            doc_positions = defaultdict(list)
-            
-            # 收集每个文档中的位置信息
-            for doc_id, pos in matches:
-                doc_positions[doc_id].append(pos)
-            
-            for doc_id, positions in doc_positions.items():
-                doc = documents[doc_id]
-                # 计算TF值
-                tf = len(positions) / len(doc['content'].split())
-                # 计算位置权重
-                position_weights = sum(1 / (pos + 1) for pos in positions)
-                # 计算最终得分：TF-IDF * 位置权重
-                score = tf * idf_scores.get(word, 1.0) * position_weights
-                # 相似词匹配的得分稍微降低
-                if similar_word != word:
-                    score *= 0.8
-                doc_scores[doc_id] += score
-
-    # 按得分排序并返回结果
+    # 只为返回的文档读取内容和匹配位置
     search_results = []
-    for doc_id, score in sorted(doc_scores.items(), key=lambda x: x[1], reverse=True):
-        doc = documents[doc_id]
+    for doc_id, score in ranked:
+        doc = reader.document(doc_id)
+        matches = {}
+        for term, _ in term_weights:
+            positions = reader.doc_positions(term, doc_id)
+            if positions:
+                matches[term] = list(positions)
+        # 有分页信息的文档（如PDF）给出命中词所在的页码
+        pages = []
+        if doc.get('page_offsets'):
+            pages = hit_pages(doc['page_offsets'], [pos for positions in matches.values() for pos in positions])
         search_results.append({
             'path': doc['path'],
             'type': doc['type'],
             'score': score,
             'content': doc['content'],
-            'positions': doc['word_positions']
+            'duplicates': [duplicate[0] for duplicate in doc.get('duplicates') or ()],
+            'positions': matches,
+            'pages': pages
         })
 
     search_time = time.time() - start_time
-    logger.info(f"搜索完成，用时: {search_time:.2f}秒，找到 {len(search_results)} 个结果")
-    return search_results
\ No newline at end of file
+    logger.info(f"搜索完成，用时: {search_time:.2f}秒，命中 {len(hit_ids)} 个文档，返回 {len(search_results)} 个结果")
+    return search_results
+
+
+def evaluate_query(reader, keyword, scorer):
+    # 返回 (命中文档的全局ID, 得分, [(词, 权重), ...])，命中文档未排序
+    import numpy as np
+
+    # 解析布尔运算、短语、邻近和过滤条件，词语使用结巴分词
+    query = parse_query(keyword)
+    keywords = query.terms
+    logger.info(f"分词结果: {', '.join(keywords)}")
+
+    # 按查询计划求交得到候选文档，只有候选文档参与打分
+    candidates = None
+    if query.root is not None:
+        candidates = np.array(reader.match(query.root), dtype=np.int64)
+        logger.info(f"查询计划 {query.root!r} 匹配 {len(candidates)} 个文档")
+        if not len(candidates):
+            return candidates, np.empty(0), []
+
+    # 展开相似词，每个词带上权重；IDF 由打分器计算并缓存
+    term_weights = []
+    for word in keywords:
+        # 支持模糊匹配，但限制相似词数量
+        similar_words = reader.get_close_matches(word, n=2, cutoff=0.8)
+        logger.info(f"处理关键词: {word}, 找到相似词: {', '.join(similar_words)}")
+        for similar_word in similar_words:
+            logger.info(f"相似词 '{similar_word}' 在 {reader.doc_freq(similar_word)} 个文档中找到匹配")
+            # 相似词匹配的得分稍微降低
+            term_weights.append((similar_word, 1.0 if similar_word == word else 0.8))
+    if reader.fuzzy_cache is not None:
+        logger.info(f"相似词缓存: {reader.fuzzy_cache.stats}")
+
+    hit_ids, hit_scores = score_segments(reader, scorer, term_weights, candidates)
+    return hit_ids, hit_scores, term_weights
+
+
+def result_size(result):
+    # 结果缓存中一项的近似内存占用
+    hit_ids, hit_scores, term_weights = result
+    return hit_ids.nbytes + hit_scores.nbytes + sum(len(term) * 4 + 100 for term, _ in term_weights) + 200
+
+
+def create_result_cache(max_bytes=RESULT_CACHE_BYTES):
+    return LRUCache(max_bytes, result_size)
+
+
+def score_segments(reader, scorer, term_weights, candidates=None):
+    # 逐段把各词的得分累加到按段内文档ID排列的数组中，返回命中文档的全局ID和得分；
+    # 给出候选文档时只保留候选文档，否则保留得分大于0的文档
+    import numpy as np
+
+    hit_ids = []
+    hit_scores = []
+    for base, segment in zip(reader.bases, reader.segments):
+        subset = None
+        if candidates is not None:
+            lo, hi = np.searchsorted(candidates, [base, base + len(segment)])
+            if lo == hi:
+                continue
+            subset = (candidates[lo:hi] - base).astype(np.uint32)
+        scores = np.zeros(len(segment))
+        for term, weight in term_weights:
+            doc_ids, term_scores = scorer.score_term(reader, segment.postings, term, subset)
+            scores[doc_ids] += term_scores * weight
+        if subset is not None:
+            local_ids = subset
+        else:
+            if segment.deleted:
+                scores[list(segment.deleted)] = 0.0
+            local_ids = np.flatnonzero(scores)
+        hit_ids.append(local_ids.astype(np.int64) + base)
+        hit_scores.append(scores[local_ids])
+    if not hit_ids:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    return np.concatenate(hit_ids), np.concatenate(hit_scores)
+
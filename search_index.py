@@ -0,0 +1,358 @@
+import itertools
+import math
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from difflib import SequenceMatcher
+from heapq import nlargest
+
+from postings import PostingsStore, merge_stores
+from search_cache import FUZZY_CACHE_ENTRIES, LRUCache
+import logger_config
+
+logger = logger_config.setup_logger(__name__)
+
+# 分层合并策略：按存活文档数把段分层，FLOOR_SEGMENT_DOCS 以下为第0层，
+# 往上每层大 MERGE_FACTOR 倍；同一层的段数达到 MERGE_FACTOR 时在后台合并为一个段
+MERGE_FACTOR = 10
+FLOOR_SEGMENT_DOCS = 1000
+# 单个段中已删除文档超过该比例时单独压缩
+MAX_DELETED_RATIO = 0.2
+
+# 索引版本号与段序号在所有索引对象间全局递增，重新扫描换成新的索引对象后也不会重复
+_generations = itertools.count(1)
+_segment_seqs = itertools.count(1)
+
+
+class Segment:
+    """不可变的索引段：文档表 + 倒排数组。
+
+    段内的倒排数据建好后不再修改，删除文档只在 deleted 中记录墓碑，
+    检索时跳过，合并时才真正清除。
+    seq 为段序号，合并得到的段取被合并各段中最大的序号，
+    相似词缓存据此判断哪些段的词表已经查找过。
+    """
+
+    def __init__(self, documents, postings, seq=None):
+        self.documents = documents
+        self.postings = postings
+        self.deleted = set()
+        self.seq = next(_segment_seqs) if seq is None else seq
+
+    def __len__(self):
+        return len(self.documents)
+
+    @property
+    def live_count(self):
+        return len(self.documents) - len(self.deleted)
+
+
+class IndexReader:
+    """某一时刻的段列表快照，检索期间段的增删与合并不影响快照。
+
+    全局文档ID = 段的起始偏移 + 段内文档ID。
+    stats_cache 缓存 IDF、平均文档长度等统计量，索引每次变化后换成新的字典。
+    """
+
+    def __init__(self, segments, generation=0, stats_cache=None, fuzzy_cache=None):
+        self.segments = segments
+        self.generation = generation
+        self.stats_cache = {} if stats_cache is None else stats_cache
+        self.fuzzy_cache = fuzzy_cache
+        self.bases = []
+        base = 0
+        for segment in segments:
+            self.bases.append(base)
+            base += len(segment)
+        self.num_docs = sum(segment.live_count for segment in segments)
+
+    def get_close_matches(self, word, n=3, cutoff=0.6):
+        # 每个段各自取前 n 个相似词再合并排序，与在所有段的词表上整体查找结果一致；
+        # 因此缓存的结果只需再合并缓存之后新增的段（序号更大的段）的查找结果
+        key = (word, n, cutoff)
+        cached = self.fuzzy_cache.get(key) if self.fuzzy_cache is not None else None
+        scored, seq = set(), 0
+        if cached is not None:
+            scored, seq = cached
+            # 某个相似词已经随合并从索引中清除时，缓存的前 n 名不再准确，重新查找
+            if not all(self.doc_freq(term) for _, term in scored):
+                scored, seq = set(), 0
+        segments = [segment for segment in self.segments if segment.seq > seq]
+        if segments or cached is None:
+            scored = set(scored)
+            for segment in segments:
+                for term in segment.postings.fuzzy_index.get_close_matches(word, n, cutoff):
+                    scored.add((SequenceMatcher(None, term, word).ratio(), term))
+            scored = set(nlargest(n, scored))
+            if self.fuzzy_cache is not None:
+                self.fuzzy_cache.put(key, (scored, max((segment.seq for segment in self.segments), default=seq)))
+        return [term for _, term in nlargest(n, scored)]
+
+    def doc_freq(self, term):
+        # 与 Lucene 相同，已删除但尚未合并的文档仍计入文档频率
+        return sum(segment.postings.doc_freq(term) for segment in self.segments)
+
+    def postings(self, term):
+        # 逐文档返回 (全局文档ID, positions, 文档词数)，跳过已删除的文档
+        for base, segment in zip(self.bases, self.segments):
+            deleted = segment.deleted
+            doc_lengths = segment.postings.doc_lengths
+            for doc_id, positions in segment.postings.postings(term):
+                if doc_id not in deleted:
+                    yield base + doc_id, positions, doc_lengths[doc_id]
+
+    def match(self, node):
+        # 逐段执行查询计划，返回升序的全局文档ID数组
+        import numpy as np
+        docs = []
+        for base, segment in zip(self.bases, self.segments):
+            doc_ids = node.match(segment)
+            if segment.deleted:
+                doc_ids = doc_ids[~np.isin(doc_ids, list(segment.deleted))]
+            docs.append(doc_ids + base)
+        return np.concatenate(docs) if docs else np.empty(0, dtype=np.int64)
+
+    def _locate(self, doc_id):
+        i = bisect_right(self.bases, doc_id) - 1
+        return self.segments[i], doc_id - self.bases[i]
+
+    def document(self, doc_id):
+        segment, local_id = self._locate(doc_id)
+        return segment.documents[local_id]
+
+    def doc_positions(self, term, doc_id):
+        segment, local_id = self._locate(doc_id)
+        return segment.postings.doc_positions(term, local_id)
+
+
+class SearchIndex:
+    """由多个段组成的可增量更新的索引。
+
+    新增或修改的文件建成新段追加在末尾，旧版本文档打上墓碑；
+    删除只打墓碑，重命名直接修改文档路径。段过多或墓碑过多时在后台合并。
+    所有修改都在 _lock 下进行，检索通过 reader() 取得快照后无需加锁。
+    """
+
+    def __init__(self):
+        self.segments = []
+        # 路径/内容哈希 -> 文档字典；文档字典在合并前后是同一个对象
+        self.paths = {}
+        self.hashes = {}
+        self._locations = {}  # id(文档字典) -> (段, 段内文档ID)
+        self._lock = threading.RLock()
+        self._merge_thread = None
+        # 索引版本号，每次增删、重命名或合并后更新；同一版本的快照共用统计量缓存，
+        # 检索结果缓存也以版本号区分
+        self.generation = next(_generations)
+        self._stats_cache = {}
+        # 相似词缓存在索引变化后继续有效，只需补充新增段的词表
+        self.fuzzy_cache = LRUCache(FUZZY_CACHE_ENTRIES)
+
+    @property
+    def num_docs(self):
+        with self._lock:
+            return sum(segment.live_count for segment in self.segments)
+
+    def reader(self):
+        with self._lock:
+            return IndexReader(list(self.segments), self.generation, self._stats_cache, self.fuzzy_cache)
+
+    def _changed(self):
+        self.generation = next(_generations)
+        self._stats_cache = {}
+
+    def live_documents(self):
+        with self._lock:
+            return [doc for segment in self.segments
+                    for doc_id, doc in enumerate(segment.documents)
+                    if doc_id not in segment.deleted]
+
+    def _register(self, segment, doc_id, doc):
+        self._locations[id(doc)] = (segment, doc_id)
+        self.paths[doc['path']] = doc
+        for duplicate in doc.get('duplicates') or ():
+            self.paths[duplicate[0]] = doc
+        if doc.get('content_hash'):
+            self.hashes[doc['content_hash']] = doc
+
+    def _unregister(self, doc):
+        segment, doc_id = self._locations.pop(id(doc))
+        segment.deleted.add(doc_id)
+        for path in [doc['path']] + [duplicate[0] for duplicate in doc.get('duplicates') or ()]:
+            if self.paths.get(path) is doc:
+                del self.paths[path]
+        if doc.get('content_hash') and self.hashes.get(doc['content_hash']) is doc:
+            del self.hashes[doc['content_hash']]
+
+    def add_segment(self, documents, postings, duplicates=()):
+        # 新段中的路径若已在索引中（文件被修改），先删除旧版本；
+        # 内容与已有文档相同的文件只记录为重复路径，不再重复索引。
+        # duplicates 为扫描器已判定与之前提交的文档内容相同的文件（不带倒排数据）
+        with self._lock:
+            for doc in itertools.chain(documents, duplicates):
+                for path in [doc['path']] + [duplicate[0] for duplicate in doc.get('duplicates') or ()]:
+                    self._remove_path(path)
+            keep_ids = [doc_id for doc_id, doc in enumerate(documents) if not self._add_duplicate(doc)]
+            for doc in duplicates:
+                self._add_duplicate(doc)
+            if len(keep_ids) < len(documents):
+                documents = [documents[doc_id] for doc_id in keep_ids]
+                postings = postings.select(keep_ids)
+            if documents:
+                segment = Segment(documents, postings)
+                self.segments.append(segment)
+                for doc_id, doc in enumerate(documents):
+                    self._register(segment, doc_id, doc)
+                logger.info(f"新增索引段，文档数: {len(documents)}，当前段数: {len(self.segments)}")
+            self._changed()
+            self.maybe_merge()
+
+    def _add_duplicate(self, doc):
+        # 索引中已有相同内容的文档时，把 doc 及其自身的重复路径归到该文档下并返回 True
+        original = self.hashes.get(doc.get('content_hash'))
+        if original is None:
+            return False
+        duplicates = [[doc['path'], doc['last_modified'], doc['size']]] + (doc.get('duplicates') or [])
+        original['duplicates'] = (original.get('duplicates') or []) + duplicates
+        for duplicate in duplicates:
+            self.paths[duplicate[0]] = original
+        return True
+
+    def remove_path(self, path):
+        with self._lock:
+            removed = self._remove_path(path)
+            if removed:
+                self._changed()
+                self.maybe_merge()
+            return removed
+
+    def _remove_path(self, path):
+        doc = self.paths.get(path)
+        if doc is None:
+            return False
+        duplicates = doc.get('duplicates') or []
+        if doc['path'] != path:
+            # 删除的是重复路径，原文档不受影响
+            doc['duplicates'] = [duplicate for duplicate in duplicates if duplicate[0] != path]
+            del self.paths[path]
+        elif duplicates:
+            # 还有内容相同的文件，把第一个重复路径提升为文档路径
+            doc['path'], doc['last_modified'], doc['size'] = duplicates[0]
+            doc['duplicates'] = duplicates[1:]
+            del self.paths[path]
+        else:
+            self._unregister(doc)
+        logger.info(f"已从索引中删除: {path}")
+        return True
+
+    def rename_path(self, src_path, dest_path):
+        # 内容未变化，只修改路径，无需重新建索引
+        with self._lock:
+            doc = self.paths.get(src_path)
+            if doc is None:
+                return False
+            self._remove_path(dest_path)
+            if doc['path'] == src_path:
+                doc['path'] = dest_path
+            else:
+                for duplicate in doc['duplicates']:
+                    if duplicate[0] == src_path:
+                        duplicate[0] = dest_path
+            del self.paths[src_path]
+            self.paths[dest_path] = doc
+            self._changed()
+            logger.info(f"索引中的路径已更新: {src_path} -> {dest_path}")
+            return True
+
+    def select_merge(self):
+        # 先压缩墓碑过多的段，再找段数达到 MERGE_FACTOR 的最低一层
+        for segment in self.segments:
+            if len(segment.deleted) > len(segment) * MAX_DELETED_RATIO:
+                return [segment]
+        tiers = defaultdict(list)
+        for segment in self.segments:
+            tiers[_tier(segment.live_count)].append(segment)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= MERGE_FACTOR:
+                return sorted(tiers[tier], key=lambda segment: segment.live_count)[:MERGE_FACTOR]
+        return None
+
+    def maybe_merge(self):
+        with self._lock:
+            if self._merge_thread is not None and self._merge_thread.is_alive():
+                return
+            segments = self.select_merge()
+            if segments is None:
+                return
+            self._merge_thread = threading.Thread(target=self._merge, args=(segments,), daemon=True)
+            self._merge_thread.start()
+
+    def wait_merge(self):
+        # 等待当前以及由它触发的后续合并全部完成
+        thread = self._merge_thread
+        while thread is not None:
+            thread.join()
+            thread = self._merge_thread
+
+    def merge_all(self):
+        """把所有段合并为一个并清除墓碑，返回 (文档表, 倒排数据)，用于保存段文件。
+
+        合并仍由后台合并线程执行，调用线程等待其完成。
+        """
+        while True:
+            self.wait_merge()
+            with self._lock:
+                if self._merge_thread is not None:
+                    continue
+                if not self.segments:
+                    return [], PostingsStore()
+                if len(self.segments) == 1 and not self.segments[0].deleted:
+                    return self.segments[0].documents, self.segments[0].postings
+                self._merge_thread = threading.Thread(target=self._merge, args=(list(self.segments),),
+                                                      daemon=True)
+                self._merge_thread.start()
+
+    def _merge(self, segments):
+        # 在后台线程中执行：清除墓碑并把选中的段合并为一个，
+        # 只在最后替换段列表时加锁，合并期间检索和增删照常进行
+        with self._lock:
+            deleted_snapshot = [set(segment.deleted) for segment in segments]
+        documents = []
+        stores = []
+        id_maps = []
+        for segment, deleted in zip(segments, deleted_snapshot):
+            keep_ids = [doc_id for doc_id in range(len(segment)) if doc_id not in deleted]
+            stores.append(segment.postings.select(keep_ids) if deleted else segment.postings)
+            id_maps.append({doc_id: len(documents) + i for i, doc_id in enumerate(keep_ids)})
+            documents.extend(segment.documents[doc_id] for doc_id in keep_ids)
+        merged_segment = Segment(documents, merge_stores(stores), max(segment.seq for segment in segments))
+        # 相似词索引也在后台线程中建好，检索时无需等待
+        merged_segment.postings.fuzzy_index
+        purged = sum(map(len, deleted_snapshot))
+
+        with self._lock:
+            # 合并期间新打的墓碑转移到合并后的段上
+            for segment, deleted, id_map in zip(segments, deleted_snapshot, id_maps):
+                for doc_id in segment.deleted - deleted:
+                    merged_segment.deleted.add(id_map[doc_id])
+            for doc_id, doc in enumerate(documents):
+                if doc_id not in merged_segment.deleted:
+                    self._locations[id(doc)] = (merged_segment, doc_id)
+            merged_ids = {id(segment) for segment in segments}
+            position = next(i for i, segment in enumerate(self.segments) if id(segment) in merged_ids)
+            rest = [segment for segment in self.segments if id(segment) not in merged_ids]
+            if merged_segment.live_count:
+                rest.insert(position, merged_segment)
+            self.segments = rest
+            self._changed()
+            logger.info(f"索引段合并完成，合并 {len(segments)} 个段，"
+                        f"清除 {purged} 个已删除文档，当前段数: {len(self.segments)}")
+            self._merge_thread = None
+            # 合并后上一层可能也达到了合并条件
+            self.maybe_merge()
+
+
+def _tier(live_count):
+    if live_count < FLOOR_SEGMENT_DOCS:
+        return 0
+    return int(math.log(live_count / FLOOR_SEGMENT_DOCS, MERGE_FACTOR)) + 1
@@ -0,0 +1,19 @@
+import sys
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtNetwork import QLocalServer, QLocalSocket
+
+class SingleApplication(QApplication):
+    def __init__(self, argv):
+        super().__init__(argv)
+        self._server = None
+        self._socket = QLocalSocket()
+        self._socket.connectToServer("WordSearchSystem")
+        
+        if self._socket.waitForConnected():
+            # 如果已经有实例在运行，则退出
+            sys.exit(0)
+        else:
+            # 创建并启动服务器
+            self._server = QLocalServer()
+            self._server.removeServer("WordSearchSystem")
+            self._server.listen("WordSearchSystem")
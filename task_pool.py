@@ -0,0 +1,149 @@
+import multiprocessing
+import time
+from collections import deque
+from multiprocessing.connection import wait
+
+import psutil
+
+import logger_config
+
+logger = logger_config.setup_logger(__name__)
+
+# 主进程轮询结果、检查超时和内存的间隔（秒）
+POLL_INTERVAL = 0.5
+
+
+def _worker_main(conn, initializer):
+    # 工作进程主循环：从自己的管道读取 (函数, 任务)，执行后把结果写回同一管道，收到 None 时退出
+    if initializer is not None:
+        initializer()
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        func, task = message
+        try:
+            result = func(task)
+        except Exception as e:
+            logger.error(f"任务执行失败: {task}, 错误: {type(e).__name__}: {str(e)}")
+            result = None
+        conn.send(result)
+
+
+class _Worker:
+    def __init__(self, initializer):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(child_conn, initializer), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.started = 0.0
+        self.limits = None
+        self.baseline_rss = 0
+
+    def rss(self):
+        try:
+            return psutil.Process(self.process.pid).memory_info().rss
+        except psutil.Error:
+            return 0
+
+    def submit(self, func, task, limits):
+        self.task = task
+        self.limits = limits
+        # 内存上限按本任务开始后的增长计算，不受工作进程之前处理过的任务影响
+        self.baseline_rss = self.rss()
+        self.started = time.time()
+        self.conn.send((func, task))
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class TaskPool:
+    """进程池：每个工作进程通过独立的管道收发任务，主进程在进程外强制执行每个任务的
+    时间和内存上限，超限或卡住的工作进程被单独终止并替换，不影响其它进程和整个扫描。"""
+
+    def __init__(self, processes, initializer=None):
+        self.initializer = initializer
+        # 被终止的工作进程所在位置置为 None，下次分派任务前补上新进程
+        self.workers = [_Worker(initializer) for _ in range(processes)]
+
+    def _kill(self, index):
+        self.workers[index].kill()
+        self.workers[index] = None
+
+    def run(self, func, tasks, limits, cancel_event=None):
+        """按完成顺序产出 (任务, 结果, 错误)，错误为 None、'timeout'、'memory' 或 'crashed'。
+
+        limits(任务) 返回该任务的 (时间上限秒数, 内存增长上限MB)。cancel_event 被设置时返回；
+        提前返回或调用方不再迭代时，仍在执行任务的工作进程被终止，不会把旧结果带到下一次 run。
+        """
+        pending = deque(tasks)
+        try:
+            while pending or any(worker is not None and worker.task is not None for worker in self.workers):
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                for index, worker in enumerate(self.workers):
+                    if worker is None:
+                        worker = self.workers[index] = _Worker(self.initializer)
+                    if worker.task is None and pending:
+                        task = pending.popleft()
+                        worker.submit(func, task, limits(task))
+
+                busy = [(index, worker) for index, worker in enumerate(self.workers) if worker.task is not None]
+                wait([worker.conn for _, worker in busy] + [worker.process.sentinel for _, worker in busy],
+                     POLL_INTERVAL)
+                now = time.time()
+                for index, worker in busy:
+                    task = worker.task
+                    error = None
+                    result = None
+                    try:
+                        if worker.conn.poll():
+                            result = worker.conn.recv()
+                        elif not worker.process.is_alive():
+                            error = 'crashed'
+                        elif now - worker.started > worker.limits[0]:
+                            error = 'timeout'
+                        elif worker.rss() - worker.baseline_rss > worker.limits[1] * 1024 * 1024:
+                            error = 'memory'
+                        else:
+                            continue
+                    except (EOFError, OSError):
+                        error = 'crashed'
+                    worker.task = None
+                    if error is not None:
+                        logger.warning(f"工作进程 {worker.process.pid} 处理任务失败（{error}），"
+                                       f"已运行 {now - worker.started:.1f}秒，终止并替换: {task}")
+                        self._kill(index)
+                    yield task, result, error
+        finally:
+            for index, worker in enumerate(self.workers):
+                if worker is not None and worker.task is not None:
+                    self._kill(index)
+
+    def terminate(self):
+        for worker in self.workers:
+            if worker is None:
+                continue
+            if worker.task is None:
+                worker.stop()
+            else:
+                worker.kill()
+        self.workers = []
@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+from batch_search import search_batch
+from postings import PostingsBuilder
+from search_engine import search_documents
+from search_index import SearchIndex
+from tokenizer import tokenize_packed
+
+QUERIES = ['alpha', 'alpha beta', 'alphas gamma', 'beta AND gamma', 'alpha NOT delta', '"gamma delta"',
+           'epsilon', 'type:md beta', 'delta OR omega', 'missing']
+
+
+@pytest.fixture
+def index():
+    rng = random.Random(17)
+    words = ['alpha', 'alphas', 'beta', 'gamma', 'delta', 'epsilon']
+    index = SearchIndex()
+    for segment in range(3):
+        documents = []
+        builder = PostingsBuilder()
+        for i in range(60):
+            text = ' '.join(rng.choices(words, k=rng.randint(1, 20)) + [f'id{segment}x{i}'])
+            path = f'/docs/{segment}_{i}.{rng.choice(["txt", "md"])}'
+            builder.add_packed_document(*tokenize_packed(text))
+            documents.append({'path': path, 'type': path.rsplit('.', 1)[1], 'content': text})
+        index.add_segment(documents, builder.build())
+    for segment in index.segments:
+        for doc in segment.documents[::9]:
+            index.remove_path(doc['path'])
+    return index
+
+
+@pytest.mark.parametrize('limit', [1, 5, 50, None])
+def test_batch_matches_single_queries(index, limit):
+    batch = search_batch(index, QUERIES, limit=limit)
+    assert len(batch) == len(QUERIES)
+    for keyword, results in zip(QUERIES, batch):
+        expected = search_documents(index, keyword, limit=limit)
+        assert [result['path'] for result in results] == [result['path'] for result in expected], keyword
+        assert [result['score'] for result in results] == pytest.approx(
+            [result['score'] for result in expected]), keyword
@@ -0,0 +1,65 @@
+import zipfile
+
+import pytest
+
+import docx_extractor
+
+NS = ('xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+      'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"')
+
+
+def para(*runs):
+    return '<w:p>' + ''.join(f'<w:r><w:t>{run}</w:t></w:r>' for run in runs) + '</w:p>'
+
+
+def part(root, body):
+    return f'<?xml version="1.0" encoding="UTF-8"?><w:{root} {NS}>{body}</w:{root}>'
+
+
+BODY = part('document', '<w:body>' + ''.join([
+    para('第一段', '正文'),
+    '<w:p><w:r><w:t>制表</w:t><w:tab/><w:t>换行</w:t><w:br/><w:t>结束</w:t></w:r></w:p>',
+    '<w:tbl><w:tr><w:tc>' + para('甲') + para('乙') + '</w:tc><w:tc>'
+    + '<w:tbl><w:tr><w:tc>' + para('嵌套') + '</w:tc></w:tr></w:tbl>'
+    + '</w:tc></w:tr><w:tr><w:tc>' + para('丙') + '</w:tc><w:tc/></w:tr></w:tbl>',
+    '<w:p><w:r><mc:AlternateContent><mc:Choice>' + para('文本框')
+    + '</mc:Choice><mc:Fallback>' + para('文本框') + '</mc:Fallback></mc:AlternateContent></w:r></w:p>',
+    para('最后一段'),
+]) + '</w:body>')
+
+PARTS = {
+    'word/document.xml': BODY,
+    'word/footnotes.xml': part('footnotes', '<w:footnote w:type="separator"><w:p><w:r><w:separator/></w:r></w:p>'
+                               '</w:footnote><w:footnote>' + para('脚注内容') + '</w:footnote>'),
+    'word/endnotes.xml': part('endnotes', '<w:endnote>' + para('尾注内容') + '</w:endnote>'),
+    'word/footer1.xml': part('ftr', para('第 1 页')),
+    'word/header2.xml': part('hdr', para('公司名称') + para('第二个页眉')),
+    'word/header1.xml': part('hdr', para('公司名称')),
+}
+
+EXPECTED = ['第一段正文', '制表\t换行\n结束', '甲 乙\t嵌套', '丙', '文本框', '最后一段',
+            '脚注内容', '尾注内容', '公司名称', '第二个页眉', '第 1 页']
+
+
+@pytest.fixture
+def docx_path(tmp_path):
+    path = tmp_path / 'sample.docx'
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, xml in PARTS.items():
+            archive.writestr(name, xml)
+    return path
+
+
+def test_iter_lines_order_and_layout(docx_path):
+    assert list(docx_extractor.iter_lines(docx_path)) == EXPECTED
+
+
+def test_blocks_join_to_full_text(docx_path, monkeypatch):
+    monkeypatch.setattr(docx_extractor, 'BLOCK_CHARS', 8)
+    blocks = list(docx_extractor.extract_docx(docx_path))
+    assert len(blocks) > 1
+    # 块从行首切开，换行符留在下一块开头
+    assert all(block.startswith('\n') for block in blocks[1:])
+    assert ''.join(blocks) == '\n'.join(EXPECTED)
+    with open(docx_path, 'rb') as f:
+        assert ''.join(docx_extractor.extract_docx(f)) == '\n'.join(EXPECTED)
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+pytest.importorskip('PyQt6')
+from PyQt6.QtCore import QCoreApplication
+
+import file_watcher
+from file_watcher import EventQueue
+
+
+@pytest.fixture(scope='module', autouse=True)
+def app():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+@pytest.fixture
+def queue():
+    queue = EventQueue()
+    queue.batches = []
+    queue.batch_ready.connect(queue.batches.append)
+    yield queue
+    queue.clear()
+
+
+def write(path, text='x'):
+    with open(path, 'w') as f:
+        f.write(text)
+    return str(path)
+
+
+def test_coalesces_events_per_path(queue, tmp_path):
+    a, b, c = write(tmp_path / 'a.txt'), write(tmp_path / 'b.txt'), str(tmp_path / 'c.txt')
+    queue.add_changed(a)
+    queue.add_changed(a)
+    queue.add_changed(b)
+    queue.add_deleted(b)
+    queue.add_deleted(c)
+    queue.add_moved(str(tmp_path / 'old.txt'), str(tmp_path / 'new.txt'))
+    queue.flush()
+    assert queue.batches == [{'changed': [a], 'deleted': [b, c],
+                              'moved': [(str(tmp_path / 'old.txt'), str(tmp_path / 'new.txt'))]}]
+    queue.flush()
+    assert len(queue.batches) == 1
+
+
+def test_move_of_pending_file(queue, tmp_path):
+    src = str(tmp_path / 'tmp~')
+    dest = write(tmp_path / 'saved.txt')
+    queue.add_changed(src)
+    queue.add_moved(src, dest)
+    queue.flush()
+    # 尚未建索引的文件移动后按新路径处理，原路径按删除处理
+    assert queue.batches == [{'changed': [dest], 'deleted': [src], 'moved': []}]
+
+
+def test_waits_until_file_is_stable(queue, tmp_path):
+    path = write(tmp_path / 'growing.txt')
+    queue.add_changed(path)
+    write(path, 'longer content')
+    queue.flush()
+    assert queue.batches == []
+    assert queue.states == {path: 'changed'}
+    queue.flush()
+    assert queue.batches == [{'changed': [path], 'deleted': [], 'moved': []}]
+
+
+def test_debounce_and_max_delay(queue, tmp_path, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(file_watcher.time, 'monotonic', lambda: now[0])
+    path = write(tmp_path / 'a.txt')
+    queue.add_changed(path)
+    assert queue._timer.interval() == int(file_watcher.DEBOUNCE_SECONDS * 1000)
+    # 事件持续不断时，等待时间不超过第一个事件之后的 MAX_BATCH_DELAY
+    now[0] += file_watcher.MAX_BATCH_DELAY - 0.25
+    queue.add_changed(path)
+    assert queue._timer.isActive()
+    assert queue._timer.interval() == 250
+    now[0] += 1.0
+    queue.add_deleted(path)
+    assert queue._timer.interval() == 0
@@ -0,0 +1,53 @@
+import os
+
+import file_enumerator
+from file_enumerator import FileEnumerator
+
+
+def touch(path, data=b'x'):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_scan_finds_documents_and_skips_excluded(tmp_path, monkeypatch):
+    root = tmp_path / 'root'
+    expected = {
+        touch(root / 'a.pdf', b'12345'),
+        touch(root / 'sub' / 'b.DOCX'),
+        touch(root / 'sub' / 'deep' / 'c.md'),
+    }
+    touch(root / 'notes.xyz')
+    touch(root / '~$lock.docx')
+    touch(root / 'Windows' / 'd.txt')
+    touch(root / 'data' / 'ProgramData' / 'e.txt')
+    touch(root / 'sub' / 'f.txt.bak')
+    (root / 'folder.pdf').mkdir()
+    os.symlink(root / 'a.pdf', root / 'link.pdf')
+    os.symlink(root / 'sub', root / 'linked_dir')
+    # 限制深度和路径长度：root 下第4层的目录和路径过长的文件都被跳过
+    monkeypatch.setattr(file_enumerator, 'MAX_DEPTH', len(root.resolve().parts) + 3)
+    touch(root / 'l1' / 'l2' / 'kept.txt')
+    expected.add(root / 'l1' / 'l2' / 'kept.txt')
+    touch(root / 'l1' / 'l2' / 'l3' / 'l4' / 'too_deep.txt')
+    long_name = 'n' * (file_enumerator.MAX_PATH - len(str(root)))
+    touch(root / f'{long_name}.txt')
+
+    found = FileEnumerator(threads=3).scan(str(root))
+    assert set(found) == {str(path) for path in expected}
+    stat = os.stat(root / 'a.pdf')
+    assert found[str(root / 'a.pdf')] == {'last_modified': int(stat.st_mtime), 'size': 5}
+
+
+def test_scan_skips_unreadable_directories(tmp_path, monkeypatch):
+    touch(tmp_path / 'ok' / 'a.txt')
+    touch(tmp_path / 'locked' / 'b.txt')
+    list_directory = FileEnumerator._list_directory
+
+    def failing(self, directory, depth):
+        if directory.endswith('locked'):
+            raise PermissionError(directory)
+        return list_directory(self, directory, depth)
+
+    monkeypatch.setattr(FileEnumerator, '_list_directory', failing)
+    assert list(FileEnumerator().scan(str(tmp_path))) == [str(tmp_path / 'ok' / 'a.txt')]
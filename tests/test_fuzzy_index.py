@@ -0,0 +1,26 @@
+import random
+from difflib import get_close_matches
+
+import pytest
+
+from fuzzy_index import FuzzyTermIndex
+
+TERMS = ['检索', '检索系统', '系统', '倒排索引', '索引', '搜索引擎', '搜索', 'search', 'searching', 'researcher',
+         'index', 'indexes', 'indices', 'alpha', 'alphabet', 'aaab', 'abab', 'baaa', 'a', 'ab', '']
+
+
+@pytest.mark.parametrize('cutoff', [0.0, 0.3, 0.6, 0.8, 1.0])
+@pytest.mark.parametrize('n', [1, 3, 10])
+def test_matches_difflib(n, cutoff):
+    index = FuzzyTermIndex(TERMS)
+    for word in TERMS + ['检索引擎', 'serch', 'indx', 'alph', 'zzz', 'aab']:
+        assert index.get_close_matches(word, n, cutoff) == get_close_matches(word, TERMS, n, cutoff)
+
+
+def test_matches_difflib_random():
+    rng = random.Random(4)
+    terms = list(dict.fromkeys(''.join(rng.choices('abcde', k=rng.randint(1, 7))) for _ in range(300)))
+    index = FuzzyTermIndex(terms[:150])
+    index.add_terms(terms[150:])
+    for word in terms[:50] + ['abc', 'eeee', 'abcdeabcde']:
+        assert index.get_close_matches(word, 5, 0.6) == get_close_matches(word, terms, 5, 0.6)
@@ -0,0 +1,176 @@
+import random
+
+import pytest
+
+from cache_codec import BinaryCodec, JsonZlibCodec
+from index_segment import load_segment, save_segment
+from postings import PostingsBuilder
+from query import parse_query
+from search_engine import search_documents
+from search_index import SearchIndex
+from tokenizer import tokenize_packed
+
+# 结巴把空格也切成词，因此相邻的两个英文词的位置相差2
+TEXTS = {
+    '/docs/a.txt': 'alpha beta gamma delta',
+    '/docs/b.txt': 'beta alpha gamma',
+    '/docs/c.pdf': 'alpha gamma gamma epsilon',
+    '/docs/d.txt': 'delta epsilon zeta',
+}
+
+
+def make_segment(texts):
+    documents = []
+    builder = PostingsBuilder()
+    for path, text in texts.items():
+        builder.add_packed_document(*tokenize_packed(text))
+        documents.append({'path': path, 'type': path.rsplit('.', 1)[1], 'content': text,
+                          'last_modified': 1, 'size': len(text), 'content_hash': text})
+    return documents, builder.build()
+
+
+def search_paths(index, keyword):
+    return sorted(result['path'] for result in search_documents(index, keyword))
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.add_segment(*make_segment(TEXTS))
+    return index
+
+
+@pytest.mark.parametrize('keyword, plan', [
+    ('a OR b AND c', '("a" OR ("b" AND "c"))'),
+    ('a NOT b OR c', '((NOT "b" AND "a") OR "c")'),
+    ('(a OR b) AND NOT c', '(("a" OR "b") AND NOT "c")'),
+    ('"x y" NEAR/3 z', '"x y" NEAR/3 "z"'),
+])
+def test_parser_precedence(keyword, plan):
+    assert repr(parse_query(keyword).root) == plan
+
+
+def test_parser_excludes_negated_terms_from_scoring():
+    assert parse_query('NOT a b').terms == ['b']
+
+
+@pytest.mark.parametrize('keyword, paths', [
+    ('"alpha beta"', ['/docs/a.txt']),
+    ('"beta alpha"', ['/docs/b.txt']),
+    ('alpha NEAR/2 gamma', ['/docs/b.txt', '/docs/c.pdf']),
+    ('alpha NEAR/4 gamma', ['/docs/a.txt', '/docs/b.txt', '/docs/c.pdf']),
+    ('(alpha OR delta) AND zeta', ['/docs/d.txt']),
+    ('alpha NOT beta', ['/docs/c.pdf']),
+    ('gamma type:pdf', ['/docs/c.pdf']),
+    ('gamma path:B.TXT', ['/docs/b.txt']),
+])
+def test_query_results(index, keyword, paths):
+    assert search_paths(index, keyword) == paths
+
+
+def test_boolean_queries_match_brute_force():
+    rng = random.Random(15)
+    words = ['alpha', 'beta', 'gamma', 'delta']
+    # 每篇加上唯一的词，避免内容相同的文档被合并
+    texts = {f'/docs/{i}.txt': ' '.join(rng.choices(words, k=rng.randint(1, 12)) + [f'id{i}'])
+             for i in range(300)}
+    index = SearchIndex()
+    items = list(texts.items())
+    # 分成多个段并删除部分文档，检验逐段求值和墓碑
+    for start in range(0, len(items), 100):
+        index.add_segment(*make_segment(dict(items[start:start + 100])))
+    for path in list(texts)[::7]:
+        index.remove_path(path)
+        del texts[path]
+
+    def having(word):
+        return {path for path, text in texts.items() if word in text.split()}
+
+    def phrase(*tokens):
+        return {path for path, text in texts.items() if f" {' '.join(tokens)} " in f" {text} "}
+
+    expected = {
+        'alpha AND beta': having('alpha') & having('beta'),
+        'alpha AND beta AND gamma': having('alpha') & having('beta') & having('gamma'),
+        'alpha NOT beta': having('alpha') - having('beta'),
+        'NOT delta': set(texts) - having('delta'),
+        '(alpha OR beta) AND NOT gamma': (having('alpha') | having('beta')) - having('gamma'),
+        '"alpha beta" AND "gamma delta"': phrase('alpha', 'beta') & phrase('gamma', 'delta'),
+        '"alpha beta gamma" OR "delta delta"': phrase('alpha', 'beta', 'gamma') | phrase('delta', 'delta'),
+        'gamma AND "beta alpha" NOT path:1': {path for path in having('gamma') & phrase('beta', 'alpha')
+                                              if '1' not in path},
+    }
+    for keyword, paths in expected.items():
+        assert search_paths(index, keyword) == sorted(paths), keyword
+
+
+def test_segment_round_trip(tmp_path):
+    documents, store = make_segment(TEXTS)
+    documents[2]['page_offsets'] = [[0, 0], [12, 6]]
+    path = str(tmp_path / 'index.seg')
+    save_segment(path, documents, store)
+    loaded_documents, loaded_store = load_segment(path)
+    assert 'content' not in loaded_documents[0]
+    assert loaded_store.terms == store.terms
+    for name in ('term_starts', 'doc_ids', 'pos_starts', 'positions', 'doc_lengths', 'doc_norms'):
+        assert list(getattr(loaded_store, name)) == list(getattr(store, name))
+    assert [doc['content'] for doc in loaded_documents] == list(TEXTS.values())
+    assert loaded_documents[2]['page_offsets'] == [[0, 0], [12, 6]]
+    index = SearchIndex()
+    index.add_segment(loaded_documents, loaded_store)
+    assert search_paths(index, '"alpha beta"') == ['/docs/a.txt']
+
+
+def test_segment_versions(tmp_path):
+    path = str(tmp_path / 'index.seg')
+    save_segment(path, *make_segment(TEXTS))
+    documents, store = load_segment(path)
+    # 旧版本仍被映射时保存新版本，再次保存时复制映射中的正文
+    save_segment(path, documents[:2], store.select([0, 1]))
+    save_segment(path, *load_segment(path))
+    loaded_documents, _ = load_segment(path)
+    assert [doc['content'] for doc in loaded_documents] == list(TEXTS.values())[:2]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['index.seg.3']
+
+
+def test_delete_and_rename_across_merge(index):
+    index.add_segment(*make_segment({'/docs/e.txt': 'alpha theta'}))
+    index.add_segment(*make_segment({'/docs/f.txt': 'theta iota'}))
+    assert index.remove_path('/docs/a.txt')
+    assert index.rename_path('/docs/e.txt', '/docs/renamed.txt')
+    assert len(index.segments) == 3
+
+    documents, store = index.merge_all()
+    assert len(index.segments) == 1
+    assert not index.segments[0].deleted
+    assert sorted(doc['path'] for doc in documents) == [
+        '/docs/b.txt', '/docs/c.pdf', '/docs/d.txt', '/docs/f.txt', '/docs/renamed.txt']
+    assert store.num_docs == len(documents) == index.num_docs
+    assert search_paths(index, 'alpha') == ['/docs/b.txt', '/docs/c.pdf', '/docs/renamed.txt']
+    assert search_paths(index, 'theta') == ['/docs/f.txt', '/docs/renamed.txt']
+    assert index.remove_path('/docs/renamed.txt')
+    assert not index.remove_path('/docs/e.txt')
+    assert search_paths(index, 'theta') == ['/docs/f.txt']
+
+
+def test_duplicate_content_is_indexed_once(index):
+    index.add_segment(*make_segment({'/docs/copy.txt': TEXTS['/docs/d.txt']}))
+    results = search_documents(index, 'zeta')
+    assert [result['path'] for result in results] == ['/docs/d.txt']
+    assert results[0]['duplicates'] == ['/docs/copy.txt']
+    assert index.remove_path('/docs/d.txt')
+    assert [result['path'] for result in search_documents(index, 'zeta')] == ['/docs/copy.txt']
+
+
+@pytest.mark.parametrize('codec', [BinaryCodec('zlib'), BinaryCodec('none'), JsonZlibCodec()])
+def test_codec_round_trip(codec):
+    terms, term_tfs, positions = tokenize_packed('检索 系统 的 倒排 索引 检索')
+    document = {'path': '/docs/中文.docx', 'type': 'docx', 'content': '检索 系统 的 倒排 索引 检索',
+                'extractor_version': 2, 'page_offsets': [[0, 0]],
+                'terms': terms, 'term_tfs': term_tfs, 'positions': positions}
+    decoded = codec.decode(codec.encode(document))
+    assert decoded['terms'] == terms
+    assert list(decoded['term_tfs']) == list(term_tfs)
+    assert list(decoded['positions']) == list(positions)
+    for key in ('path', 'type', 'content', 'extractor_version', 'page_offsets'):
+        assert decoded[key] == document[key]
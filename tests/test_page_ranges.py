@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+import document_processor
+import pdf_extractor
+from extractors import page_ranges
+
+
+def write_pdf(path, page_count, leaf_size):
+    """写出一个页树分两层的PDF：根节点下每个中间节点挂 leaf_size 页，字体资源由页从根节点继承。"""
+    objects = {1: '<< /Type /Catalog /Pages 2 0 R >>', 3: '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>'}
+    next_id = 4
+    kids = []
+    for start in range(0, page_count, leaf_size):
+        node_id = next_id
+        next_id += 1
+        pages = []
+        for page_no in range(start, min(start + leaf_size, page_count)):
+            page_id, content_id = next_id, next_id + 1
+            next_id += 2
+            stream = f'BT /F1 12 Tf 72 720 Td (page{page_no} alpha{page_no} common) Tj ET'
+            objects[page_id] = f'<< /Type /Page /Parent {node_id} 0 R /Contents {content_id} 0 R >>'
+            objects[content_id] = f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream'
+            pages.append(page_id)
+        objects[node_id] = (f'<< /Type /Pages /Parent 2 0 R /Count {len(pages)} '
+                            f'/Kids [{" ".join(f"{page_id} 0 R" for page_id in pages)}] >>')
+        kids.append(node_id)
+    objects[2] = (f'<< /Type /Pages /Count {page_count} /Kids [{" ".join(f"{kid} 0 R" for kid in kids)}] '
+                  f'/Resources << /Font << /F1 3 0 R >> >> /MediaBox [0 0 612 792] >>')
+
+    data = bytearray(b'%PDF-1.4\n')
+    offsets = {}
+    for objid in sorted(objects):
+        offsets[objid] = len(data)
+        data += f'{objid} 0 obj\n{objects[objid]}\nendobj\n'.encode()
+    xref = len(data)
+    data += f'xref\n0 {next_id}\n0000000000 65535 f \n'.encode()
+    data += ''.join(f'{offsets[objid]:010d} 00000 n \n' for objid in range(1, next_id)).encode()
+    data += f'trailer\n<< /Size {next_id} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    path.write_bytes(bytes(data))
+    return path
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    return write_pdf(tmp_path / 'nested.pdf', 23, 4)
+
+
+def page_text(page_no):
+    return f'page{page_no} alpha{page_no} common\n\n\x0c'
+
+
+def test_page_ranges_read_only_their_pages(pdf_path, monkeypatch):
+    assert pdf_extractor.count_pages(pdf_path) == 23
+    assert list(pdf_extractor.iter_pages(pdf_path)) == [page_text(i) for i in range(23)]
+
+    created = []
+
+    class RecordingPage(pdf_extractor.PDFPage):
+        def __init__(self, *args):
+            super().__init__(*args)
+            created.append(self)
+
+    monkeypatch.setattr(pdf_extractor, 'PDFPage', RecordingPage)
+    for first, last in [(0, 3), (5, 9), (8, 12), (21, 23), (20, None)]:
+        created.clear()
+        expected = [page_text(i) for i in range(first, 23 if last is None else last)]
+        assert list(pdf_extractor.iter_pages(pdf_path, first, last)) == expected
+        # 范围之外的页对象不被创建
+        assert len(created) == len(expected)
+
+
+def test_merged_page_ranges_match_whole_document(pdf_path):
+    whole = document_processor.process_document(str(pdf_path), 'pdf')
+    parts = [document_processor.process_page_range(str(pdf_path), 'pdf', first, last)
+             for first, last in page_ranges(23, 5)]
+    random.Random(0).shuffle(parts)
+    merged = document_processor.merge_page_ranges(parts)
+    for key in ('content', 'page_offsets', 'terms', 'term_tfs', 'positions', 'extractor_version'):
+        assert merged[key] == whole[key], key
+    # 第 i 页的起始字符位置与起始词位置
+    assert merged['page_offsets'][7][0] == len(''.join(page_text(i) for i in range(7)))
+    assert [page_no for page_no, (char_start, _) in enumerate(merged['page_offsets'])
+            if merged['content'].startswith(f'page{page_no} ', char_start)] == list(range(23))
+
+
+def test_merge_page_ranges_failures(pdf_path):
+    parts = [document_processor.process_page_range(str(pdf_path), 'pdf', first, last)
+             for first, last in page_ranges(23, 10)]
+    failed = {'path': str(pdf_path), 'type': 'pdf', 'page_range': (10, 20), 'failed': True}
+    assert document_processor.merge_page_ranges([parts[0], failed, parts[2]]) is None
+    # 全部页都没有文字时按提取失败处理
+    empty = dict(parts[0], content='\x0c' * 10, page_lengths=[1] * 10)
+    assert document_processor.merge_page_ranges([empty]) is None
+    # 页范围任务把已读到的页数记入 page_range（超出页数的范围被截短）
+    assert document_processor.process_page_range(str(pdf_path), 'pdf', 20, 30)['page_range'] == (20, 23)
@@ -0,0 +1,83 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from postings import NORM_LENGTHS, PostingsBuilder
+from scoring import rank_hits, top_hits
+from search_engine import search_documents
+from search_index import SearchIndex
+from tokenizer import tokenize_packed
+
+
+def make_index(segment_texts):
+    index = SearchIndex()
+    for texts in segment_texts:
+        documents = []
+        builder = PostingsBuilder()
+        for path, text in texts:
+            builder.add_packed_document(*tokenize_packed(text))
+            documents.append({'path': path, 'type': 'txt', 'content': text})
+        index.add_segment(documents, builder.build())
+    return index
+
+
+@pytest.fixture
+def corpus():
+    rng = random.Random(16)
+    segment_texts = []
+    for segment in range(3):
+        texts = []
+        for i in range(40):
+            words = rng.choices(['gamma', 'omega', 'kappa', 'sigma'], k=rng.randint(1, 30))
+            texts.append((f'/docs/{segment}_{i}.txt', ' '.join(words)))
+        segment_texts.append(texts)
+    return segment_texts
+
+
+def test_bm25_matches_formula(corpus, k1=1.2, b=0.75):
+    index = make_index(corpus)
+    reader = index.reader()
+    lengths = {}
+    for segment in reader.segments:
+        for doc_id, doc in enumerate(segment.documents):
+            lengths[doc['path']] = (segment.postings.doc_lengths[doc_id],
+                                    NORM_LENGTHS[segment.postings.doc_norms[doc_id]])
+    avg_length = sum(length for length, _ in lengths.values()) / len(lengths)
+    texts = dict(text for texts in corpus for text in texts)
+    tfs = {path: text.split().count('gamma') for path, text in texts.items()}
+    doc_freq = sum(1 for tf in tfs.values() if tf)
+    idf = math.log(1 + (len(texts) - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    results = search_documents(index, 'gamma')
+    assert len(results) == doc_freq
+    for result in results:
+        tf, norm_length = tfs[result['path']], lengths[result['path']][1]
+        expected = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * norm_length / avg_length))
+        assert result['score'] == pytest.approx(expected)
+
+
+def test_pages_match_full_ranking(corpus):
+    index = make_index(corpus)
+    full = [(result['path'], result['score']) for result in search_documents(index, 'gamma OR sigma')]
+    assert [score for _, score in full] == sorted((score for _, score in full), reverse=True)
+    for offset in range(len(full) + 1):
+        for limit in (1, 7, len(full)):
+            page = search_documents(index, 'gamma OR sigma', limit=limit, offset=offset)
+            assert [(result['path'], result['score']) for result in page] == full[offset:offset + limit]
+
+
+def test_top_hits_matches_full_sort():
+    rng = np.random.default_rng(5)
+    doc_ids = rng.permutation(200).astype(np.int64)
+    # 得分只取少数几个值，检验同分时按文档ID排序
+    scores = rng.integers(0, 6, size=200).astype(np.float64)
+    order = sorted(range(200), key=lambda i: (-scores[i], doc_ids[i]))
+    expected = list(zip(doc_ids[order].tolist(), scores[order].tolist()))
+    for top_n in range(0, 202):
+        ids, top_scores = top_hits(doc_ids, scores, top_n)
+        assert list(zip(ids.tolist(), top_scores.tolist())) == expected[:top_n]
+    for offset in range(0, 202, 3):
+        assert rank_hits(doc_ids, scores, 10, offset) == expected[offset:offset + 10]
+        assert rank_hits(doc_ids, scores, None, offset) == expected[offset:]
@@ -0,0 +1,66 @@
+from postings import PostingsBuilder
+from search_cache import LRUCache
+from search_engine import create_result_cache, search_documents
+from search_index import SearchIndex
+from tokenizer import tokenize_packed
+
+
+def make_segment(texts):
+    documents = []
+    builder = PostingsBuilder()
+    for path, text in texts.items():
+        builder.add_packed_document(*tokenize_packed(text))
+        documents.append({'path': path, 'type': 'txt', 'content': text, 'content_hash': text})
+    return documents, builder.build()
+
+
+def test_lru_eviction_by_size():
+    cache = LRUCache(10, sizeof=len)
+    cache.put('a', 'xxxx')
+    cache.put('b', 'xxxx')
+    assert cache.get('a') == 'xxxx'
+    # 'b' 最久未使用，先被淘汰
+    cache.put('c', 'xxxx')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'xxxx' and cache.get('c') == 'xxxx'
+    assert cache.size == 8 and cache.stats.evictions == 1
+    # 替换已有的键按新大小计算，超过容量的值不缓存
+    cache.put('a', 'xx')
+    assert cache.size == 6
+    cache.put('d', 'x' * 11)
+    assert cache.get('d') is None and len(cache) == 2
+    assert (cache.stats.hits, cache.stats.misses) == (3, 2)
+
+
+def test_results_invalidated_when_index_changes():
+    index = SearchIndex()
+    index.add_segment(*make_segment({'/docs/a.txt': 'alpha beta', '/docs/b.txt': 'alpha gamma'}))
+    cache = create_result_cache()
+
+    def paths(keyword, **kwargs):
+        return [result['path'] for result in search_documents(index, keyword, cache=cache, **kwargs)]
+
+    assert paths('alpha') == ['/docs/a.txt', '/docs/b.txt']
+    assert paths('alpha', limit=1, offset=1) == ['/docs/b.txt']
+    assert cache.stats.hits == 1
+    # 索引变化后版本号改变，旧结果不再命中
+    index.add_segment(*make_segment({'/docs/c.txt': 'alpha alpha alpha'}))
+    assert paths('alpha')[0] == '/docs/c.txt'
+    assert cache.stats.hits == 1
+    index.remove_path('/docs/c.txt')
+    assert paths('alpha') == ['/docs/a.txt', '/docs/b.txt']
+    assert cache.stats.hits == 1 and cache.stats.misses == 3
+
+
+def test_fuzzy_cache_follows_new_segments_and_merges():
+    index = SearchIndex()
+    index.add_segment(*make_segment({'/docs/a.txt': 'searching'}))
+    assert index.reader().get_close_matches('search', n=2, cutoff=0.8) == ['searching']
+    # 缓存之后新增的段只需补查新段，结果与整体查找一致
+    index.add_segment(*make_segment({'/docs/b.txt': 'search searches'}))
+    assert index.reader().get_close_matches('search', n=2, cutoff=0.8) == ['search', 'searches']
+    assert index.fuzzy_cache.stats.hits == 1
+    # 相似词随合并从索引中清除后重新查找
+    index.remove_path('/docs/b.txt')
+    index.merge_all()
+    assert index.reader().get_close_matches('search', n=2, cutoff=0.8) == ['searching']
@@ -0,0 +1,74 @@
+import os
+import time
+
+import pytest
+
+import cache_manager
+import task_pool
+from task_pool import TaskPool
+
+
+def run_task(task):
+    # 测试任务在工作进程中执行，按任务类型模拟正常、超时、内存超限、崩溃和异常
+    kind, value = task
+    if kind == 'sleep':
+        time.sleep(value)
+    elif kind == 'memory':
+        data = bytearray(value * 1024 * 1024)
+        data[::4096] = b'x' * len(data[::4096])
+        time.sleep(10)
+    elif kind == 'crash':
+        os._exit(1)
+    elif kind == 'raise':
+        raise ValueError(value)
+    return kind, value, os.getpid()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(task_pool, 'POLL_INTERVAL', 0.05)
+    pool = TaskPool(2)
+    yield pool
+    pool.terminate()
+
+
+def test_limits_kill_only_the_failing_worker(pool):
+    tasks = [('sleep', 30), ('memory', 200), ('crash', 0), ('raise', 'bad'), ('ok', 1), ('ok', 2)]
+    limits = {('sleep', 30): (0.5, 1024), ('memory', 200): (30, 50)}
+    start = time.time()
+    outcomes = {task: (result, error) for task, result, error in
+                pool.run(run_task, tasks, lambda task: limits.get(task, (30, 1024)))}
+    assert time.time() - start < 10
+    assert outcomes[('sleep', 30)] == (None, 'timeout')
+    assert outcomes[('memory', 200)] == (None, 'memory')
+    assert outcomes[('crash', 0)] == (None, 'crashed')
+    # 任务中的异常不终止工作进程，结果为 None
+    assert outcomes[('raise', 'bad')] == (None, None)
+    assert [outcomes[('ok', i)][0][:2] for i in (1, 2)] == [('ok', 1), ('ok', 2)]
+    # 被终止的工作进程已替换，池仍可继续使用
+    assert all(worker is None or worker.process.is_alive() for worker in pool.workers)
+    assert [result[:2] for _, result, _ in pool.run(run_task, [('ok', 3)], lambda task: (30, 1024))] == [('ok', 3)]
+
+
+def test_abandoned_run_kills_busy_workers(pool):
+    results = pool.run(run_task, [('ok', 0), ('sleep', 30)], lambda task: (60, 1024))
+    task, _, error = next(results)
+    assert task == ('ok', 0) and error is None
+    busy = [worker for worker in pool.workers if worker.task is not None]
+    results.close()
+    # 调用方不再迭代时，仍在执行的任务被终止，旧结果不会出现在下一次 run 中
+    assert busy and not any(worker.process.is_alive() for worker in busy)
+    assert [task for task, _, _ in pool.run(run_task, [('ok', 1)], lambda task: (30, 1024))] == [('ok', 1)]
+
+
+def test_quarantine_until_modified(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_manager, 'get_cache_dir', lambda app_name='word_search': tmp_path)
+    manager = cache_manager.CacheManager()
+    infos = {'/docs/a.pdf': {'last_modified': 10, 'size': 100},
+             '/docs/b.pdf': {'last_modified': 20, 'size': 200}}
+    manager.quarantine_files({'/docs/a.pdf': 'timeout', '/docs/b.pdf': 'memory', '/docs/gone.pdf': 'crashed'}, infos)
+    assert manager.get_quarantined(infos, infos) == {'/docs/a.pdf': 'timeout', '/docs/b.pdf': 'memory'}
+    # 修改后的文件移出隔离表，之后即使恢复原来的修改时间也会重新处理
+    modified = dict(infos, **{'/docs/b.pdf': {'last_modified': 21, 'size': 200}})
+    assert manager.get_quarantined(modified, modified) == {'/docs/a.pdf': 'timeout'}
+    assert manager.get_quarantined(infos, infos) == {'/docs/a.pdf': 'timeout'}
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+import tokenizer
+
+WORDS = ['搜索', '引擎', '文档', '中华人民共和国', 'version', '3.14', 'hello', 'world',
+         ' ', '，', '。', '！', '？', '；', '!', '?', ';', '\n', '.']
+
+
+def make_text(seed, length):
+    rng = random.Random(seed)
+    return ''.join(rng.choice(WORDS) for _ in range(length))
+
+
+def unpack(terms, term_tfs, positions):
+    # 还原为按位置排列的词序列
+    words = {}
+    offset = 0
+    for term, tf in zip(terms, term_tfs):
+        for pos in positions[offset:offset + tf]:
+            words[pos] = term
+        offset += tf
+    return [words[pos] for pos in range(len(words))]
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # 缩小块大小，使短文本也会被切成多块
+    monkeypatch.setattr(tokenizer.split_sentences, '__defaults__', (16,))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_chunked_tokenization_matches_jieba(small_chunks, seed):
+    text = make_text(seed, 400)
+    assert len(list(tokenizer.split_sentences(text))) > 1
+    assert ''.join(tokenizer.split_sentences(text)) == text
+    assert list(tokenizer.cut(text)) == tokenizer.lcut(text)
+    assert unpack(*tokenizer.tokenize_packed(text)) == tokenizer.lcut(text)
+
+
+
+def test_packed_term_frequencies():
+    text = make_text(7, 300)
+    words = tokenizer.lcut(text)
+    terms, term_tfs, positions = tokenizer.tokenize_packed(text)
+    # 词按首次出现排序，词频与结巴结果一致，每个词的位置递增
+    assert terms == list(dict.fromkeys(words))
+    assert list(term_tfs) == [words.count(term) for term in terms]
+    offset = 0
+    for tf in term_tfs:
+        group = list(positions[offset:offset + tf])
+        assert group == sorted(group)
+        offset += tf
+    assert offset == len(positions) == len(words)
+
+
+def test_stream_and_merged_parts_match_whole_text(small_chunks):
+    pages = [make_text(seed, 100) for seed in range(6)]
+    expected = [word for page in pages for word in tokenizer.lcut(page)]
+    terms, term_tfs, positions, starts = tokenizer.tokenize_stream(pages)
+    assert unpack(terms, term_tfs, positions) == expected
+    assert list(starts) == [sum(len(tokenizer.lcut(page)) for page in pages[:i]) for i in range(len(pages))]
+
+    # 分段分词后合并（拆分的PDF任务），位置与整体分词相同
+    parts = []
+    offset = 0
+    for group in (pages[:2], pages[2:5], pages[5:]):
+        part_terms, part_tfs, part_positions, _ = tokenizer.tokenize_stream(group)
+        parts.append((part_terms, part_tfs, part_positions, offset))
+        offset += len(part_positions)
+    assert unpack(*tokenizer.merge_packed(parts)) == expected
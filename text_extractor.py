@@ -0,0 +1,15 @@
+from extractors import open_source
+
+# 纯文本格式（.txt、.md）的提取器，按常见编码依次尝试解码
+ENCODINGS = ('utf-8-sig', 'gb18030')
+
+
+def extract_text(source):
+    with open_source(source) as f:
+        data = f.read()
+    for encoding in ENCODINGS:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='replace')
@@ -0,0 +1,130 @@
+import os
+import re
+import time
+from array import array
+from collections import Counter
+
+from cache_manager import get_cache_dir
+import logger_config
+
+logger = logger_config.setup_logger(__name__)
+
+# 长文本按块分词，每块约 CHUNK_CHARS 个字符，切分点取句子边界
+CHUNK_CHARS = 64 * 1024
+# 结巴本身就会在这些字符处断开（都不属于其汉字/字母数字块），在此切块不改变分词结果；
+# 不使用英文句点，句点在结巴中属于数字与英文块的一部分
+_SENTENCE_END = re.compile(r'[。！？；!?;\n]')
+
+_jieba = None
+
+
+def get_jieba():
+    # 结巴在第一次使用时才导入，不计入界面的启动时间。
+    # 结巴把词典序列化为缓存文件（marshal），放在应用缓存目录中，
+    # 不随临时目录被清理；主进程首次加载时生成，工作进程之后直接读取
+    global _jieba
+    if _jieba is None:
+        import jieba
+        jieba.dt.tmp_dir = str(get_cache_dir())
+        _jieba = jieba
+    return _jieba
+
+
+def lcut(text):
+    return get_jieba().lcut(text)
+
+
+def load_dictionary():
+    # 词典在每个进程中只加载一次，返回加载用时
+    jieba = get_jieba()
+    if jieba.dt.initialized:
+        return 0.0
+    start = time.time()
+    jieba.initialize()
+    elapsed = time.time() - start
+    logger.info(f"[分词] 进程 {os.getpid()} 词典加载完成，用时 {elapsed:.2f}秒")
+    return elapsed
+
+
+def init_worker():
+    # 进程池初始化函数：进程启动时就加载词典，而不是在第一个文档的处理时间内加载。
+    # fork 方式创建的进程已继承主进程加载好的词典，这里直接返回
+    load_dictionary()
+
+
+def split_sentences(text, chunk_chars=CHUNK_CHARS):
+    # 按约 chunk_chars 个字符切块，切分点为块末尾之后的第一个句子边界
+    start = 0
+    while start < len(text):
+        end = start + chunk_chars
+        if end < len(text):
+            match = _SENTENCE_END.search(text, end)
+            end = match.end() if match else len(text)
+        yield text[start:end]
+        start = end
+
+
+def cut(text):
+    # 逐块调用结巴，结果与对整个文本调用 jieba.cut 相同
+    jieba = get_jieba()
+    for chunk in split_sentences(text):
+        yield from jieba.cut(chunk)
+
+
+def tokenize_stream(texts):
+    """依次对 texts 中的各段文本分词，词位置连续编号，结果格式同 pack_word_positions，
+    另返回每段文本第一个词的位置。texts 可以是生成器（如逐页提取的PDF文本），边产出边分词。
+
+    分词结果只以词ID数组保存（每个词4字节），不保留词列表和位置字典。
+    """
+    jieba = get_jieba()
+    term_ids = {}
+    stream = array('I')
+    starts = array('I')
+    for text in texts:
+        starts.append(len(stream))
+        for chunk in split_sentences(text):
+            # setdefault 的默认值在插入前求值，新词的ID即为当前词数
+            stream.extend([term_ids.setdefault(word, len(term_ids)) for word in jieba.cut(chunk)])
+
+    # 计数排序：按词ID把位置放入各自的区间，区间内位置保持递增
+    counts = Counter(stream)
+    term_tfs = array('I', [counts[term_id] for term_id in range(len(term_ids))])
+    cursors = []
+    total = 0
+    for tf in term_tfs:
+        cursors.append(total)
+        total += tf
+    positions = array('I', bytes(4 * len(stream)))
+    for pos, term_id in enumerate(stream):
+        positions[cursors[term_id]] = pos
+        cursors[term_id] += 1
+    return list(term_ids), term_tfs, positions, starts
+
+
+def tokenize_packed(text):
+    # 分词并直接生成 pack_word_positions 格式的 (词列表, 各词的词频, 按词分组的位置数组)
+    terms, term_tfs, positions, _ = tokenize_stream([text])
+    return terms, term_tfs, positions
+
+
+def merge_packed(parts):
+    """合并分别分词的各部分文本，parts 为按文档顺序排列的 (词列表, 词频, 位置数组, 起始词位置)。
+
+    各部分的词ID统一编号，位置加上所在部分的起始位置后按词稳定排序，同一词的位置仍然递增。
+    只在主进程中调用，工作进程不必导入 numpy。
+    """
+    import numpy as np
+
+    term_ids = {}
+    ids = []
+    positions = []
+    for terms, term_tfs, part_positions, offset in parts:
+        local_ids = np.fromiter((term_ids.setdefault(term, len(term_ids)) for term in terms),
+                                dtype=np.uint32, count=len(terms))
+        ids.append(np.repeat(local_ids, np.asarray(term_tfs, dtype=np.int64)))
+        positions.append(np.asarray(part_positions, dtype=np.uint32) + np.uint32(offset))
+    ids = np.concatenate(ids)
+    positions = np.concatenate(positions)[np.argsort(ids, kind='stable')]
+    term_tfs = np.bincount(ids, minlength=len(term_ids)).astype(np.uint32)
+    return list(term_ids), array('I', term_tfs.tobytes()), array('I', positions.tobytes())
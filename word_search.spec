@@ -11,8 +11,26 @@ a = Analysis(
         ('logger_config.py', '.'),
         ('search_engine.py', '.'),
         ('cache_manager.py', '.'),
+        ('cache_codec.py', '.'),
+        ('postings.py', '.'),
+        ('fuzzy_index.py', '.'),
+        ('index_segment.py', '.'),
+        ('search_index.py', '.'),
+        ('query.py', '.'),
+        ('scoring.py', '.'),
+        ('batch_search.py', '.'),
+        ('search_cache.py', '.'),
+        ('tokenizer.py', '.'),
+        ('docx_extractor.py', '.'),
+        ('pdf_extractor.py', '.'),
+        ('text_extractor.py', '.'),
+        ('extractors.py', '.'),
+        ('file_enumerator.py', '.'),
+        ('task_pool.py', '.'),
+        ('single_application.py', '.'),
     ],
-    hiddenimports=['watchdog.observers.polling','watchdog.events','jieba'],
+    hiddenimports=['watchdog.observers.polling','watchdog.events','jieba',
+                   'docx_extractor','pdf_extractor','text_extractor'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],